@@ -21,26 +21,90 @@ logger = logging.getLogger("ConfigLogger")
 # Configurações gerais
 BASE_URL = os.getenv("BASE_URL")
 
+# Cliente HTTP do gateway do WhatsApp (timeouts em segundos)
+GATEWAY_POOL_MAX = int(os.getenv("GATEWAY_POOL_MAX", "10"))
+GATEWAY_TIMEOUT_CONEXAO = float(os.getenv("GATEWAY_TIMEOUT_CONEXAO", "3"))
+GATEWAY_TIMEOUT_LEITURA = float(os.getenv("GATEWAY_TIMEOUT_LEITURA", "10"))
+GATEWAY_TAMANHO_MAX_MENSAGEM = int(os.getenv("GATEWAY_TAMANHO_MAX_MENSAGEM", "4096"))
+
+# Limite de envios ao gateway (mensagens/segundo e tamanho da rajada; taxa 0 desativa o limite)
+GATEWAY_TAXA_GLOBAL = float(os.getenv("GATEWAY_TAXA_GLOBAL", "20"))
+GATEWAY_RAJADA_GLOBAL = int(os.getenv("GATEWAY_RAJADA_GLOBAL", "20"))
+GATEWAY_TAXA_CONTATO = float(os.getenv("GATEWAY_TAXA_CONTATO", "0"))
+GATEWAY_RAJADA_CONTATO = int(os.getenv("GATEWAY_RAJADA_CONTATO", "3"))
+
+# Reenvio e circuito do gateway (falhas consecutivas para abrir e segundos de espera)
+GATEWAY_CIRCUITO_FALHAS = int(os.getenv("GATEWAY_CIRCUITO_FALHAS", "5"))
+GATEWAY_CIRCUITO_ESPERA = float(os.getenv("GATEWAY_CIRCUITO_ESPERA", "30"))
+GATEWAY_REENVIO_IDADE_MAX = float(os.getenv("GATEWAY_REENVIO_IDADE_MAX", "600"))
+
 # Diretórios (fixos no código)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 CONVERSATIONS_DIR = os.path.join(BASE_DIR, "conversations")
 LOG_DIR = os.path.join(BASE_DIR, "logs")
 INPUT_DIR = os.path.join(BASE_DIR, "input")
 OUTPUT_DIR = os.path.join(BASE_DIR, "output")
+DATA_DIR = os.path.join(BASE_DIR, "data")
 
 # Arquivos
 CLIENT_FILE_PATH = os.path.join(INPUT_DIR, "cliente.xlsx")
 PROJECT_FILE_PATH = os.path.join(INPUT_DIR, "projetos.xlsx")
 MATERIAL_FILE_PATH = os.path.join(INPUT_DIR, "materia_prima.xlsx")
+FORMULAS_FILE_PATH = os.path.join(INPUT_DIR, "formulas.json")
+OUTBOX_FILE_PATH = os.path.join(DATA_DIR, "outbox.db")
+PEDIDOS_DB_PATH = os.path.join(OUTPUT_DIR, "pedidos.db")
+SESSOES_DB_PATH = os.path.join(DATA_DIR, "sessoes.db")
+SESSOES_SNAPSHOT_PATH = os.path.join(DATA_DIR, "sessoes_snapshot.db")
 
 # Configurações de tempo (fixas no código)
 TIMEOUT_WARNING = 60
 TIMEOUT_FINAL = 120
+# Nova verificação (segundos) de um contato cuja verificação de inatividade falhou
+INATIVIDADE_ESPERA_ERRO = float(os.getenv("INATIVIDADE_ESPERA_ERRO", "30"))
+
+# Intervalo (segundos) entre verificações de alteração nas planilhas de entrada
+RECARGA_INTERVALO = float(os.getenv("RECARGA_INTERVALO", "5"))
+
+# Outbox de mensagens (segundos entre sincronizações em disco, idade máxima para reenvio e
+# segundos entre as drenagens que reenviam as mensagens pendentes)
+OUTBOX_INTERVALO_SYNC = float(os.getenv("OUTBOX_INTERVALO_SYNC", "1"))
+OUTBOX_IDADE_MAX = float(os.getenv("OUTBOX_IDADE_MAX", "86400"))
+OUTBOX_INTERVALO_REENVIO = float(os.getenv("OUTBOX_INTERVALO_REENVIO", "60"))
+
+# Transcrições das conversas (arquivos abertos, linhas em buffer e segundos entre gravações)
+TRANSCRICAO_MAX_ARQUIVOS = int(os.getenv("TRANSCRICAO_MAX_ARQUIVOS", "64"))
+TRANSCRICAO_MAX_LINHAS = int(os.getenv("TRANSCRICAO_MAX_LINHAS", "200"))
+TRANSCRICAO_INTERVALO_FLUSH = float(os.getenv("TRANSCRICAO_INTERVALO_FLUSH", "1"))
+
+# Numeração dos pedidos (quantidade de números reservados no banco a cada acesso).
+# Os números não usados voltam ao contador quando o bot é encerrado normalmente; se o processo cair,
+# a numeração do dia pode pular até PEDIDO_ID_BLOCO - 1 números (nunca se repete). Use 1 para não ter lacunas.
+PEDIDO_ID_BLOCO = int(os.getenv("PEDIDO_ID_BLOCO", "10"))
+
+# Processamento assíncrono do webhook
+WEBHOOK_ASSINCRONO = os.getenv("WEBHOOK_ASSINCRONO", "false").strip().lower() in ("1", "true", "sim")
+WEBHOOK_NUM_WORKERS = int(os.getenv("WEBHOOK_NUM_WORKERS", "4"))
+WEBHOOK_FILA_MAX = int(os.getenv("WEBHOOK_FILA_MAX", "1000"))
+
+# Armazenamento das sessões: "memoria" (um único processo) ou "sqlite" (compartilhado entre processos/workers).
+# No modo sqlite, cada contato é travado por uma concessão que expira após SESSAO_LEASE_SEGUNDOS, e
+# leituras sem a trava (ex.: varreduras) são reaproveitadas por até SESSAO_CACHE_LEITURA segundos.
+SESSAO_BACKEND = os.getenv("SESSAO_BACKEND", "memoria").strip().lower()
+SESSAO_LEASE_SEGUNDOS = float(os.getenv("SESSAO_LEASE_SEGUNDOS", "30"))
+SESSAO_CACHE_LEITURA = float(os.getenv("SESSAO_CACHE_LEITURA", "1"))
+
+# Snapshot das sessões em memória (segundos entre gravações; 0 desativa o snapshot e a restauração)
+SESSAO_SNAPSHOT_INTERVALO = float(os.getenv("SESSAO_SNAPSHOT_INTERVALO", "2"))
+
+# Orçamento em lote via HTTP (máximo de linhas por requisição, de unidades por linha e medida máxima em mm)
+ORCAMENTO_LOTE_MAX_LINHAS = int(os.getenv("ORCAMENTO_LOTE_MAX_LINHAS", "10000"))
+ORCAMENTO_QUANTIDADE_MAX = int(os.getenv("ORCAMENTO_QUANTIDADE_MAX", "10000"))
+ORCAMENTO_MEDIDA_MAX_MM = int(os.getenv("ORCAMENTO_MEDIDA_MAX_MM", "100000"))
 
 # Função para criar os diretórios necessários
 def setup_directories():
     """Cria diretórios necessários para o funcionamento do sistema."""
-    for directory in [CONVERSATIONS_DIR, LOG_DIR, INPUT_DIR, OUTPUT_DIR]:
+    for directory in [CONVERSATIONS_DIR, LOG_DIR, INPUT_DIR, OUTPUT_DIR, DATA_DIR]:
         try:
             os.makedirs(directory, exist_ok=True)
             logger.info(f"📂 Diretório criado/verificado: {directory}")
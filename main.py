@@ -1,9 +1,11 @@
 import os
 from dotenv import load_dotenv
 from flask import Flask
-from threading import Thread, enumerate  # Importação correta
+from threading import Thread, Lock, enumerate  # Importação correta
 from routes import webhook_bp
 from services.state_service import monitor_inactivity
+from services.message_service import drenar_outbox
+from services.global_state import global_state
 from logger import logger
 
 # Carrega variáveis de ambiente do arquivo .env
@@ -11,15 +13,50 @@ load_dotenv()
 
 PORT = os.getenv("PORT")
 
-app = Flask(__name__)
-app.register_blueprint(webhook_bp)
+# Processo em que os serviços em segundo plano já foram iniciados (um worker criado por fork não os herda)
+_servicos_iniciados_pid = None
+_lock_servicos = Lock()
 
 def start_monitoring():
     """Inicia o monitoramento de inatividade em uma thread separada."""
     if not any(isinstance(t, Thread) and t.name == "MonitorThread" for t in enumerate()):
         Thread(target=monitor_inactivity, daemon=True, name="MonitorThread").start()
 
-if __name__ == "__main__":
-    logger.info("🚀 Bot iniciado. Aguardando mensagens...")
+def start_sessions():
+    """Restaura as sessões salvas antes da última parada e inicia o snapshot periódico."""
+    global_state.restaurar_sessoes()
+
+def start_outbox():
+    """Reenvia periodicamente, em segundo plano, as mensagens que ficaram pendentes na outbox."""
+    Thread(target=drenar_outbox, daemon=True, name="OutboxDrainThread").start()
+
+def iniciar_servicos():
+    """
+    Inicia, uma única vez por processo, a restauração das sessões, o monitor de inatividade e a
+    drenagem da outbox. Cada worker do gunicorn os inicia ao criar o app; com `--preload`, o app
+    é criado antes do fork, e esta função deve ser chamada também no hook `post_fork`.
+    Todos os workers drenam a outbox (cada mensagem é reivindicada por um só processo), mas só um
+    executa o monitor de inatividade: os demais aguardam para assumi-lo (veja `monitor_inactivity`).
+    """
+    global _servicos_iniciados_pid
+    with _lock_servicos:
+        if _servicos_iniciados_pid == os.getpid():
+            return
+        _servicos_iniciados_pid = os.getpid()
+
+    logger.info(f"🚀 Bot iniciado no processo {os.getpid()}. Aguardando mensagens...")
+    start_sessions()
     start_monitoring()
+    start_outbox()
+
+def create_app():
+    """Cria o app Flask e inicia os serviços em segundo plano deste processo (`gunicorn main:app`)."""
+    app = Flask(__name__)
+    app.register_blueprint(webhook_bp)
+    iniciar_servicos()
+    return app
+
+app = create_app()
+
+if __name__ == "__main__":
     app.run(port=PORT, debug=False)
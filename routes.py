@@ -1,9 +1,16 @@
 from flask import Blueprint, request, jsonify
-from services.message_handler import gerenciar_mensagem_recebida
+from services.message_handler import processar_mensagem
+from services.fila_service import FilaMensagens
+from services.retry_service import circuito_gateway, agendador_reenvio
+from services.orcamento_service import calcular_orcamento_lote
+from config import WEBHOOK_ASSINCRONO, WEBHOOK_NUM_WORKERS, WEBHOOK_FILA_MAX, ORCAMENTO_LOTE_MAX_LINHAS
 from logger import logger
 
 webhook_bp = Blueprint("webhook", __name__)
 
+# Fila usada quando o webhook opera em modo assíncrono
+fila_mensagens = FilaMensagens(processar_mensagem, WEBHOOK_NUM_WORKERS, WEBHOOK_FILA_MAX)
+
 @webhook_bp.route("/webhook", methods=["POST"])
 def webhook():
     try:
@@ -20,8 +27,16 @@ def webhook():
             return jsonify({"status": "error", "message": "Dados insuficientes no payload"}), 400
 
         logger.info(f"📩 Webhook ativado - Contato: {contato}, Mensagem: {texto}")
-        
-        gerenciar_mensagem_recebida(contato, texto)
+
+        if WEBHOOK_ASSINCRONO:
+            # ✅ Confirma o recebimento imediatamente; o processamento ocorre nos workers
+            if not fila_mensagens.enfileirar(contato, texto):
+                return jsonify({"status": "error", "message": "Fila de mensagens cheia, tente novamente"}), 503
+
+            logger.info(f"📥 Mensagem de {contato} enfileirada para processamento.")
+            return jsonify({"status": "queued"}), 200
+
+        processar_mensagem(contato, texto)
 
         logger.info(f"✅ Mensagem processada com sucesso para {contato}.")
         return jsonify({"status": "success"}), 200
@@ -30,3 +45,47 @@ def webhook():
         logger.error(f"❌ Erro no webhook: {e}", exc_info=True)
         return jsonify({"status": "error", "message": "Erro interno no servidor"}), 500
 
+
+@webhook_bp.route("/orcamento/lote", methods=["POST"])
+def orcamento_lote():
+    """
+    Calcula o orçamento de várias linhas de uma vez, sem passar pelo fluxo do WhatsApp.
+    Corpo: {"linhas": [{"id_projeto", "altura", "largura", "quantidade", e "id_materia_prima"
+    ou "cor_materia_prima"/"espessura_materia_prima"/"beneficiamento"}]}.
+    O beneficiamento é obrigatório nos projetos fixos; nos demais, é TEMPERADO como no chat.
+    """
+    try:
+        if not request.is_json:
+            return jsonify({"status": "error", "message": "Requisição inválida, esperado JSON"}), 400
+
+        data = request.get_json()
+        linhas = data.get("linhas") if isinstance(data, dict) else data
+
+        if not isinstance(linhas, list) or not linhas:
+            return jsonify({"status": "error", "message": "Informe a lista 'linhas' do orçamento"}), 400
+
+        if len(linhas) > ORCAMENTO_LOTE_MAX_LINHAS:
+            return jsonify({"status": "error", "message": f"Máximo de {ORCAMENTO_LOTE_MAX_LINHAS} linhas por requisição"}), 413
+
+        resultados, valor_total = calcular_orcamento_lote(linhas)
+        return jsonify({
+            "status": "success",
+            "linhas": resultados,
+            "linhas_com_erro": sum(1 for resultado in resultados if resultado["status"] == "error"),
+            "valor_total": valor_total,
+        }), 200
+
+    except Exception as e:
+        logger.error(f"❌ Erro no orçamento em lote: {e}", exc_info=True)
+        return jsonify({"status": "error", "message": "Erro interno no servidor"}), 500
+
+
+@webhook_bp.route("/status", methods=["GET"])
+def status():
+    """Expõe o estado do circuito do gateway e das filas internas."""
+    return jsonify({
+        "status": "success",
+        "gateway": circuito_gateway.estado(),
+        "reenvios_pendentes": agendador_reenvio.pendentes(),
+        "fila_webhook": fila_mensagens.tamanho(),
+    }), 200
@@ -1,69 +1,132 @@
 import pandas as pd
+import threading
 import time
 from config import CLIENT_FILE_PATH
 from logger import logger
+from services.recarga_service import monitor_arquivos, assinatura_arquivo
+
+COLUNAS_NOME_CLIENTE = ["nome", "nome_cliente", "cliente", "nome_do_cliente"]
+COLUNAS_REGIAO = ["regiao", "região", "localizacao"]
+
+def normalizar_telefone(telefone):
+    """Normaliza o telefone para comparação, mantendo apenas os dígitos."""
+    telefone = str(telefone).strip()
+    digitos = "".join(c for c in telefone if c.isdigit())
+    return digitos or telefone
 
 class ClienteCache:
-    """Gerencia o cache de clientes para evitar carregamento desnecessário."""
-    _cache = None
+    """
+    Gerencia o cache de clientes para evitar carregamento desnecessário.
+    A planilha é relida em segundo plano apenas quando muda, e o novo cache substitui
+    o anterior de uma só vez: os leitores nunca esperam nem veem um cache incompleto.
+    """
+    _snapshot = None  # (DataFrame de clientes, índice telefone normalizado -> dados do cliente)
     _timestamp = 0
-    _timeout = 60  # Atualiza a cada 60 segundos
+    _lock = threading.Lock()  # Serializa as recargas (as leituras não usam lock)
+    _monitorado = False
 
     @classmethod
     def carregar_clientes(cls, forcar_atualizacao=False):
-        """Carrega informações dos clientes, armazenando em cache."""
-        if cls._cache is None or (time.time() - cls._timestamp > cls._timeout) or forcar_atualizacao:
-            try:
-                df = pd.read_excel(CLIENT_FILE_PATH, dtype={'celular': str})
-                df['celular'] = df['celular'].str.strip()
-                
-                # Garantir que colunas essenciais existam
-                colunas_esperadas = ["id_cliente", "nome_cliente", "celular"]
-                for coluna in colunas_esperadas:
-                    if coluna not in df.columns:
-                        logger.error(f"❌ Coluna obrigatória '{coluna}' não encontrada no arquivo {CLIENT_FILE_PATH}.")
-                        return pd.DataFrame()
-
-                cls._cache = df
+        """Retorna os clientes em cache, carregando a planilha na primeira chamada."""
+        if forcar_atualizacao:
+            cls._recarregar()
+        return cls._obter_snapshot()[0]
+
+    @classmethod
+    def _obter_snapshot(cls):
+        """Retorna o cache atual (DataFrame, índice), carregando-o se ainda não existir."""
+        snapshot = cls._snapshot
+        if snapshot is None:
+            cls._recarregar(forcar_atualizacao=False)
+            snapshot = cls._snapshot
+        return snapshot
+
+    @classmethod
+    def _recarregar(cls, forcar_atualizacao=True):
+        """Lê a planilha e publica o novo cache. Em caso de erro, mantém o cache anterior."""
+        with cls._lock:
+            if cls._snapshot is not None and not forcar_atualizacao:
+                return
+
+            assinatura = assinatura_arquivo(CLIENT_FILE_PATH)
+            snapshot = cls._ler_planilha()
+
+            if snapshot is not None:
+                cls._snapshot = snapshot  # Troca atômica
                 cls._timestamp = time.time()
                 logger.info("📄 Clientes carregados e armazenados em cache.")
-            except FileNotFoundError:
-                logger.error(f"❌ Arquivo não encontrado: {CLIENT_FILE_PATH}")
-                cls._cache = pd.DataFrame()
-            except Exception as e:
-                logger.exception(f"❌ Erro ao carregar clientes: {e}", exc_info=True)
-                cls._cache = pd.DataFrame()
-        return cls._cache
+            elif cls._snapshot is None:
+                cls._snapshot = (pd.DataFrame(), {})
+
+            if not cls._monitorado:
+                monitor_arquivos.registrar(CLIENT_FILE_PATH, cls._recarregar, assinatura)
+                cls._monitorado = True
+
+    @classmethod
+    def _ler_planilha(cls):
+        """Lê a planilha de clientes e monta o índice. Retorna None em caso de erro."""
+        try:
+            df = pd.read_excel(CLIENT_FILE_PATH, dtype={'celular': str})
+            df['celular'] = df['celular'].str.strip()
+
+            # Garantir que colunas essenciais existam
+            colunas_esperadas = ["id_cliente", "nome_cliente", "celular"]
+            for coluna in colunas_esperadas:
+                if coluna not in df.columns:
+                    logger.error(f"❌ Coluna obrigatória '{coluna}' não encontrada no arquivo {CLIENT_FILE_PATH}.")
+                    return None
+
+            return df, cls._construir_indice(df)
+        except FileNotFoundError:
+            logger.error(f"❌ Arquivo não encontrado: {CLIENT_FILE_PATH}")
+        except Exception as e:
+            logger.exception(f"❌ Erro ao carregar clientes: {e}", exc_info=True)
+        return None
+
+    @staticmethod
+    def _construir_indice(df):
+        """
+        Monta o índice telefone -> cliente, resolvendo uma única vez as colunas de nome e região.
+        Em telefones duplicados prevalece a primeira linha da planilha.
+        """
+        col_nome_cliente = next((col for col in df.columns if col.strip().lower() in COLUNAS_NOME_CLIENTE), None)
+        col_regiao = next((col for col in df.columns if col.strip().lower() in COLUNAS_REGIAO), None)
+
+        if not col_nome_cliente:
+            logger.error("❌ Nenhuma coluna correspondente a 'nome' encontrada no arquivo de clientes!")
+            return {}
+
+        regioes = df[col_regiao].tolist() if col_regiao else ["Região Desconhecida"] * len(df)
+
+        indice = {}
+        for celular, id_cliente, nome_cliente, regiao in zip(df["celular"].tolist(), df["id_cliente"].tolist(), df[col_nome_cliente].tolist(), regioes):
+            if not isinstance(celular, str):
+                continue  # Célula vazia
+            indice.setdefault(normalizar_telefone(celular), {
+                "id_cliente": id_cliente,
+                "nome_cliente": nome_cliente,
+                "regiao": regiao,
+            })
+
+        logger.info(f"📇 Índice de clientes montado com {len(indice)} telefones.")
+        return indice
 
     @classmethod
     def buscar_cliente_por_telefone(cls, contato):
-        """Busca um cliente pelo número de telefone no cache."""
+        """Busca um cliente pelo número de telefone no índice do cache."""
         logger.debug(f"🔍 Buscando cliente pelo telefone: {contato}")
-        df_clientes = cls.carregar_clientes()
+        indice = cls._obter_snapshot()[1]
 
-        if df_clientes.empty:
+        if not indice:
             logger.warning("⚠️ Tentativa de busca em um banco de clientes vazio.")
             return None  
 
         contato = str(contato).strip()
-        cliente = df_clientes.loc[df_clientes['celular'] == contato]
+        cliente = indice.get(normalizar_telefone(contato))
 
-        if not cliente.empty:
+        if cliente:
             logger.info(f"✅ Cliente encontrado: {contato}")
-
-            col_nome_cliente = next((col for col in df_clientes.columns if col.strip().lower() in ["nome", "nome_cliente", "cliente", "nome_do_cliente"]), None)
-            col_regiao = next((col for col in df_clientes.columns if col.strip().lower() in ["regiao", "região", "localizacao"]), None)
-
-            if not col_nome_cliente:
-                logger.error("❌ Nenhuma coluna correspondente a 'nome' encontrada no arquivo de clientes!")
-                return None
-
-            return {
-                "id_cliente": cliente.iloc[0]["id_cliente"],
-                "nome_cliente": cliente.iloc[0][col_nome_cliente],
-                "telefone": contato,
-                "regiao": cliente.iloc[0][col_regiao] if col_regiao else "Região Desconhecida"
-            }
+            return {**cliente, "telefone": contato}
 
         logger.warning(f"❌ Cliente não encontrado: {contato}")
         return None
@@ -72,7 +135,7 @@ class ClienteCache:
     @classmethod
     def limpar_cache(cls):
         """Força a limpeza do cache."""
-        cls._cache = None
+        cls._snapshot = None
         cls._timestamp = 0
         logger.info("🔄 Cache de clientes foi limpo.")
 
@@ -0,0 +1,84 @@
+import queue
+import threading
+from collections import deque
+from logger import logger
+
+class FilaMensagens:
+    """
+    Fila de mensagens recebidas processada por um pool de workers.
+    Mensagens de um mesmo contato são processadas em ordem, uma de cada vez;
+    contatos diferentes são processados em paralelo.
+    """
+
+    def __init__(self, processar, num_workers=4, tamanho_max=1000):
+        self._processar = processar
+        self._num_workers = max(1, num_workers)
+        self._tamanho_max = tamanho_max
+        self._pendentes = {}  # contato -> deque de textos ainda não processados
+        self._total_pendente = 0
+        self._prontos = queue.Queue()  # contatos com mensagens e sem worker atribuído
+        self._lock = threading.Lock()
+        self._workers = []
+
+    def iniciar(self):
+        """Inicia os workers, caso ainda não estejam em execução."""
+        with self._lock:
+            if self._workers:
+                return
+            for i in range(self._num_workers):
+                worker = threading.Thread(target=self._executar, daemon=True, name=f"WebhookWorker-{i + 1}")
+                worker.start()
+                self._workers.append(worker)
+        logger.info(f"🧵 {self._num_workers} workers de mensagens iniciados.")
+
+    def enfileirar(self, contato, texto):
+        """
+        Adiciona a mensagem à fila do contato.
+        Retorna False se a fila estiver cheia.
+        """
+        if not self._workers:
+            self.iniciar()
+
+        with self._lock:
+            if self._total_pendente >= self._tamanho_max:
+                logger.warning(f"⚠️ Fila de mensagens cheia ({self._tamanho_max}). Mensagem de {contato} recusada.")
+                return False
+
+            self._total_pendente += 1
+            if contato in self._pendentes:
+                # O contato já está na fila de prontos ou sendo processado por um worker
+                self._pendentes[contato].append(texto)
+                return True
+
+            self._pendentes[contato] = deque([texto])
+
+        self._prontos.put(contato)
+        return True
+
+    def tamanho(self):
+        """Retorna o número de mensagens aguardando processamento."""
+        return self._total_pendente
+
+    def _executar(self):
+        """Loop dos workers: processa uma mensagem do próximo contato pronto."""
+        while True:
+            contato = self._prontos.get()
+
+            with self._lock:
+                texto = self._pendentes[contato].popleft()
+                self._total_pendente -= 1
+
+            try:
+                self._processar(contato, texto)
+            except Exception as e:
+                logger.error(f"❌ Erro ao processar mensagem de {contato} na fila: {e}", exc_info=True)
+
+            with self._lock:
+                if self._pendentes[contato]:
+                    reenfileirar = True  # Devolve o contato ao fim da fila para não monopolizar o worker
+                else:
+                    del self._pendentes[contato]
+                    reenfileirar = False
+
+            if reenfileirar:
+                self._prontos.put(contato)
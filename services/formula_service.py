@@ -1,37 +1,193 @@
+import ast
+import json
+import os
+import threading
+from functools import reduce
+import numpy as np
+from config import FORMULAS_FILE_PATH
 from logger import logger
+from services.recarga_service import monitor_arquivos, assinatura_arquivo
 
+# Fórmulas padrão, usadas quando o arquivo de fórmulas não existe ou não define o ID.
+# Cada peça informa expressões para a altura e a largura em função de `altura` e `largura` (em mm).
 FORMULAS_PROJETOS = {
     1: {
         "nome": "PEÇA COM MEDIDA FINAL",
         "pecas": [
-            {"nome_peca": "Peça Principal", "quantidade": 1, "calculo": lambda altura, largura: (max(altura, 0), max(largura, 0))},
+            {"nome_peca": "Peça Principal", "quantidade": 1, "altura": "max(altura, 0)", "largura": "max(largura, 0)"},
         ]
     },
     2: {
         "nome": "FIXAS no VÃO",
         "pecas": [
-            {"nome_peca": "Peça Fixa - Vão", "quantidade": 1, "calculo": lambda altura, largura: (max(altura - 20, 0), max(largura - 20, 0))},
+            {"nome_peca": "Peça Fixa - Vão", "quantidade": 1, "altura": "max(altura - 20, 0)", "largura": "max(largura - 20, 0)"},
         ]
     },
     3: {
         "nome": "JANELA DE ABRIR 2 FOLHAS [VÃO]",
         "pecas": [
-            {"nome_peca": "Peça Fixa", "quantidade": 1, "calculo": lambda altura, largura: (max(altura - 25, 0), max(largura // 2, 0))},
-            {"nome_peca": "Peça Móvel", "quantidade": 1, "calculo": lambda altura, largura: (max(altura - 62, 0), max((largura // 2) + 50, 0))},
+            {"nome_peca": "Peça Fixa", "quantidade": 1, "altura": "max(altura - 25, 0)", "largura": "max(largura // 2, 0)"},
+            {"nome_peca": "Peça Móvel", "quantidade": 1, "altura": "max(altura - 62, 0)", "largura": "max((largura // 2) + 50, 0)"},
         ]
     },
     4: {
         "nome": "JANELA DE ABRIR 4 FOLHAS [VÃO]",
         "pecas": [
-            {"nome_peca": "Peça Fixa", "quantidade": 2, "calculo": lambda altura, largura: (max(altura - 25, 0), max(largura // 4, 0))},
-            {"nome_peca": "Peça Móvel", "quantidade": 2, "calculo": lambda altura, largura: (max(altura - 62, 0), max((largura // 4) + 50, 0))},
+            {"nome_peca": "Peça Fixa", "quantidade": 2, "altura": "max(altura - 25, 0)", "largura": "max(largura // 4, 0)"},
+            {"nome_peca": "Peça Móvel", "quantidade": 2, "altura": "max(altura - 62, 0)", "largura": "max((largura // 4) + 50, 0)"},
         ]
     },
 }
 
+# Elementos permitidos nas expressões das fórmulas
+NOS_PERMITIDOS = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Call, ast.Name, ast.Load, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.UAdd, ast.USub,
+)
+VARIAVEIS = {"altura", "largura"}
+FUNCOES_ESCALARES = {"max": max, "min": min}
+
+def maximo_vetorial(*valores):
+    """max(a, b, ...) elemento a elemento (np.maximum só aceita dois operandos; o terceiro seria `out`)."""
+    return reduce(np.maximum, valores)
+
+
+def minimo_vetorial(*valores):
+    """min(a, b, ...) elemento a elemento."""
+    return reduce(np.minimum, valores)
+
+
+FUNCOES_VETORIAIS = {"max": maximo_vetorial, "min": minimo_vetorial}  # Mesma semântica, elemento a elemento
+
+
+def compilar_expressao(expressao):
+    """
+    Valida a expressão (apenas altura, largura, números, operadores aritméticos, max e min com
+    dois ou mais argumentos) e a compila.
+    """
+    arvore = ast.parse(str(expressao), mode="eval")
+    for no in ast.walk(arvore):
+        if not isinstance(no, NOS_PERMITIDOS):
+            raise ValueError(f"Elemento não permitido na fórmula '{expressao}': {type(no).__name__}")
+        if isinstance(no, ast.Name) and no.id not in VARIAVEIS and no.id not in FUNCOES_ESCALARES:
+            raise ValueError(f"Nome desconhecido na fórmula '{expressao}': {no.id}")
+        if isinstance(no, ast.Call) and (not isinstance(no.func, ast.Name) or no.func.id not in FUNCOES_ESCALARES or no.keywords):
+            raise ValueError(f"Chamada não permitida na fórmula '{expressao}'.")
+        if isinstance(no, ast.Call) and len(no.args) < 2:
+            raise ValueError(f"{no.func.id} precisa de pelo menos dois argumentos na fórmula '{expressao}'.")
+        if isinstance(no, ast.Constant) and not isinstance(no.value, (int, float)):
+            raise ValueError(f"Constante não numérica na fórmula '{expressao}': {no.value!r}")
+    return compile(arvore, f"<formula: {expressao}>", "eval")
+
+
+class PecaFormula:
+    """Peça de uma fórmula, com as expressões de altura e largura já compiladas."""
+    __slots__ = ("nome_peca", "quantidade", "_altura", "_largura")
+
+    def __init__(self, definicao):
+        self.nome_peca = str(definicao["nome_peca"])
+        self.quantidade = int(definicao.get("quantidade", 1))
+        self._altura = compilar_expressao(definicao["altura"])
+        self._largura = compilar_expressao(definicao["largura"])
+
+    def dimensoes(self, altura, largura):
+        """Calcula (altura, largura) da peça para um único vão."""
+        contexto = {"__builtins__": {}, **FUNCOES_ESCALARES, "altura": altura, "largura": largura}
+        return max(eval(self._altura, contexto), 0), max(eval(self._largura, contexto), 0)
+
+    def dimensoes_lote(self, alturas, larguras):
+        """Calcula as dimensões da peça para vários vãos de uma vez (arrays NumPy)."""
+        contexto = {"__builtins__": {}, **FUNCOES_VETORIAIS, "altura": alturas, "largura": larguras}
+        forma = np.broadcast(alturas, larguras).shape
+        altura = np.maximum(np.broadcast_to(eval(self._altura, contexto), forma), 0)
+        largura = np.maximum(np.broadcast_to(eval(self._largura, contexto), forma), 0)
+        return altura, largura
+
+
+class Formula:
+    """Fórmula de um projeto: nome e lista de peças compiladas."""
+    __slots__ = ("id_formula", "nome", "pecas")
+
+    def __init__(self, id_formula, definicao):
+        self.id_formula = id_formula
+        self.nome = definicao.get("nome", "")
+        self.pecas = [PecaFormula(peca) for peca in definicao["pecas"]]
+
+    def calcular(self, altura, largura, quantidade_total=1):
+        """Retorna as peças calculadas para um vão, no formato usado pelo restante do sistema."""
+        return [
+            {"nome_peca": peca.nome_peca, "quantidade": peca.quantidade * quantidade_total, "dimensoes": peca.dimensoes(altura, largura)}
+            for peca in self.pecas
+        ]
+
+    def calcular_lote(self, alturas, larguras):
+        """
+        Calcula as peças para vários vãos de uma vez.
+        Retorna uma lista de (nome_peca, quantidade, alturas, larguras), com um array por dimensão.
+        """
+        alturas = np.asarray(alturas)
+        larguras = np.asarray(larguras)
+        return [(peca.nome_peca, peca.quantidade, *peca.dimensoes_lote(alturas, larguras)) for peca in self.pecas]
+
+
+def compilar_formulas(definicoes):
+    """Compila um dicionário {id: definição}. Fórmulas inválidas são ignoradas (com log)."""
+    formulas = {}
+    for id_formula, definicao in definicoes.items():
+        try:
+            formulas[int(id_formula)] = Formula(int(id_formula), definicao)
+        except Exception as e:
+            logger.error(f"❌ Fórmula {id_formula} inválida, ignorada: {e}")
+    return formulas
+
+
+class FormulaCache:
+    """Mantém as fórmulas compiladas em memória, recarregando o arquivo de fórmulas quando ele muda."""
+    _formulas = None
+    _lock = threading.Lock()
+    _monitorado = False
+
+    @classmethod
+    def obter_formulas(cls):
+        """Retorna o dicionário {id_formula: Formula}, compilando as fórmulas na primeira chamada."""
+        formulas = cls._formulas
+        if formulas is None:
+            cls._recarregar(forcar_atualizacao=False)
+            formulas = cls._formulas
+        return formulas
+
+    @classmethod
+    def _recarregar(cls, forcar_atualizacao=True):
+        """Compila as fórmulas padrão e as do arquivo. Em caso de erro no arquivo, mantém as fórmulas anteriores."""
+        with cls._lock:
+            if cls._formulas is not None and not forcar_atualizacao:
+                return
+
+            assinatura = assinatura_arquivo(FORMULAS_FILE_PATH)
+            definicoes = dict(FORMULAS_PROJETOS)
+            try:
+                if os.path.exists(FORMULAS_FILE_PATH):
+                    with open(FORMULAS_FILE_PATH, encoding="utf-8") as arquivo:
+                        definicoes.update(json.load(arquivo))
+                cls._formulas = compilar_formulas(definicoes)  # Troca atômica
+                logger.info(f"🧮 {len(cls._formulas)} fórmulas de projeto carregadas.")
+            except Exception as e:
+                logger.error(f"❌ Erro ao carregar o arquivo de fórmulas: {e}", exc_info=True)
+                if cls._formulas is None:
+                    cls._formulas = compilar_formulas(FORMULAS_PROJETOS)
+
+            if not cls._monitorado:
+                monitor_arquivos.registrar(FORMULAS_FILE_PATH, cls._recarregar, assinatura)
+                cls._monitorado = True
+
+
 def obter_formula_por_id(id_projeto):
-    """Retorna a fórmula associada ao ID do projeto, se existir."""
-    formula = FORMULAS_PROJETOS.get(id_projeto)
+    """Retorna a fórmula compilada associada ao ID, se existir."""
+    try:
+        formula = FormulaCache.obter_formulas().get(int(id_projeto))
+    except (TypeError, ValueError):
+        formula = None
+
     if not formula:
         logger.warning(f"⚠️ Nenhuma fórmula encontrada para ID {id_projeto}.")
         return None
@@ -52,22 +208,8 @@ def calcular_pecas(id_formula, altura, largura, quantidade_total=1):
     if not formula:
         return []
 
-    pecas_calculadas = []
-    for peca in formula["pecas"]:
-        try:
-            nome_peca = peca["nome_peca"]
-            quantidade = peca["quantidade"] * quantidade_total
-            dimensoes = peca["calculo"](altura, largura)
-
-            if not isinstance(dimensoes, tuple) or len(dimensoes) != 2:
-                raise ValueError(f"Cálculo retornou formato inválido: {dimensoes}")
-
-            pecas_calculadas.append({
-                "nome_peca": nome_peca,
-                "quantidade": quantidade,
-                "dimensoes": (max(dimensoes[0], 0), max(dimensoes[1], 0))  # Garante que não tenha valores negativos
-            })
-        except Exception as e:
-            logger.exception(f"❌ Erro ao calcular peça '{nome_peca}': {e}", exc_info=True)
-
-    return pecas_calculadas
+    try:
+        return formula.calcular(altura, largura, quantidade_total)
+    except Exception as e:
+        logger.exception(f"❌ Erro ao calcular as peças da fórmula {id_formula}: {e}")
+        return []
@@ -1,10 +1,162 @@
-from collections import defaultdict
+import threading
+from collections.abc import MutableMapping
+from types import MappingProxyType
+from config import (
+    SESSAO_BACKEND, SESSOES_DB_PATH, SESSAO_LEASE_SEGUNDOS, SESSAO_CACHE_LEITURA, SESSOES_SNAPSHOT_PATH, SESSAO_SNAPSHOT_INTERVALO,
+)
 from logger import logger
+from services.sessao_service import criar_backend_sessoes
+
+# Quantidade de locks do conjunto (contatos diferentes só disputam o mesmo lock se caírem na mesma faixa)
+NUM_TRAVAS = 64
+
+class SessaoUsuario:
+    """Estado de um contato. Campos com None ainda não foram definidos."""
+    __slots__ = ("status", "ultima_interacao", "ultimo_menu", "informacoes")
+
+    status: str
+    ultima_interacao: float
+    ultimo_menu: list
+    informacoes: dict
+
+    def __init__(self):
+        self.status = None
+        self.ultima_interacao = None
+        self.ultimo_menu = None
+        self.informacoes = None
+
+    def vazia(self):
+        return self.status is None and self.ultima_interacao is None and self.ultimo_menu is None and self.informacoes is None
+
+
+class CampoSessoes(MutableMapping):
+    """
+    Visão contato -> campo das sessões, com a mesma interface de dicionário usada antes
+    (status_usuario, ultimo_menu_usuario, ...). Leituras com get/in não criam entradas;
+    somente `informacoes_cliente[contato]` cria o dicionário do contato, como o defaultdict fazia.
+
+    No armazenamento compartilhado, alterações só persistem com o contato travado pela thread
+    (`global_state.travar`). Fora da trava, dicionários e listas são devolvidos somente para
+    leitura, para que uma alteração não se perca em silêncio.
+    """
+
+    def __init__(self, estado, campo, fabrica=None):
+        self._estado = estado
+        self._campo = campo
+        self._fabrica = fabrica
+
+    def _valor(self, contato):
+        sessao = self._estado._ler_sessao(contato)
+        valor = getattr(sessao, self._campo) if sessao is not None else None
+        if self._estado._backend.compartilhado and not self._estado.travado_pela_thread(contato):
+            return somente_leitura(valor)
+        return valor
+
+    def __getitem__(self, contato):
+        valor = self._valor(contato)
+        if valor is None:
+            if self._fabrica is None:
+                raise KeyError(contato)
+            if self._estado._backend.compartilhado and not self._estado.travado_pela_thread(contato):
+                return somente_leitura(self._fabrica())
+            with self._estado.travar(contato):
+                sessao = self._estado._obter_sessao(contato)
+                valor = getattr(sessao, self._campo)
+                if valor is None:
+                    valor = self._fabrica()
+                    setattr(sessao, self._campo, valor)
+        return valor
+
+    def __setitem__(self, contato, valor):
+        with self._estado.travar(contato):
+            setattr(self._estado._obter_sessao(contato), self._campo, valor)
+
+    def __delitem__(self, contato):
+        with self._estado.travar(contato):
+            sessao = self._estado._sessoes.get(contato)
+            if sessao is None or getattr(sessao, self._campo) is None:
+                raise KeyError(contato)
+            setattr(sessao, self._campo, None)
+            if sessao.vazia():
+                self._estado._sessoes.pop(contato, None)
+
+    def __contains__(self, contato):
+        return self._valor(contato) is not None
+
+    def get(self, contato, padrao=None):
+        valor = self._valor(contato)
+        return padrao if valor is None else valor
+
+    def pop(self, contato, *padrao):
+        with self._estado.travar(contato):
+            if contato in self:
+                valor = self[contato]
+                del self[contato]
+                return valor
+        if padrao:
+            return padrao[0]
+        raise KeyError(contato)
+
+    def __iter__(self):
+        return iter([contato for contato, _ in self._estado._listar(self._campo)])
+
+    def __len__(self):
+        return len(self._estado._listar(self._campo))
+
+    def items(self):
+        """Retorna uma cópia dos pares (contato, valor), segura para iterar enquanto outras threads alteram o estado."""
+        return self._estado._listar(self._campo)
+
+
+def somente_leitura(valor):
+    """Cópia/visão somente leitura de dicionários e listas da sessão."""
+    if isinstance(valor, dict):
+        return MappingProxyType(valor)
+    if isinstance(valor, list):
+        return tuple(valor)
+    return valor
+
+
+class TravaContato:
+    """
+    Trava (reentrante) de um contato. Na primeira entrada da thread, carrega a sessão do
+    armazenamento; na última saída, devolve-a (no armazenamento em memória, ambos não fazem nada).
+    """
+
+    def __init__(self, estado, contato):
+        self._estado = estado
+        self._contato = contato
+        self._lock = estado._lock_do_contato(contato)
+
+    def __enter__(self):
+        self._lock.acquire()
+        profundidade = self._estado._profundidade
+        try:
+            if not profundidade.get(self._contato):
+                self._estado._backend.abrir(self._contato)
+                self._estado._donos[self._contato] = threading.get_ident()
+            profundidade[self._contato] = profundidade.get(self._contato, 0) + 1
+        except Exception:
+            self._lock.release()
+            raise
+        return self
+
+    def __exit__(self, *excecao):
+        profundidade = self._estado._profundidade
+        try:
+            profundidade[self._contato] -= 1
+            if not profundidade[self._contato]:
+                del profundidade[self._contato]
+                del self._estado._donos[self._contato]
+                self._estado._backend.fechar(self._contato)
+        finally:
+            self._lock.release()
+
 
 class GlobalState:
     """Singleton para armazenar o estado global dos usuários."""
-    
-    _instance = None  
+
+    _instance = None
 
     def __new__(cls):
         if not cls._instance:
@@ -13,20 +165,81 @@ class GlobalState:
         return cls._instance
 
     def _reset_state(self):
-        """Inicializa os dicionários de estado."""
-        self.status_usuario = defaultdict(str)
-        self.ultima_interacao_usuario = defaultdict(float)
-        self.ultimo_menu_usuario = defaultdict(list)
-        self.informacoes_cliente = defaultdict(dict)
+        """Inicializa o armazenamento das sessões, os locks e as visões por campo."""
+        self._backend = criar_backend_sessoes(
+            SESSAO_BACKEND, SESSOES_DB_PATH, SESSAO_LEASE_SEGUNDOS, SESSAO_CACHE_LEITURA,
+            caminho_snapshot=SESSOES_SNAPSHOT_PATH if SESSAO_SNAPSHOT_INTERVALO > 0 else None,
+            intervalo_snapshot=SESSAO_SNAPSHOT_INTERVALO,
+            lock_do_contato=self._lock_do_contato,
+        )
+        self._sessoes = self._backend.sessoes  # contato -> SessaoUsuario (no modo compartilhado, só os contatos travados)
+        self._travas = [threading.RLock() for _ in range(NUM_TRAVAS)]
+        self._profundidade = {}  # contato -> entradas na trava (protegido pelo lock do próprio contato)
+        self._donos = {}  # contato -> thread que está com a trava
+        self._ao_limpar = []  # Funções chamadas com o contato quando seus dados são removidos
+        self.status_usuario = CampoSessoes(self, "status")
+        self.ultima_interacao_usuario = CampoSessoes(self, "ultima_interacao")
+        self.ultimo_menu_usuario = CampoSessoes(self, "ultimo_menu")
+        self.informacoes_cliente = CampoSessoes(self, "informacoes", dict)
+
+    def travar(self, contato):
+        """
+        Retorna a trava (reentrante) do contato. Deve envolver todo o processamento de uma
+        mensagem ou verificação do contato, para que threads (ou processos, no armazenamento
+        compartilhado) diferentes não o alterem ao mesmo tempo.
+        """
+        return TravaContato(self, contato)
+
+    def travado_pela_thread(self, contato):
+        """Indica se a thread atual está com a trava do contato."""
+        return self._donos.get(contato) == threading.get_ident()
+
+    def _lock_do_contato(self, contato):
+        return self._travas[hash(contato) % NUM_TRAVAS]
+
+    def restaurar_sessoes(self):
+        """Restaura as sessões do último snapshot e passa a gravá-lo periodicamente. Chamar antes de atender mensagens."""
+        quantidade = self._backend.restaurar()
+        self._backend.iniciar_snapshots()
+        return quantidade
+
+    @property
+    def compartilhado(self):
+        """Indica se as sessões são compartilhadas entre processos (vários workers)."""
+        return self._backend.compartilhado
+
+    def assumir_servico(self, nome, duracao):
+        """Obtém ou renova a posse de um serviço que só um processo deve executar (veja o armazenamento de sessões)."""
+        return self._backend.assumir_servico(nome, duracao)
+
+    def _ler_sessao(self, contato):
+        """Sessão do contato para leitura, sem travá-lo."""
+        sessao = self._sessoes.get(contato) if self._backend.compartilhado else None
+        return sessao if sessao is not None else self._backend.ler(contato)
+
+    def _listar(self, campo):
+        """Pares (contato, valor) do campo, com as sessões travadas por este processo prevalecendo."""
+        valores = dict(self._backend.listar(campo))
+        for contato, sessao in list(self._sessoes.items()):
+            valores[contato] = getattr(sessao, campo)
+        return [(contato, valor) for contato, valor in valores.items() if valor is not None]
+
+    def _obter_sessao(self, contato):
+        sessao = self._sessoes.get(contato)
+        if sessao is None:
+            sessao = self._sessoes.setdefault(contato, SessaoUsuario())
+        return sessao
+
+    def ao_limpar(self, funcao):
+        """Registra `funcao(contato)` para ser chamada sempre que os dados de um contato forem removidos."""
+        self._ao_limpar.append(funcao)
 
     def limpar_dados_usuario(self, contato):
         """Remove os dados do usuário do estado global."""
-        removido = False
-
-        for attr in ["status_usuario", "ultima_interacao_usuario", "ultimo_menu_usuario", "informacoes_cliente"]:
-            if contato in getattr(self, attr):
-                del getattr(self, attr)[contato]
-                removido = True
+        with self.travar(contato):
+            removido = self._sessoes.pop(contato, None) is not None
+            for funcao in self._ao_limpar:
+                funcao(contato)
 
         if removido:
             logger.info(f"🗑️ Dados do usuário {contato} foram removidos do estado global.")
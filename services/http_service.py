@@ -0,0 +1,29 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from config import GATEWAY_POOL_MAX, GATEWAY_TIMEOUT_CONEXAO, GATEWAY_TIMEOUT_LEITURA
+from logger import logger
+
+_sessao = None
+_lock = threading.Lock()
+
+def obter_sessao_http():
+    """
+    Retorna a sessão HTTP compartilhada com o gateway do WhatsApp.
+    As conexões são mantidas abertas (keep-alive) e reutilizadas por todas as threads.
+    """
+    global _sessao
+    if _sessao is None:
+        with _lock:
+            if _sessao is None:
+                sessao = requests.Session()
+                adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=GATEWAY_POOL_MAX, pool_block=True)
+                sessao.mount("http://", adaptador)
+                sessao.mount("https://", adaptador)
+                _sessao = sessao
+                logger.info(f"🔌 Sessão HTTP do gateway criada (pool máximo: {GATEWAY_POOL_MAX} conexões).")
+    return _sessao
+
+def post_gateway(url, payload):
+    """Envia um POST ao gateway usando a sessão compartilhada e os timeouts configurados."""
+    return obter_sessao_http().post(url, json=payload, timeout=(GATEWAY_TIMEOUT_CONEXAO, GATEWAY_TIMEOUT_LEITURA))
@@ -1,6 +1,10 @@
 import pandas as pd
+import threading
 from config import MATERIAL_FILE_PATH
 from logger import logger
+from services.recarga_service import monitor_arquivos, assinatura_arquivo
+
+COLUNAS_TEXTO_MP = ["cor_materia_prima", "espessura_materia_prima", "beneficiamento", "id_materia_prima", "descricao_materia_prima"]
 
 def carregar_tabela_mp():
     """Carrega a tabela de matérias-primas do arquivo Excel."""
@@ -15,18 +19,130 @@ def carregar_tabela_mp():
     
     return None  # Retorna None se houver erro
 
+
+class CatalogoMateriaPrima:
+    """
+    Tabela de matérias-primas normalizada (textos sem espaços nas bordas) com os índices
+    usados no fluxo de escolha: cor -> espessura -> beneficiamento -> (ID, valor do m²).
+    As opções mantêm a ordem em que aparecem na planilha.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self.cores = []
+        self.espessuras = {}  # cor -> [espessuras]
+        self.beneficiamentos = {}  # (cor, espessura) -> [beneficiamentos]
+        self.combinacoes = {}  # (cor, espessura, beneficiamento) -> (id_materia_prima, valor_m2)
+        self.descricoes = {}  # id_materia_prima -> descrição
+        self.precos = {}  # id_materia_prima -> valor_m2
+        self.linhas = []  # (cor, espessura, beneficiamento, id_materia_prima, valor_m2) na ordem da planilha
+
+        if df is None or df.empty:
+            return
+
+        for coluna in COLUNAS_TEXTO_MP:
+            if coluna in df.columns:
+                df[coluna] = df[coluna].map(lambda v: v.strip() if isinstance(v, str) else v)
+
+        def valores(coluna):
+            if coluna not in df.columns:
+                return [None] * len(df)
+            return [None if pd.isna(v) else v for v in df[coluna].tolist()]
+
+        for cor, espessura, beneficiamento, id_mp, valor, descricao in zip(
+            valores("cor_materia_prima"), valores("espessura_materia_prima"), valores("beneficiamento"),
+            valores("id_materia_prima"), valores("valor_materia_prima_m2"), valores("descricao_materia_prima"),
+        ):
+            if cor is not None and cor not in self.espessuras:
+                self.cores.append(cor)
+                self.espessuras[cor] = []
+            if cor is not None and espessura is not None:
+                if espessura not in self.espessuras[cor]:
+                    self.espessuras[cor].append(espessura)
+                lista = self.beneficiamentos.setdefault((cor, espessura), [])
+                if beneficiamento is not None and beneficiamento not in lista:
+                    lista.append(beneficiamento)
+            if id_mp is not None:
+                self.descricoes.setdefault(id_mp, descricao)
+                self.precos.setdefault(id_mp, valor)
+                self.linhas.append((cor, espessura, beneficiamento, id_mp, valor))
+                self.combinacoes.setdefault((cor, espessura, beneficiamento), (id_mp, valor))
+
+        logger.info(f"🗂️ Catálogo de matérias-primas indexado: {len(self.cores)} cores, {len(self.combinacoes)} combinações.")
+
+    def buscar(self, cor=None, espessura=None, beneficiamento=None):
+        """Retorna (id, valor do m²) da primeira matéria-prima compatível com os filtros informados."""
+        if cor and espessura and beneficiamento:
+            return self.combinacoes.get((cor, espessura, beneficiamento), (None, None))
+
+        for linha in self.linhas:
+            if (not cor or linha[0] == cor) and (not espessura or linha[1] == espessura) and (not beneficiamento or linha[2] == beneficiamento):
+                return linha[3], linha[4]
+        return None, None
+
+
+class MateriaPrimaCache:
+    """Mantém o catálogo de matérias-primas em memória, recarregando-o em segundo plano quando a planilha muda."""
+    _catalogo = None
+    _lock = threading.Lock()
+    _monitorado = False
+
+    @classmethod
+    def obter_catalogo(cls):
+        """Retorna o catálogo atual, carregando a planilha na primeira chamada."""
+        catalogo = cls._catalogo
+        if catalogo is None:
+            cls._recarregar(forcar_atualizacao=False)
+            catalogo = cls._catalogo
+        return catalogo
+
+    @classmethod
+    def _recarregar(cls, forcar_atualizacao=True):
+        """Lê a planilha e publica o novo catálogo. Em caso de erro, mantém o catálogo anterior."""
+        with cls._lock:
+            if cls._catalogo is not None and not forcar_atualizacao:
+                return
+
+            assinatura = assinatura_arquivo(MATERIAL_FILE_PATH)
+            df = carregar_tabela_mp()
+
+            if df is not None:
+                cls._catalogo = CatalogoMateriaPrima(df)  # Troca atômica
+            elif cls._catalogo is None:
+                cls._catalogo = CatalogoMateriaPrima(None)
+
+            if not cls._monitorado:
+                monitor_arquivos.registrar(MATERIAL_FILE_PATH, cls._recarregar, assinatura)
+                cls._monitorado = True
+
+
 def gerar_menu_materia_prima():
     """Gera o menu inicial com base na coluna 'cor_materia_prima' da tabela de matérias-primas."""
-    df = carregar_tabela_mp()
-    if df is None or df.empty:
+    opcoes_iniciais = list(MateriaPrimaCache.obter_catalogo().cores)
+    if not opcoes_iniciais:
         logger.warning("⚠️ A tabela de matérias-primas está vazia ou não foi carregada.")
         return []
 
-    opcoes_iniciais = df["cor_materia_prima"].dropna().unique().tolist()
     logger.info(f"📋 {len(opcoes_iniciais)} opções carregadas para o menu de matéria-prima.")
     
     return opcoes_iniciais
 
+def listar_espessuras(cor_materia_prima):
+    """Retorna as espessuras disponíveis para a cor escolhida."""
+    return list(MateriaPrimaCache.obter_catalogo().espessuras.get(cor_materia_prima, []))
+
+def listar_beneficiamentos(cor_materia_prima, espessura_materia_prima):
+    """Retorna os beneficiamentos disponíveis para a cor e espessura escolhidas."""
+    return list(MateriaPrimaCache.obter_catalogo().beneficiamentos.get((cor_materia_prima, espessura_materia_prima), []))
+
+def obter_descricao_materia_prima(id_materia_prima):
+    """Retorna a descrição da matéria-prima pelo ID, ou None se não existir."""
+    return MateriaPrimaCache.obter_catalogo().descricoes.get(str(id_materia_prima).strip())
+
+def obter_preco_materia_prima(id_materia_prima):
+    """Retorna o valor do m² da matéria-prima pelo ID, ou None se não existir."""
+    return MateriaPrimaCache.obter_catalogo().precos.get(str(id_materia_prima).strip())
+
 # def filtrar_mp_por_escolhas(cor_materia_prima=None, espessura_materia_prima=None, beneficiamento=None):
 #     """Filtra as matérias-primas com base nas escolhas do usuário."""
 #     df = carregar_tabela_mp()
@@ -68,33 +184,19 @@ def gerar_menu_materia_prima():
 
 def buscar_materia_prima(dados_usuario):
     """Busca o ID e o valor da matéria-prima com base nas escolhas do usuário."""
-    df_mp = carregar_tabela_mp()
-    if df_mp is None or df_mp.empty:
+    catalogo = MateriaPrimaCache.obter_catalogo()
+    if not catalogo.linhas:
         logger.error("❌ Tabela de matéria-prima está vazia ou não foi encontrada.")
         return None, None
 
-    filtros = {
-        "cor_materia_prima": dados_usuario.get("cor_materia_prima"),
-        "espessura_materia_prima": dados_usuario.get("espessura_materia_prima"),
-        "beneficiamento": dados_usuario.get("beneficiamento"),
-    }
-
-    for coluna, valor in filtros.items():
-        if valor and coluna in df_mp.columns:
-            df_mp = df_mp[df_mp[coluna] == valor]
+    id_materia_prima, valor_mp_m2 = catalogo.buscar(
+        dados_usuario.get("cor_materia_prima"),
+        dados_usuario.get("espessura_materia_prima"),
+        dados_usuario.get("beneficiamento"),
+    )
 
-    if df_mp.empty:
+    if id_materia_prima is None:
         logger.warning("⚠️ Nenhuma matéria-prima encontrada com os filtros aplicados.")
         return None, None
 
-    # Garante que colunas essenciais existam
-    colunas_essenciais = ["id_materia_prima", "valor_materia_prima_m2"]
-    if not all(col in df_mp.columns for col in colunas_essenciais):
-        logger.error(f"❌ Colunas essenciais ausentes na tabela de matéria-prima: {colunas_essenciais}")
-        return None, None
-
-    materia_prima = df_mp.iloc[0]
-    id_materia_prima = materia_prima["id_materia_prima"]
-    valor_mp_m2 = materia_prima["valor_materia_prima_m2"]
-
     return id_materia_prima, valor_mp_m2
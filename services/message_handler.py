@@ -1,22 +1,30 @@
-import pandas as pd
-import os
 from logger import logger
 from services.client_service import ClienteCache
-from services.message_service import enviar_mensagem, salvar_mensagem_em_arquivo
-from services.product_service import gerar_menu_inicial, filtrar_projetos_por_escolhas, gerar_menu_por_definicao, carregar_tabela_projetos
+from services.message_service import enviar_mensagem, salvar_mensagem_em_arquivo, agrupar_mensagens
+from services.product_service import gerar_menu_inicial, filtrar_projetos_por_escolhas, gerar_menu_por_definicao
 from services.state_service import atualizar_ultima_atividade
-from services.materials_service import gerar_menu_materia_prima, buscar_materia_prima, carregar_tabela_mp
+from services.materials_service import gerar_menu_materia_prima, buscar_materia_prima, listar_espessuras, listar_beneficiamentos
 # from services.materials_service import filtrar_mp_por_escolhas
 from services.formula_service import calcular_pecas
-from services.pedidos_service import calcular_valores_pecas, obter_nome_projeto, obter_nome_materia_prima, salvar_pedido, atualizar_status_pedido, visualizar_orcamentos
+from services.pedidos_service import salvar_pedidos_lote, atualizar_status_pedido, visualizar_orcamentos
+from services.resumo_service import ResumoPedidoCache, renderizar_resumo, projetos_dos_pedidos_acumulados
+from services.tabela_padrao_service import medidas_padrao, projeto_padrao, consultar_preco_padrao, TabelaPadrao
 from services.global_state import global_state
-from config import OUTPUT_DIR
 
-df_clientes = ClienteCache.carregar_clientes()
-df_projetos = carregar_tabela_projetos()
-df_mp = carregar_tabela_mp()
+# Carrega os clientes e, ao montar a tabela de preços padrão, os catálogos de projetos, matérias-primas
+# e fórmulas antes da primeira mensagem (a tabela passa a ser recalculada a cada recarga dos catálogos)
+ClienteCache.carregar_clientes()
+TabelaPadrao.obter_tabela()
+
+def processar_mensagem(contato, texto):
+    """
+    Processa uma mensagem recebida como um turno da conversa:
+    todas as respostas do bot são agrupadas e enviadas juntas ao final.
+    O estado do contato fica travado durante o turno (o envio ocorre depois de liberá-lo).
+    """
+    with agrupar_mensagens(contato), global_state.travar(contato):
+        gerenciar_mensagem_recebida(contato, texto)
 
-PEDIDOS_FILE_PATH = os.path.join(OUTPUT_DIR, "pedidos.xlsx")
 
 def gerenciar_mensagem_recebida(contato, texto):
     """
@@ -46,7 +54,7 @@ def gerenciar_mensagem_recebida(contato, texto):
     if status == "inicial":
         mostrar_menu_inicial(contato, nome_cliente)
     elif status == "menu_inicial":
-        processar_menu_inicial(contato, texto, nome_cliente)
+        processar_menu_inicial(contato, texto, nome_cliente, cliente_info.get("id_cliente"))
     elif status == "aguardando_confirmacao_pedido":
         processar_confirmacao_pedido(contato, texto)
     elif status == "definindo_medida":
@@ -161,9 +169,10 @@ def iniciar_conversa(contato, nome_cliente):
         salvar_mensagem_em_arquivo(contato, nome_cliente, "Bot: Menu inicial vazio.")
         finalizar_conversa(contato, nome_cliente)
 
-def processar_menu_inicial(contato, texto, nome_cliente):
+def processar_menu_inicial(contato, texto, nome_cliente, id_cliente=None):
     """
     Processa a escolha do usuário no menu inicial.
+    `id_cliente` é o do cadastro já consultado no início do turno.
     """
     try:
         escolha = int(texto)
@@ -172,7 +181,11 @@ def processar_menu_inicial(contato, texto, nome_cliente):
             perguntar_tipo_medida(contato, nome_cliente)
         elif escolha == 2:
             # Usuário quer visualizar orçamentos
-            visualizar_orcamentos(contato, nome_cliente)
+            if id_cliente is None:
+                logger.warning(f"⚠️ Cadastro de {contato} sem id_cliente. Não é possível listar os orçamentos.")
+                enviar_mensagem(contato, "⚠️ Não foi possível localizar seu cadastro. Procure um vendedor. 📞")
+                return
+            visualizar_orcamentos(contato, id_cliente)
         else:
             raise ValueError("Opção inválida.")
     except ValueError:
@@ -192,38 +205,13 @@ def processar_escolha_orcamento(contato, texto):
 
         id_pedido, nome_pedido = opcoes[escolha]
 
-        # 🔹 Carregar todas as peças do pedido selecionado
-        df_pedidos = pd.read_excel(PEDIDOS_FILE_PATH)
-        df_pedido = df_pedidos[df_pedidos["id_pedido"] == id_pedido]
+        # 🔹 Resumo do pedido selecionado (em cache até o pedido ser alterado)
+        resumo_pedido = ResumoPedidoCache.obter_resumo(id_pedido)
 
-        if df_pedido.empty:
+        if not resumo_pedido:
             enviar_mensagem(contato, "❌ Erro ao carregar o pedido. Tente novamente.")
             return
 
-        # 🔹 Construir resumo do pedido
-        resumo_pedido = f"📝 *Resumo do Pedido: {nome_pedido}*\n"
-        total_geral = 0
-        total_m2 = 0
-        total_pecas = 0
-
-        for _, peca in df_pedido.iterrows():
-            resumo_pedido += f"*►►►►►►►►►◄◄◄◄◄◄◄◄◄*\n"
-            resumo_pedido += f"📌 *Projeto:* {peca['descricao_projeto']}\n"
-            resumo_pedido += f"🔹 *Matéria-prima:* {peca['descricao_materia_prima']}\n"
-            resumo_pedido += f"💰 *Valor por m²:* R${peca['valor_mp_m2']:.2f}\n"
-            resumo_pedido += f"🏢 *Quantidade de Projetos:* {df_pedido['id_pedido'].nunique()}\n\n"
-            resumo_pedido += f"🔸 {peca['quantidade']}x {peca['descricao_peca']} - {peca['altura_peca']}mm x {peca['largura_peca']}mm\n"
-            resumo_pedido += f"📏 Área: {peca['area_m2']}m² | 💰 Valor: R${peca['valor_total']:.2f}\n"
-            total_m2 += peca["area_m2"]
-            total_pecas += peca["quantidade"]
-            total_geral += peca["valor_total"]
-
-        resumo_pedido += f"*=========================*\n"
-        resumo_pedido += f"📏 *Área total:* {total_m2:.2f}m²\n"
-        resumo_pedido += f"🏢 *Quantidade total de peças:* {total_pecas}\n"
-        resumo_pedido += f"💰 *Valor total do pedido:* R${total_geral:.2f}\n"
-        resumo_pedido += f"*=========================*\n"
-
         enviar_mensagem(contato, resumo_pedido)
 
         # 🔹 Perguntar se deseja autorizar produção, manter orçamento ou cancelar
@@ -285,8 +273,8 @@ def processar_menu_dinamico_produto(contato, texto, nome_cliente, estado_atual):
 
         for definicao in definicoes_ordenadas:
             if definicao not in informacoes_cliente:
-                # Passar o DataFrame e os filtros corretamente
-                opcoes_proxima_definicao = gerar_menu_por_definicao(pd.DataFrame(projetos), definicao, dados_para_filtrar)
+                # Opções do próximo nível direto da árvore de projetos
+                opcoes_proxima_definicao = gerar_menu_por_definicao(definicao, dados_para_filtrar)
                 if opcoes_proxima_definicao:
                     proxima_definicao = definicao
                     break
@@ -350,24 +338,8 @@ def processar_projeto(contato, nome_cliente, projeto):
     """
     global_state.informacoes_cliente[contato]["projeto_escolhido"] = projeto
 
-    descricao_projeto = projeto.get("descricao_projeto", "").lower()
-    
-    # Definir altura automaticamente apenas para PEÇAS PADRÃO
-    if "box padrão" in descricao_projeto:
-        altura = 1845 if "fixo" in descricao_projeto else 1880
-    elif "janela padrão" in descricao_projeto:
-        altura = 938 if "fixo" in descricao_projeto else 975
-    else:
-        altura = None  # Outros tipos de projetos NÃO têm altura automática
-
-    # Definir largura automática apenas se for PEÇA PADRÃO
-    largura = None
-    if "box padrão" in descricao_projeto or "janela padrão" in descricao_projeto:
-        largura_opcao = global_state.informacoes_cliente[contato].get("definicao_3")  # A largura vem dessa definição
-        if largura_opcao and isinstance(largura_opcao, str):
-            numeros_encontrados = [int(s) for s in largura_opcao.split() if s.isdigit()]
-            if numeros_encontrados:
-                largura = numeros_encontrados[0]  # Pegamos o primeiro número encontrado
+    # Definir altura e largura automaticamente apenas para PEÇAS PADRÃO (largura vem da definicao_3)
+    altura, largura = medidas_padrao(projeto, global_state.informacoes_cliente[contato].get("definicao_3"))
 
     if altura is not None and largura is not None:
         global_state.informacoes_cliente[contato]["altura"] = altura
@@ -508,15 +480,7 @@ def processar_menu_dinamico_mp(contato, texto, estado_atual):
             return
 
         # ✅ Para "Fixo", "Janela" ou outros projetos, primeiro perguntar a espessura
-        df_mp = carregar_tabela_mp()
-        df_mp["espessura_materia_prima"] = df_mp["espessura_materia_prima"].str.strip()
-
-        opcoes_espessura = (
-            df_mp[df_mp["cor_materia_prima"].str.strip() == cor_mp]["espessura_materia_prima"]
-            .dropna()
-            .unique()
-            .tolist()
-        )
+        opcoes_espessura = listar_espessuras(cor_mp)
 
         logger.debug(f"📏 Opções de espessura para {cor_mp}: {opcoes_espessura}")
 
@@ -527,15 +491,7 @@ def processar_menu_dinamico_mp(contato, texto, estado_atual):
 
         # ✅ Se a espessura já foi escolhida e for "Fixo", perguntar beneficiamento
         if "fixo" in definicao_1:
-            beneficiamentos_disponiveis = (
-                df_mp[
-                    (df_mp["cor_materia_prima"].str.strip() == cor_mp) &
-                    (df_mp["espessura_materia_prima"].str.strip() == informacoes_cliente.get("espessura_materia_prima", ""))
-                ]["beneficiamento"]
-                .dropna()
-                .unique()
-                .tolist()
-            )
+            beneficiamentos_disponiveis = listar_beneficiamentos(cor_mp, informacoes_cliente.get("espessura_materia_prima", ""))
 
             logger.debug(f"📋 Beneficiamentos disponíveis para fixo: {beneficiamentos_disponiveis}")
 
@@ -556,6 +512,30 @@ def processar_menu_dinamico_mp(contato, texto, estado_atual):
         repetir_menu(contato, "Bot")
 
 
+def consultar_entrada_padrao(dados_usuario):
+    """
+    Retorna a entrada da tabela de preços padrão para a escolha atual, ou None se não for peça padrão.
+    No chat, a entrada fornece as peças e a matéria-prima (ID e valor do m²); o valor do pedido é
+    calculado depois para a quantidade escolhida, pois a área cobrada é arredondada por linha já
+    multiplicada pela quantidade (o valor da tabela só vale para 1 unidade).
+    """
+    projeto = dados_usuario.get("projeto_escolhido", {})
+    if not projeto_padrao(projeto):
+        return None
+    return consultar_preco_padrao(projeto.get("id_projeto"), dados_usuario.get("largura"), dados_usuario.get("cor_materia_prima"))
+
+
+def pecas_do_projeto(dados_usuario, id_formula, altura, largura):
+    """Peças de 1 unidade do projeto: da tabela padrão quando houver entrada, senão calculadas pela fórmula."""
+    entrada_padrao = consultar_entrada_padrao(dados_usuario)
+    if entrada_padrao and entrada_padrao["altura"] == altura:
+        return [
+            {"nome_peca": peca["nome_peca"], "quantidade": peca["quantidade"], "dimensoes": (peca["altura_peca"], peca["largura_peca"])}
+            for peca in entrada_padrao["pecas"]
+        ]
+    return calcular_pecas(id_formula, altura, largura)
+
+
 def finalizar_selecao_mp(contato, informacoes_cliente):
     """
     Finaliza a seleção de matéria-prima e continua para a próxima etapa.
@@ -578,8 +558,8 @@ def finalizar_selecao_mp(contato, informacoes_cliente):
         enviar_mensagem(contato, "❌ Erro interno: Fórmula do projeto não encontrada. Reinicie o processo.")
         return
 
-    # **Usar calcular_pecas do formula_service.py**
-    pecas = calcular_pecas(id_formula, altura, largura)
+    # **Peça padrão: consulta a tabela pré-calculada; demais projetos usam calcular_pecas do formula_service.py**
+    pecas = pecas_do_projeto(informacoes_cliente, id_formula, altura, largura)
 
     if not pecas:
         enviar_mensagem(contato, "❌ Erro ao calcular as peças. Tente novamente.")
@@ -625,7 +605,7 @@ def processar_quantidade(contato, texto):
         # Recuperar peças calculadas com base na fórmula
         altura = dados_usuario.get("altura", 0)
         largura = dados_usuario.get("largura", 0)
-        pecas = calcular_pecas(id_formula, altura, largura)
+        pecas = pecas_do_projeto(dados_usuario, id_formula, altura, largura)
 
         if not pecas:
             enviar_mensagem(contato, "❌ Erro ao calcular as peças. Tente novamente.")
@@ -696,7 +676,11 @@ def adicionar_pecas_pedido(contato, nome_cliente):
     dados_usuario["regiao"] = regiao
 
     pedidos_acumulados = dados_usuario.get("pedidos", [])
-    id_materia_prima, valor_mp_m2 = buscar_materia_prima(dados_usuario)
+    entrada_padrao = consultar_entrada_padrao(dados_usuario)
+    if entrada_padrao:
+        id_materia_prima, valor_mp_m2 = entrada_padrao["id_materia_prima"], entrada_padrao["valor_mp_m2"]
+    else:
+        id_materia_prima, valor_mp_m2 = buscar_materia_prima(dados_usuario)
 
     if not id_materia_prima or not valor_mp_m2:
         enviar_mensagem(contato, "❌ Erro: Não foi possível identificar a matéria-prima. Tente novamente.")
@@ -713,6 +697,7 @@ def adicionar_pecas_pedido(contato, nome_cliente):
         "pecas": pecas_calculadas,
         "altura_vao": dados_usuario.get("altura"),
         "largura_vao": dados_usuario.get("largura"),
+        "quantidade_projetos": dados_usuario.get("quantidade_total", 1),
     }
 
     pedidos_acumulados.append(novo_pedido)
@@ -781,34 +766,7 @@ def processar_resposta_finalizou(contato, texto):
         enviar_mensagem(contato, "❌ Erro interno: ID do cliente não encontrado.")
         return
 
-    resumo_pedido = f"📝 *Resumo do Pedido: {nome_pedido}*\n"
-    total_geral = 0
-    total_m2 = 0
-    total_pecas = 0
-
-    for pedido in pedidos_acumulados:
-        nome_projeto = obter_nome_projeto(pedido["id_projeto"])
-        nome_mp = obter_nome_materia_prima(pedido["id_materia_prima"])
-        pecas_calculadas, valor_total = calcular_valores_pecas(pedido["pecas"], pedido["valor_mp_m2"])
-        total_geral += valor_total
-
-        resumo_pedido += f"*►►►►►►►►►◄◄◄◄◄◄◄◄◄*\n"
-        resumo_pedido += f"📌 *Projeto:* {nome_projeto}\n"
-        resumo_pedido += f"🔹 *Matéria-prima:* {nome_mp}\n"
-        resumo_pedido += f"💰 *Valor por m²:* R${pedido['valor_mp_m2']:.2f}\n"
-        resumo_pedido += f"🏢 *Quantidade de Projetos:* {dados_usuario.get('quantidade_total', 1)}\n\n"
-
-        for peca in pecas_calculadas:
-            resumo_pedido += f"🔸 {peca['quantidade']}x {peca['descricao_peca']} - {peca['altura_peca']}mm x {peca['largura_peca']}mm\n"
-            resumo_pedido += f"📏 Área: {peca['area_m2']}m² | 💰 Valor: R${peca['valor_total']:.2f}\n"
-            total_m2 += peca["area_m2"]
-            total_pecas += peca["quantidade"]
-
-    resumo_pedido += f"*=========================*\n"
-    resumo_pedido += f"📏 *Área total:* {total_m2:.2f}m²\n"
-    resumo_pedido += f"🏢 *Quantidade total de peças:* {total_pecas}\n"
-    resumo_pedido += f"💰 *Valor total do pedido:* R${total_geral:.2f}\n"
-    resumo_pedido += f"*=========================*\n"
+    resumo_pedido = renderizar_resumo(nome_pedido, projetos_dos_pedidos_acumulados(pedidos_acumulados))
 
     # 🔹 NOVO: Perguntar sobre autorização corretamente
     enviar_mensagem(contato, resumo_pedido)
@@ -886,24 +844,11 @@ def processar_confirmacao_pedido(contato, texto):
     if texto in ["1", "2"]:  # Autorizar produção ou manter como orçamento
         status_final = "AUTORIZADO" if texto == "1" else "ORÇAMENTO"
 
-        for pedido in pedidos_acumulados:
-            logger.debug(f"📝 Salvando pedido: {pedido}")  
-            logger.debug(f"📦 Peças recebidas para salvar: {pedido.get('pecas', [])}")
-
-            salvar_pedido(
-                id_cliente=id_cliente,
-                nome_cliente=pedido.get("nome_cliente", "Cliente Desconhecido"),
-                regiao=pedido.get("regiao", "Região Desconhecida"),
-                id_projeto=pedido.get("id_projeto"),
-                id_materia_prima=pedido.get("id_materia_prima"),
-                altura_vao=pedido.get("altura_vao"),
-                largura_vao=pedido.get("largura_vao"),
-                pecas_calculadas=pedido.get("pecas", []),
-                valor_mp_m2=pedido.get("valor_mp_m2", 0.0),
-                nome_pedido=nome_pedido
-            )
-
-        atualizar_status_pedido(nome_pedido, status_final)
+        logger.debug(f"📝 Salvando {len(pedidos_acumulados)} projeto(s) no pedido '{nome_pedido}'.")
+
+        if not salvar_pedidos_lote(id_cliente, pedidos_acumulados, nome_pedido, status_final):
+            enviar_mensagem(contato, "❌ Erro ao salvar seu pedido. Tente novamente mais tarde.")
+            return
 
         if texto == "1":
             mensagem_final = f"✅ Pedido **{nome_pedido}** foi AUTORIZADO para produção! 🏭"
@@ -1,48 +1,300 @@
-import os
+import threading
 import requests
-from datetime import datetime
-from config import BASE_URL, CONVERSATIONS_DIR
+from collections import deque
+from contextlib import contextmanager
+from config import BASE_URL, GATEWAY_TAMANHO_MAX_MENSAGEM, GATEWAY_REENVIO_IDADE_MAX, OUTBOX_IDADE_MAX, OUTBOX_INTERVALO_REENVIO
 from logger import logger  # Usando o módulo de logs
+from services.http_service import post_gateway
+from services.rate_limit_service import limitador_gateway
+from services.retry_service import circuito_gateway, agendador_reenvio, calcular_backoff
+from services.outbox_service import outbox
+from services.processo_service import processo_ativo
+from services.transcricao_service import escritor_transcricoes
 import time
 
+SEPARADOR_MENSAGENS = "\n\n"
+
+# Tempo pelo qual o processo que está (re)enviando uma mensagem a reivindica na outbox: cobre todas as
+# tentativas agendadas (que desistem após GATEWAY_REENVIO_IDADE_MAX) e uma drenagem de folga
+DURACAO_REIVINDICACAO = GATEWAY_REENVIO_IDADE_MAX + OUTBOX_INTERVALO_REENVIO
+
+# Mensagens aguardando reenvio, por contato, na ordem em que foram enviadas. Só a primeira de cada
+# fila tem tentativa agendada; as demais (e as novas mensagens do contato) esperam por ela, para que
+# o contato as receba na ordem certa.
+_filas_reenvio = {}  # contato -> deque de (mensagem, tentativas, intervalo, criado_em, id_outbox)
+_lock_filas_reenvio = threading.Lock()
+
+# Buffer de saída do turno atual (um por thread)
+_turno = threading.local()
+
+@contextmanager
+def agrupar_mensagens(contato):
+    """
+    Agrupa todas as mensagens enviadas ao contato dentro do bloco e as envia juntas ao final,
+    respeitando a ordem e o tamanho máximo aceito pelo gateway.
+    """
+    if getattr(_turno, "contato", None) is not None:
+        yield  # Já existe um agrupamento ativo nesta thread
+        return
+
+    _turno.contato = contato
+    _turno.mensagens = []
+    try:
+        yield
+    finally:
+        mensagens = _turno.mensagens
+        _turno.contato = None
+        _turno.mensagens = []
+
+        for bloco in dividir_mensagens(mensagens, GATEWAY_TAMANHO_MAX_MENSAGEM):
+            enviar_ao_gateway(contato, bloco)
+
+def dividir_mensagens(mensagens, tamanho_max):
+    """
+    Junta as mensagens na menor quantidade de blocos que respeitam o tamanho máximo.
+    Mensagens maiores que o limite são quebradas por linha (ou, em último caso, por caractere).
+    """
+    partes = []
+    for mensagem in mensagens:
+        if len(mensagem) <= tamanho_max:
+            partes.append(mensagem)
+            continue
+        linha_atual = ""
+        for linha in mensagem.split("\n"):
+            while len(linha) > tamanho_max:
+                if linha_atual:
+                    partes.append(linha_atual)
+                    linha_atual = ""
+                partes.append(linha[:tamanho_max])
+                linha = linha[tamanho_max:]
+            if linha_atual and len(linha_atual) + 1 + len(linha) > tamanho_max:
+                partes.append(linha_atual)
+                linha_atual = linha
+            else:
+                linha_atual = f"{linha_atual}\n{linha}" if linha_atual else linha
+        if linha_atual:
+            partes.append(linha_atual)
+
+    blocos = []
+    for parte in partes:
+        if blocos and len(blocos[-1]) + len(SEPARADOR_MENSAGENS) + len(parte) <= tamanho_max:
+            blocos[-1] += SEPARADOR_MENSAGENS + parte
+        else:
+            blocos.append(parte)
+    return blocos
+
 def enviar_mensagem(contato, mensagem, tentativas=3, intervalo=2):
-    """Envia uma mensagem via API do WhatsApp, com tentativas de reenvio em caso de falha."""
-    
-    time.sleep(0.2)
+    """
+    Envia uma mensagem via API do WhatsApp.
+    Dentro de um bloco `agrupar_mensagens` do mesmo contato, a mensagem é acumulada e enviada ao final do turno.
+    """
+    if getattr(_turno, "contato", None) == contato:
+        _turno.mensagens.append(mensagem)
+        return True
+
+    return enviar_ao_gateway(contato, mensagem, tentativas, intervalo)
 
-    if contato.lower() == "status":
+def enviar_ao_gateway(contato, mensagem, tentativas=3, intervalo=2):
+    """
+    Envia uma mensagem via API do WhatsApp.
+    A mensagem é gravada na outbox antes do envio. Em caso de falha (ou com o circuito do gateway aberto),
+    o reenvio é agendado em segundo plano com backoff exponencial, sem bloquear a thread atual.
+    """
+    if str(contato).lower() == "status":
         logger.warning("🚫 Tentativa de envio de mensagem para 'status' bloqueada.")
         return False
 
+    try:
+        id_outbox = outbox.registrar(contato, mensagem, DURACAO_REIVINDICACAO)
+    except Exception as e:
+        logger.error(f"❌ Erro ao registrar mensagem para {contato} na outbox: {e}", exc_info=True)
+        id_outbox = None
+
+    if enfileirar_atras_de_reenvios(contato, mensagem, tentativas, intervalo, id_outbox):
+        logger.info(f"📨 Mensagem para {contato} enfileirada atrás das que aguardam reenvio.")
+        return False
+
+    if not circuito_gateway.permitir():
+        logger.warning(f"⚠️ Circuito do gateway aberto. Mensagem para {contato} enfileirada para reenvio.")
+        enfileirar_reenvio(contato, mensagem, tentativas, intervalo, time.time(), id_outbox)
+        return False
+
+    if tentar_envio(contato, mensagem, id_outbox):
+        return True
+
+    if tentativas > 1:
+        enfileirar_reenvio(contato, mensagem, tentativas, intervalo, time.time(), id_outbox, tentativa=2)
+    else:
+        logger.error(f"❌ Falha ao enviar mensagem para {contato}. Mantida na outbox para reenvio.")
+        finalizar_reenvio(id_outbox)
+    return False  # Indica que a mensagem não foi entregue agora
+
+def tentar_envio(contato, mensagem, id_outbox=None):
+    """Faz uma única tentativa de envio, registrando o resultado no circuito do gateway e na outbox."""
+    # Respeita o limite de envios do gateway (sem espera quando não há rajada)
+    espera = limitador_gateway.aguardar(contato)
+    if espera > 0:
+        logger.debug(f"⏱️ Envio para {contato} aguardou {espera:.3f}s pelo limitador do gateway.")
+
     url = f"{BASE_URL}/whatsapp-session/sendText"
     payload = {"phone": contato, "message": mensagem}
 
-    for tentativa in range(1, tentativas + 1):
+    try:
+        response = post_gateway(url, payload)
+        response.raise_for_status()
+        circuito_gateway.registrar_sucesso()
+        logger.info(f"✅ Mensagem enviada para {contato}: {mensagem}")
+    except requests.exceptions.RequestException as e:
+        circuito_gateway.registrar_falha()
+        logger.error(f"❌ Erro ao enviar mensagem para {contato}: {e}")
+        return False
+
+    if id_outbox is not None:
         try:
-            response = requests.post(url, json=payload)
-            response.raise_for_status()
-            logger.info(f"✅ Mensagem enviada para {contato}: {mensagem}")
-            return True
-        except requests.exceptions.RequestException as e:
-            logger.error(f"❌ Erro ao enviar mensagem (tentativa {tentativa}/{tentativas}): {e}")
-            time.sleep(intervalo)  # Espera antes de tentar novamente
+            outbox.marcar(id_outbox, outbox.ENTREGUE)
+        except Exception as e:
+            logger.error(f"❌ Erro ao marcar mensagem {id_outbox} como entregue na outbox: {e}", exc_info=True)
+    return True
 
-    logger.error(f"❌ Falha ao enviar mensagem para {contato} após {tentativas} tentativas.")
-    return False  # Indica falha no envio
+def enfileirar_reenvio(contato, mensagem, tentativas, intervalo, criado_em, id_outbox=None, tentativa=1):
+    """Coloca a mensagem na fila de reenvio do contato; se ela for a primeira da fila, agenda sua tentativa."""
+    with _lock_filas_reenvio:
+        fila = _filas_reenvio.setdefault(contato, deque())
+        fila.append((mensagem, tentativas, intervalo, criado_em, id_outbox))
+        primeira = len(fila) == 1
+    if primeira:
+        agendar_reenvio(contato, mensagem, tentativa, tentativas, intervalo, criado_em, id_outbox)
 
-def salvar_mensagem_em_arquivo(contato, nome_cliente, mensagem):
-    """Salva as mensagens em um arquivo de texto para registro, criando o diretório se necessário."""
+def enfileirar_atras_de_reenvios(contato, mensagem, tentativas, intervalo, id_outbox):
+    """Se o contato tem mensagens aguardando reenvio, coloca a nova no fim da fila (sem enviá-la agora)."""
+    with _lock_filas_reenvio:
+        fila = _filas_reenvio.get(contato)
+        if not fila:
+            return False
+        fila.append((mensagem, tentativas, intervalo, time.time(), id_outbox))
+        return True
+
+def concluir_reenvio(contato):
+    """
+    A primeira mensagem da fila do contato foi entregue: agenda a próxima, se houver, renovando sua
+    reivindicação na outbox (ela esperou na fila e passa a ter suas próprias tentativas).
+    """
+    while True:
+        with _lock_filas_reenvio:
+            fila = _filas_reenvio.get(contato)
+            if fila:
+                fila.popleft()
+            if not fila:
+                _filas_reenvio.pop(contato, None)
+                return
+            mensagem, tentativas, intervalo, _, id_outbox = fila[0]
+
+        if id_outbox is None or renovar_reivindicacao(id_outbox):
+            agendar_reenvio(contato, mensagem, 1, tentativas, intervalo, time.time(), id_outbox)
+            return
+        logger.warning(f"⚠️ Mensagem {id_outbox} para {contato} já foi reivindicada por outro processo.")
+
+def renovar_reivindicacao(id_outbox):
+    try:
+        return outbox.renovar(id_outbox, DURACAO_REIVINDICACAO)
+    except Exception as e:
+        logger.error(f"❌ Erro ao renovar a mensagem {id_outbox} na outbox: {e}", exc_info=True)
+        return True  # Segue com o reenvio; no pior caso, a mensagem é entregue duas vezes
+
+def desistir_reenvios(contato):
+    """
+    Desiste da fila do contato (a primeira mensagem esgotou as tentativas): todas voltam para a
+    drenagem da outbox, que as reenvia depois na mesma ordem, em vez de entregar as seguintes antes.
+    """
+    with _lock_filas_reenvio:
+        fila = _filas_reenvio.pop(contato, ())
+    for *_, id_outbox in fila:
+        finalizar_reenvio(id_outbox)
+
+def agendar_reenvio(contato, mensagem, tentativa, tentativas, intervalo, criado_em, id_outbox=None):
+    """Agenda a próxima tentativa de envio com backoff exponencial e jitter."""
+    atraso = max(calcular_backoff(tentativa - 1, intervalo) if tentativa > 1 else 0, circuito_gateway.tempo_restante())
+    logger.info(f"🔁 Reenvio para {contato} agendado em {atraso:.1f}s (tentativa {tentativa}/{tentativas}).")
+    agendador_reenvio.agendar(atraso, reenviar_mensagem, contato, mensagem, tentativa, tentativas, intervalo, criado_em, id_outbox)
+
+def finalizar_reenvio(id_outbox):
+    """Libera a mensagem não entregue, sem novas tentativas agendadas, para a drenagem periódica da outbox."""
+    if id_outbox is None:
+        return
     try:
-        hoje = datetime.now().strftime("%Y-%m-%d")
-        nome_arquivo = os.path.join(CONVERSATIONS_DIR, f"{hoje}_user_{contato}.txt")
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        outbox.liberar(id_outbox)
+    except Exception as e:
+        logger.error(f"❌ Erro ao liberar a mensagem {id_outbox} na outbox: {e}", exc_info=True)
+
+def reenviar_mensagem(contato, mensagem, tentativa, tentativas, intervalo, criado_em, id_outbox=None):
+    """Executa uma tentativa de reenvio agendada da primeira mensagem da fila do contato (na thread do agendador)."""
+    if time.time() - criado_em > GATEWAY_REENVIO_IDADE_MAX:
+        logger.error(f"❌ Reenvio para {contato} expirou. Mensagens mantidas na outbox para a próxima drenagem.")
+        desistir_reenvios(contato)
+        return
+
+    if not circuito_gateway.permitir():
+        # Circuito aberto: espera sem consumir tentativas
+        agendar_reenvio(contato, mensagem, tentativa, tentativas, intervalo, criado_em, id_outbox)
+        return
 
-        # Criar o diretório se não existir
-        os.makedirs(CONVERSATIONS_DIR, exist_ok=True)
+    if tentar_envio(contato, mensagem, id_outbox):
+        concluir_reenvio(contato)
+        return
 
-        with open(nome_arquivo, "a", encoding="utf-8") as arquivo:
-            arquivo.write(f"[{timestamp}] [Cliente: {nome_cliente}] {mensagem}\n")
+    if tentativa < tentativas:
+        agendar_reenvio(contato, mensagem, tentativa + 1, tentativas, intervalo, criado_em, id_outbox)
+    else:
+        logger.error(f"❌ Falha ao enviar mensagem para {contato} após {tentativas} tentativas. Mantida na outbox.")
+        desistir_reenvios(contato)
 
-        logger.info(f"💾 Mensagem registrada para {contato}")
+def reenviar_pendentes_outbox():
+    """
+    Reenvia as mensagens da outbox que não foram entregues (por falha ou reinício do processo)
+    e que nenhum processo ativo está tentando enviar. Cada mensagem é reivindicada antes de ser
+    reagendada, para que dois processos não a reenviem. Só as mensagens mais antigas que OUTBOX_IDADE_MAX são
+    marcadas como expiradas: a última mensagem de uma conversa (confirmação do pedido, encerramento)
+    é enviada depois que a sessão já foi removida e também precisa ser entregue.
+    """
+    try:
+        pendentes = outbox.pendentes()
+    except Exception as e:
+        logger.error(f"❌ Erro ao carregar mensagens pendentes da outbox: {e}", exc_info=True)
+        return 0
+
+    agora = time.time()
+    reenviadas = expiradas = 0
+
+    for id_outbox, contato, mensagem, criado_em, dono, reivindicado_ate in pendentes:
+        if reivindicado_ate is not None and reivindicado_ate > agora and processo_ativo(dono):
+            continue  # Envio ou reenvio em andamento (neste ou em outro processo)
+        if not outbox.reivindicar(id_outbox, dono, reivindicado_ate, DURACAO_REIVINDICACAO):
+            continue  # Outro processo a reivindicou primeiro
+
+        if agora - criado_em > OUTBOX_IDADE_MAX:
+            outbox.marcar(id_outbox, outbox.EXPIRADO)
+            expiradas += 1
+            continue
+        enfileirar_reenvio(contato, mensagem, 3, 2, agora, id_outbox)
+        reenviadas += 1
+
+    if reenviadas or expiradas:
+        logger.info(f"📬 Outbox: {reenviadas} mensagens pendentes reenviadas, {expiradas} expiradas.")
+    return reenviadas
+
+def drenar_outbox():
+    """Reenvia as pendências da outbox na inicialização e depois a cada OUTBOX_INTERVALO_REENVIO segundos."""
+    while True:
+        try:
+            reenviar_pendentes_outbox()
+        except Exception as e:
+            logger.error(f"❌ Erro ao drenar a outbox: {e}", exc_info=True)
+        time.sleep(OUTBOX_INTERVALO_REENVIO)
+
+def salvar_mensagem_em_arquivo(contato, nome_cliente, mensagem):
+    """Registra a mensagem na transcrição da conversa. A gravação em disco ocorre em segundo plano."""
+    try:
+        escritor_transcricoes.registrar(contato, nome_cliente, mensagem)
+        logger.debug(f"💾 Mensagem registrada para {contato}")
     except Exception as e:
-        logger.error(f"❌ Erro ao salvar mensagem no arquivo para {contato}: {e}", exc_info=True)
+        logger.error(f"❌ Erro ao registrar mensagem na transcrição de {contato}: {e}", exc_info=True)
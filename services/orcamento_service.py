@@ -0,0 +1,186 @@
+import math
+import numpy as np
+from config import ORCAMENTO_QUANTIDADE_MAX, ORCAMENTO_MEDIDA_MAX_MM
+from logger import logger
+from services.formula_service import obter_formula_por_id
+from services.materials_service import MateriaPrimaCache, obter_preco_materia_prima
+from services.pedidos_service import calcular_valores_lote, arredondar_valores, somar_valores
+from services.product_service import obter_projeto_por_id
+
+def numero_positivo(valor):
+    """Converte o valor para número (int ou float), ou retorna None se não for um número válido (NaN e infinito inclusive)."""
+    if isinstance(valor, bool):
+        return None
+    if isinstance(valor, int):
+        return valor
+    if isinstance(valor, float):
+        return valor if math.isfinite(valor) else None
+    try:
+        numero = float(str(valor).strip().replace(",", "."))
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(numero):
+        return None
+    return int(numero) if numero.is_integer() else numero
+
+
+def valor_nativo(valor):
+    """Converte escalares do NumPy/pandas para tipos nativos do Python (serializáveis em JSON)."""
+    return valor.item() if hasattr(valor, "item") else valor
+
+
+def beneficiamento_obrigatorio(projeto):
+    """Projetos fixos exigem a escolha do beneficiamento (no chat, o cliente escolhe; nos demais é TEMPERADO)."""
+    return "fixo" in str(projeto.get("definicao_1", "")).strip().lower()
+
+
+def resolver_materia_prima(linha):
+    """Retorna (id_materia_prima, valor_m2) pelo ID informado ou pela escolha cor/espessura/beneficiamento."""
+    id_materia_prima = linha.get("id_materia_prima")
+    if id_materia_prima is not None:
+        if isinstance(id_materia_prima, float) and id_materia_prima.is_integer():
+            id_materia_prima = int(id_materia_prima)
+        id_materia_prima = str(id_materia_prima).strip()
+        return id_materia_prima, obter_preco_materia_prima(id_materia_prima)
+
+    return MateriaPrimaCache.obter_catalogo().buscar(
+        linha.get("cor_materia_prima"),
+        linha.get("espessura_materia_prima"),
+        linha.get("beneficiamento", "TEMPERADO"),
+    )
+
+
+def preparar_linha(linha):
+    """Valida uma linha do orçamento e resolve projeto, fórmula e matéria-prima. Retorna (dados, erro)."""
+    if not isinstance(linha, dict):
+        return None, "Linha inválida, esperado um objeto."
+
+    projeto = obter_projeto_por_id(linha.get("id_projeto"))
+    if not projeto:
+        return None, f"Projeto {linha.get('id_projeto')} não encontrado."
+
+    formula = obter_formula_por_id(projeto.get("id_formula"))
+    if not formula:
+        return None, f"Fórmula do projeto {linha.get('id_projeto')} não encontrada."
+
+    largura = numero_positivo(linha.get("largura"))
+    if largura is None or largura <= 0:
+        return None, "Largura inválida."
+    if largura > ORCAMENTO_MEDIDA_MAX_MM:
+        return None, f"Largura acima do máximo de {ORCAMENTO_MEDIDA_MAX_MM} mm."
+
+    altura = numero_positivo(linha.get("altura"))
+    if altura is None or altura <= 0:
+        altura = 0  # Mesmo tratamento de calcular_pecas
+    if altura > ORCAMENTO_MEDIDA_MAX_MM:
+        return None, f"Altura acima do máximo de {ORCAMENTO_MEDIDA_MAX_MM} mm."
+
+    quantidade = numero_positivo(linha.get("quantidade", 1))
+    if not isinstance(quantidade, int) or quantidade <= 0:
+        return None, "Quantidade inválida."
+    if quantidade > ORCAMENTO_QUANTIDADE_MAX:
+        return None, f"Quantidade acima do máximo de {ORCAMENTO_QUANTIDADE_MAX}."
+
+    if linha.get("id_materia_prima") is None and not linha.get("beneficiamento") and beneficiamento_obrigatorio(projeto):
+        return None, "Beneficiamento obrigatório para projetos fixos."
+
+    id_materia_prima, valor_mp_m2 = resolver_materia_prima(linha)
+    if id_materia_prima is None or valor_mp_m2 is None:
+        return None, "Matéria-prima não encontrada."
+    if not math.isfinite(float(valor_mp_m2)):
+        return None, "Matéria-prima sem preço cadastrado."
+
+    return {
+        "projeto": projeto,
+        "formula": formula,
+        "altura": altura,
+        "largura": largura,
+        "quantidade": quantidade,
+        "id_materia_prima": id_materia_prima,
+        "valor_mp_m2": float(valor_mp_m2),
+    }, None
+
+
+def calcular_orcamento_lote(linhas):
+    """
+    Calcula o orçamento de várias linhas (projeto, vão, matéria-prima e quantidade) de uma vez.
+    As peças são calculadas por fórmula em arrays e todas as peças são precificadas em uma única passada.
+    Retorna (resultados por linha, valor total das linhas válidas).
+    """
+    resultados = [None] * len(linhas)
+    preparadas = {}  # índice da linha -> dados
+
+    for indice, linha in enumerate(linhas):
+        dados, erro = preparar_linha(linha)
+        if erro:
+            resultados[indice] = {"linha": indice, "status": "error", "message": erro}
+        else:
+            preparadas[indice] = dados
+
+    # 🔹 Agrupa as linhas por fórmula e calcula as dimensões das peças em lote
+    por_formula = {}
+    for indice, dados in preparadas.items():
+        por_formula.setdefault(id(dados["formula"]), []).append(indice)
+
+    indices_linha, nomes, quantidades, alturas, larguras, precos = [], [], [], [], [], []
+    for indices in por_formula.values():
+        formula = preparadas[indices[0]]["formula"]
+        alturas_vao = np.array([preparadas[i]["altura"] for i in indices])
+        larguras_vao = np.array([preparadas[i]["largura"] for i in indices])
+        quantidades_linha = np.array([preparadas[i]["quantidade"] for i in indices])
+        precos_linha = np.array([preparadas[i]["valor_mp_m2"] for i in indices])
+
+        for nome_peca, quantidade_peca, alturas_peca, larguras_peca in formula.calcular_lote(alturas_vao, larguras_vao):
+            indices_linha.append(np.array(indices))
+            nomes.extend([nome_peca] * len(indices))
+            quantidades.append(quantidade_peca * quantidades_linha)
+            alturas.append(alturas_peca)
+            larguras.append(larguras_peca)
+            precos.append(precos_linha)
+
+    pecas_por_linha = {indice: [] for indice in preparadas}
+    valores_por_linha = {indice: [] for indice in preparadas}
+
+    if indices_linha:
+        # Dimensões como tipos nativos, preservando int/float de cada grupo (a concatenação promove tudo a float)
+        alturas_pecas = [valor for grupo in alturas for valor in grupo.tolist()]
+        larguras_pecas = [valor for grupo in larguras for valor in grupo.tolist()]
+
+        indices_linha = np.concatenate(indices_linha)
+        quantidades = np.concatenate(quantidades)
+        alturas = np.concatenate(alturas)
+        larguras = np.concatenate(larguras)
+        _, areas_m2, valores = calcular_valores_lote(alturas, larguras, quantidades, np.concatenate(precos))
+
+        # 🔹 Monta as peças de cada linha mantendo a ordem das peças da fórmula
+        ordem = np.argsort(indices_linha, kind="stable")
+        for posicao, valor_arredondado in zip(ordem.tolist(), arredondar_valores(valores[ordem])):
+            indice = int(indices_linha[posicao])
+            pecas_por_linha[indice].append({
+                "nome_peca": nomes[posicao],
+                "quantidade": int(quantidades[posicao]),
+                "altura_peca": alturas_pecas[posicao],
+                "largura_peca": larguras_pecas[posicao],
+                "area_m2": float(areas_m2[posicao]),
+                "valor_total": valor_arredondado,
+            })
+            valores_por_linha[indice].append(valores[posicao])
+
+    total_geral = 0
+    for indice, dados in preparadas.items():
+        valor_linha = somar_valores(valores_por_linha[indice])
+        total_geral += valor_linha
+        resultados[indice] = {
+            "linha": indice,
+            "status": "success",
+            "id_projeto": valor_nativo(dados["projeto"].get("id_projeto")),
+            "descricao_projeto": valor_nativo(dados["projeto"].get("descricao_projeto")),
+            "id_materia_prima": dados["id_materia_prima"],
+            "valor_mp_m2": dados["valor_mp_m2"],
+            "quantidade": dados["quantidade"],
+            "pecas": pecas_por_linha[indice],
+            "valor_total": valor_linha,
+        }
+
+    logger.info(f"🧾 Orçamento em lote calculado: {len(preparadas)} de {len(linhas)} linhas válidas.")
+    return resultados, round(total_geral, 2)
@@ -0,0 +1,139 @@
+import os
+import sqlite3
+import threading
+import time
+from config import OUTBOX_FILE_PATH, OUTBOX_INTERVALO_SYNC, OUTBOX_IDADE_MAX
+from logger import logger
+from services.processo_service import identificador_processo
+
+class Outbox:
+    """
+    Registro durável das mensagens de saída (SQLite em modo WAL).
+    Cada mensagem é gravada antes do envio e marcada como entregue depois; as pendentes
+    são reenviadas periodicamente. Os commits não fazem fsync (synchronous=NORMAL):
+    a sincronização com o disco é feita em lote por uma thread, a cada OUTBOX_INTERVALO_SYNC segundos.
+
+    O arquivo pode ser compartilhado por vários processos: cada mensagem pendente é reivindicada
+    (reivindicado_por/reivindicado_ate) pelo processo que está tentando enviá-la, e só pode ser
+    reenviada por outro depois de liberada, expirada ou se o dono tiver caído.
+    """
+
+    PENDENTE = "PENDENTE"
+    ENTREGUE = "ENTREGUE"
+    EXPIRADO = "EXPIRADO"
+
+    def __init__(self, caminho, intervalo_sync=1.0):
+        self._caminho = caminho
+        self._intervalo_sync = intervalo_sync
+        self._conexao = None
+        self._lock = threading.Lock()
+
+    def _obter_conexao(self):
+        if self._conexao is None:
+            os.makedirs(os.path.dirname(self._caminho), exist_ok=True)
+            conexao = sqlite3.connect(self._caminho, check_same_thread=False, isolation_level=None)
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute("PRAGMA synchronous=NORMAL")
+            conexao.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    contato TEXT NOT NULL,
+                    mensagem TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    criado_em REAL NOT NULL,
+                    atualizado_em REAL NOT NULL,
+                    reivindicado_por TEXT,
+                    reivindicado_ate REAL
+                )
+            """)
+            colunas = {linha[1] for linha in conexao.execute("PRAGMA table_info(outbox)")}
+            for coluna, tipo in (("reivindicado_por", "TEXT"), ("reivindicado_ate", "REAL")):
+                if coluna not in colunas:  # Outbox criada por uma versão anterior
+                    conexao.execute(f"ALTER TABLE outbox ADD COLUMN {coluna} {tipo}")
+            conexao.execute("CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox (status, id)")
+            self._conexao = conexao
+            threading.Thread(target=self._sincronizar, daemon=True, name="OutboxSyncThread").start()
+            logger.info(f"📬 Outbox de mensagens aberta em {self._caminho}.")
+        return self._conexao
+
+    @property
+    def _dono(self):
+        return identificador_processo()
+
+    def registrar(self, contato, mensagem, duracao_reivindicacao):
+        """Grava a mensagem como pendente, reivindicada por este processo por `duracao_reivindicacao` segundos, e retorna seu ID."""
+        agora = time.time()
+        with self._lock:
+            cursor = self._obter_conexao().execute(
+                "INSERT INTO outbox (contato, mensagem, status, criado_em, atualizado_em, reivindicado_por, reivindicado_ate) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (str(contato), mensagem, self.PENDENTE, agora, agora, self._dono, agora + duracao_reivindicacao),
+            )
+            return cursor.lastrowid
+
+    def reivindicar(self, id_mensagem, dono_anterior, ate_anterior, duracao_reivindicacao):
+        """
+        Reivindica a mensagem pendente para este processo, desde que a reivindicação ainda seja a lida
+        em `pendentes()` (compare-and-swap). Retorna False se outro processo a reivindicou antes.
+        """
+        with self._lock:
+            cursor = self._obter_conexao().execute(
+                "UPDATE outbox SET reivindicado_por = ?, reivindicado_ate = ? "
+                "WHERE id = ? AND status = ? AND reivindicado_por IS ? AND reivindicado_ate IS ?",
+                (self._dono, time.time() + duracao_reivindicacao, id_mensagem, self.PENDENTE, dono_anterior, ate_anterior),
+            )
+            return cursor.rowcount == 1
+
+    def renovar(self, id_mensagem, duracao_reivindicacao):
+        """Estende a reivindicação deste processo sobre a mensagem. Retorna False se ela não é mais deste processo."""
+        with self._lock:
+            cursor = self._obter_conexao().execute(
+                "UPDATE outbox SET reivindicado_ate = ? WHERE id = ? AND status = ? AND reivindicado_por = ?",
+                (time.time() + duracao_reivindicacao, id_mensagem, self.PENDENTE, self._dono),
+            )
+            return cursor.rowcount == 1
+
+    def liberar(self, id_mensagem):
+        """Desfaz a reivindicação deste processo, deixando a mensagem pendente para a próxima drenagem."""
+        with self._lock:
+            self._obter_conexao().execute(
+                "UPDATE outbox SET reivindicado_por = NULL, reivindicado_ate = NULL WHERE id = ? AND status = ? AND reivindicado_por = ?",
+                (id_mensagem, self.PENDENTE, self._dono),
+            )
+
+    def marcar(self, id_mensagem, status):
+        """Atualiza o status de uma mensagem (ENTREGUE ou EXPIRADO)."""
+        with self._lock:
+            self._obter_conexao().execute(
+                "UPDATE outbox SET status = ?, atualizado_em = ? WHERE id = ?",
+                (status, time.time(), id_mensagem),
+            )
+
+    def pendentes(self):
+        """Retorna as mensagens ainda não entregues (com a reivindicação atual), na ordem em que foram registradas."""
+        with self._lock:
+            return self._obter_conexao().execute(
+                "SELECT id, contato, mensagem, criado_em, reivindicado_por, reivindicado_ate FROM outbox WHERE status = ? ORDER BY id",
+                (self.PENDENTE,),
+            ).fetchall()
+
+    def _sincronizar(self):
+        """Força a gravação em disco periodicamente e remove registros antigos já finalizados."""
+        ultima_limpeza = 0.0
+        while True:
+            time.sleep(self._intervalo_sync)
+            try:
+                with self._lock:
+                    self._conexao.execute("PRAGMA wal_checkpoint(PASSIVE)")
+                    if time.time() - ultima_limpeza > 3600:
+                        self._conexao.execute(
+                            "DELETE FROM outbox WHERE status != ? AND atualizado_em < ?",
+                            (self.PENDENTE, time.time() - OUTBOX_IDADE_MAX),
+                        )
+                        ultima_limpeza = time.time()
+            except Exception as e:
+                logger.error(f"❌ Erro ao sincronizar a outbox: {e}", exc_info=True)
+
+
+# Instância compartilhada
+outbox = Outbox(OUTBOX_FILE_PATH, OUTBOX_INTERVALO_SYNC)
@@ -0,0 +1,411 @@
+import atexit
+import math
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+import pandas as pd
+from datetime import datetime
+from config import OUTPUT_DIR, PEDIDOS_DB_PATH, PEDIDO_ID_BLOCO
+from logger import logger
+
+# Planilha usada antes do banco; importada automaticamente na primeira abertura
+PEDIDOS_FILE_PATH = os.path.join(OUTPUT_DIR, "pedidos.xlsx")
+
+# Colunas na mesma ordem da planilha de pedidos
+COLUNAS_PEDIDOS = [
+    "id_pedido", "id_peca", "id_cliente", "nome_cliente", "regiao", "id_projeto", "descricao_projeto",
+    "id_materia_prima", "descricao_materia_prima", "descricao_peca", "quantidade", "altura_vao", "largura_vao",
+    "altura_peca", "largura_peca", "area_m2", "valor_mp_m2", "valor_total", "nome_pedido", "status_pedido",
+    "data_orcamento", "data_pedido",
+]
+
+TIPOS_COLUNAS = {
+    "id_cliente": "INTEGER", "id_projeto": "INTEGER", "id_materia_prima": "INTEGER", "quantidade": "INTEGER",
+    "altura_vao": "INTEGER", "largura_vao": "INTEGER", "altura_peca": "INTEGER", "largura_peca": "INTEGER",
+    "area_m2": "REAL", "valor_mp_m2": "REAL", "valor_total": "REAL",
+}
+
+def valor_sql(valor):
+    """Converte valores do pandas/numpy para tipos aceitos pelo SQLite (NaN vira NULL)."""
+    if hasattr(valor, "item"):
+        valor = valor.item()
+    if isinstance(valor, float) and math.isnan(valor):
+        return None
+    return valor
+
+
+class EscritorPedidos:
+    """
+    Thread única responsável pelas gravações no banco de pedidos (group commit).
+    As operações enfileiradas são gravadas juntas, em uma única transação por lote; cada
+    operação roda em seu próprio SAVEPOINT, de modo que a falha de uma não desfaz as demais.
+    Quem enfileira aguarda a confirmação do commit.
+    """
+
+    def __init__(self, banco, max_lote=500):
+        self._banco = banco
+        self._max_lote = max_lote
+        self._fila = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def executar(self, operacao, *args):
+        """
+        Enfileira `operacao(conexao, *args)` e aguarda o commit, retornando seu resultado.
+        A operação retorna (resultado, ids_pedidos_alterados).
+        """
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("Gravação no banco de pedidos chamada a partir da própria thread de escrita.")
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._executar, daemon=True, name="PedidosWriterThread")
+                self._thread.start()
+
+        futuro = Future()
+        self._fila.put((operacao, args, futuro))
+        return futuro.result()
+
+    def _executar(self):
+        while True:
+            lote = [self._fila.get()]
+            while len(lote) < self._max_lote:
+                try:
+                    lote.append(self._fila.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self._gravar_lote(lote)
+            except Exception as e:
+                logger.error(f"❌ Erro ao gravar lote de {len(lote)} operações no banco de pedidos: {e}", exc_info=True)
+                for _, _, futuro in lote:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+
+    def _gravar_lote(self, lote):
+        conexao = self._banco.conexao()
+        resultados = []
+        alterados = set()
+
+        conexao.execute("BEGIN IMMEDIATE")
+        try:
+            for operacao, args, futuro in lote:
+                conexao.execute("SAVEPOINT operacao")
+                try:
+                    resultado, ids_pedidos = operacao(conexao, *args)
+                    resultados.append((futuro, resultado))
+                    alterados.update(ids_pedidos)
+                    conexao.execute("RELEASE operacao")
+                except Exception as e:
+                    conexao.execute("ROLLBACK TO operacao")
+                    conexao.execute("RELEASE operacao")
+                    futuro.set_exception(e)
+            conexao.execute("COMMIT")
+        except Exception:
+            if conexao.in_transaction:
+                conexao.execute("ROLLBACK")
+            raise
+
+        # Avisa os ouvintes (ex.: caches) antes de liberar os chamadores, para que não leiam dados antigos
+        self._banco._notificar(alterados)
+
+        # Confirma para cada chamador somente depois do commit
+        for futuro, resultado in resultados:
+            futuro.set_result(resultado)
+
+        if len(lote) > 1:
+            logger.debug(f"💾 {len(lote)} operações gravadas em um único commit no banco de pedidos.")
+
+
+class BancoPedidos:
+    """
+    Armazena os pedidos em SQLite (modo WAL), com índices por id_pedido, nome_pedido e
+    (nome_cliente, status_pedido). Inclusões, mudanças de status e reservas de números de pedido
+    passam todas pelo EscritorPedidos; as leituras usam a conexão da própria thread.
+    """
+
+    def __init__(self, caminho):
+        self._caminho = caminho
+        self._local = threading.local()  # Uma conexão por thread
+        self._lock_inicializacao = threading.Lock()
+        self._inicializado = False
+        self._escritor = EscritorPedidos(self)
+        self._ouvintes = []
+
+    def conexao(self):
+        """Retorna a conexão da thread atual, criando o banco na primeira utilização."""
+        conexao = getattr(self._local, "conexao", None)
+        if conexao is None:
+            self._inicializar()
+            conexao = self._conectar()
+            self._local.conexao = conexao
+        return conexao
+
+    def _conectar(self):
+        conexao = sqlite3.connect(self._caminho, timeout=30, isolation_level=None)
+        conexao.row_factory = sqlite3.Row
+        conexao.execute("PRAGMA journal_mode=WAL")
+        conexao.execute("PRAGMA synchronous=FULL")
+        return conexao
+
+    def _inicializar(self):
+        with self._lock_inicializacao:
+            if self._inicializado:
+                return
+
+            os.makedirs(os.path.dirname(self._caminho), exist_ok=True)
+            conexao = self._conectar()
+            colunas = ", ".join(f"{coluna} {TIPOS_COLUNAS.get(coluna, 'TEXT')}" for coluna in COLUNAS_PEDIDOS)
+            conexao.executescript(f"""
+                CREATE TABLE IF NOT EXISTS pedidos (seq INTEGER PRIMARY KEY AUTOINCREMENT, {colunas});
+                CREATE INDEX IF NOT EXISTS idx_pedidos_id_pedido ON pedidos (id_pedido);
+                CREATE INDEX IF NOT EXISTS idx_pedidos_nome_pedido ON pedidos (nome_pedido);
+                CREATE INDEX IF NOT EXISTS idx_pedidos_cliente_status ON pedidos (nome_cliente, status_pedido);
+                CREATE TABLE IF NOT EXISTS metadados (chave TEXT PRIMARY KEY, valor TEXT);
+                CREATE TABLE IF NOT EXISTS contador_pedidos (dia TEXT PRIMARY KEY, ultimo INTEGER NOT NULL);
+
+                -- Índice secundário dos orçamentos em aberto por cliente, mantido pelos gatilhos abaixo
+                CREATE TABLE IF NOT EXISTS orcamentos_abertos (
+                    id_pedido TEXT PRIMARY KEY, id_cliente INTEGER NOT NULL, nome_pedido TEXT, seq INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_orcamentos_cliente ON orcamentos_abertos (id_cliente, seq);
+
+                CREATE TRIGGER IF NOT EXISTS trg_orcamento_inserido AFTER INSERT ON pedidos
+                WHEN NEW.status_pedido = 'ORÇAMENTO' AND NEW.id_cliente IS NOT NULL
+                BEGIN
+                    INSERT OR IGNORE INTO orcamentos_abertos (id_pedido, id_cliente, nome_pedido, seq)
+                    VALUES (NEW.id_pedido, NEW.id_cliente, NEW.nome_pedido, NEW.seq);
+                END;
+
+                CREATE TRIGGER IF NOT EXISTS trg_orcamento_status AFTER UPDATE OF status_pedido ON pedidos
+                BEGIN
+                    DELETE FROM orcamentos_abertos WHERE id_pedido = NEW.id_pedido AND NOT EXISTS (
+                        SELECT 1 FROM pedidos WHERE id_pedido = NEW.id_pedido AND status_pedido = 'ORÇAMENTO'
+                    );
+                    INSERT OR IGNORE INTO orcamentos_abertos (id_pedido, id_cliente, nome_pedido, seq)
+                    SELECT NEW.id_pedido, NEW.id_cliente, NEW.nome_pedido, NEW.seq
+                    WHERE NEW.status_pedido = 'ORÇAMENTO' AND NEW.id_cliente IS NOT NULL;
+                END;
+            """)
+            self._importar_planilha(conexao)
+            self._preencher_orcamentos_abertos(conexao)
+            conexao.close()
+
+            self._inicializado = True
+            logger.info(f"🗄️ Banco de pedidos aberto em {self._caminho}.")
+
+    def _importar_planilha(self, conexao):
+        """Importa a planilha de pedidos existente (apenas uma vez)."""
+        if conexao.execute("SELECT 1 FROM metadados WHERE chave = 'planilha_importada'").fetchone():
+            return
+
+        linhas = []
+        if os.path.exists(PEDIDOS_FILE_PATH):
+            df = pd.read_excel(PEDIDOS_FILE_PATH, dtype={"id_pedido": str, "id_peca": str, "nome_pedido": str})
+            linhas = df.to_dict("records")
+
+        conexao.execute("BEGIN IMMEDIATE")
+        try:
+            self._inserir(conexao, linhas)
+            conexao.execute("INSERT INTO metadados (chave, valor) VALUES ('planilha_importada', ?)", (str(len(linhas)),))
+            conexao.execute("COMMIT")
+        except Exception:
+            conexao.execute("ROLLBACK")
+            raise
+
+        if linhas:
+            logger.info(f"📥 {len(linhas)} linhas importadas de {PEDIDOS_FILE_PATH} para o banco de pedidos.")
+
+    def _preencher_orcamentos_abertos(self, conexao):
+        """Monta o índice de orçamentos em aberto a partir dos pedidos já gravados (apenas uma vez)."""
+        if conexao.execute("SELECT 1 FROM metadados WHERE chave = 'orcamentos_abertos'").fetchone():
+            return
+
+        conexao.execute("BEGIN IMMEDIATE")
+        try:
+            conexao.execute("""
+                INSERT OR IGNORE INTO orcamentos_abertos (id_pedido, id_cliente, nome_pedido, seq)
+                SELECT id_pedido, id_cliente, nome_pedido, MIN(seq) FROM pedidos
+                WHERE status_pedido = 'ORÇAMENTO' AND id_cliente IS NOT NULL
+                GROUP BY id_pedido
+            """)
+            conexao.execute("INSERT INTO metadados (chave, valor) VALUES ('orcamentos_abertos', '1')")
+            conexao.execute("COMMIT")
+        except Exception:
+            conexao.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _inserir(conexao, linhas):
+        marcadores = ", ".join("?" for _ in COLUNAS_PEDIDOS)
+        conexao.executemany(
+            f"INSERT INTO pedidos ({', '.join(COLUNAS_PEDIDOS)}) VALUES ({marcadores})",
+            [tuple(valor_sql(linha.get(coluna)) for coluna in COLUNAS_PEDIDOS) for linha in linhas],
+        )
+
+    @classmethod
+    def _operacao_inserir(cls, conexao, linhas):
+        cls._inserir(conexao, linhas)
+        return None, {str(linha.get("id_pedido")) for linha in linhas}
+
+    @staticmethod
+    def _operacao_atualizar_status(conexao, nome_pedido, novo_status, data_pedido=None):
+        ids_pedidos = {
+            linha[0] for linha in conexao.execute("SELECT DISTINCT id_pedido FROM pedidos WHERE nome_pedido = ?", (str(nome_pedido),))
+        }
+        if data_pedido is None:
+            cursor = conexao.execute("UPDATE pedidos SET status_pedido = ? WHERE nome_pedido = ?", (novo_status, str(nome_pedido)))
+        else:
+            cursor = conexao.execute(
+                "UPDATE pedidos SET status_pedido = ?, data_pedido = ? WHERE nome_pedido = ?",
+                (novo_status, data_pedido, str(nome_pedido)),
+            )
+        return cursor.rowcount, ids_pedidos
+
+    def inserir_itens(self, linhas):
+        """Insere as linhas (peças) de um pedido de forma atômica. Bloqueia até a gravação ser confirmada."""
+        self._escritor.executar(self._operacao_inserir, linhas)
+
+    def atualizar_status(self, nome_pedido, novo_status, data_pedido=None):
+        """Atualiza o status (e, se informada, a data do pedido) das linhas do pedido. Retorna o número de linhas alteradas."""
+        return self._escritor.executar(self._operacao_atualizar_status, nome_pedido, novo_status, data_pedido)
+
+    def adicionar_ouvinte(self, funcao):
+        """Registra `funcao(ids_pedidos)`, chamada após cada commit com os IDs dos pedidos alterados."""
+        self._ouvintes.append(funcao)
+
+    def _notificar(self, ids_pedidos):
+        if not ids_pedidos:
+            return
+        for funcao in list(self._ouvintes):
+            try:
+                funcao(ids_pedidos)
+            except Exception as e:
+                logger.error(f"❌ Erro ao notificar alteração de pedidos: {e}", exc_info=True)
+
+    def itens_do_pedido(self, id_pedido):
+        """Retorna as linhas (peças) do pedido, na ordem em que foram gravadas."""
+        cursor = self.conexao().execute(
+            f"SELECT {', '.join(COLUNAS_PEDIDOS)} FROM pedidos WHERE id_pedido = ? ORDER BY seq", (str(id_pedido),)
+        )
+        return [dict(linha) for linha in cursor]
+
+    def orcamentos_do_cliente(self, id_cliente):
+        """Retorna (id_pedido, nome_pedido) dos orçamentos em aberto do cliente, na ordem em que foram criados."""
+        cursor = self.conexao().execute(
+            "SELECT id_pedido, nome_pedido FROM orcamentos_abertos WHERE id_cliente = ? ORDER BY seq",
+            (int(id_cliente),),
+        )
+        return [(linha["id_pedido"], linha["nome_pedido"]) for linha in cursor]
+
+    def ultimo_numero_do_dia(self, dia):
+        """Retorna o maior número de pedido já usado no dia (formato AAMMDD), ou 0."""
+        return self._ultimo_numero_do_dia(self.conexao(), dia)
+
+    @staticmethod
+    def _ultimo_numero_do_dia(conexao, dia):
+        linha = conexao.execute(
+            "SELECT MAX(id_pedido) AS ultimo FROM pedidos WHERE id_pedido >= ? AND id_pedido < ?",
+            (f"{dia}_", f"{dia}`"),  # '`' é o caractere seguinte a '_': intervalo coberto pelo índice
+        ).fetchone()
+        if not linha or not linha["ultimo"]:
+            return 0
+        return int(linha["ultimo"][7:11])
+
+    @classmethod
+    def _operacao_reservar_numeros(cls, conexao, dia, quantidade):
+        conexao.execute(
+            "INSERT OR IGNORE INTO contador_pedidos (dia, ultimo) VALUES (?, ?)",
+            (dia, cls._ultimo_numero_do_dia(conexao, dia)),
+        )
+        conexao.execute("UPDATE contador_pedidos SET ultimo = ultimo + ? WHERE dia = ?", (quantidade, dia))
+        ultimo = conexao.execute("SELECT ultimo FROM contador_pedidos WHERE dia = ?", (dia,)).fetchone()[0]
+        return ultimo, set()
+
+    @staticmethod
+    def _operacao_devolver_numeros(conexao, dia, limite, ultimo_usado):
+        cursor = conexao.execute(
+            "UPDATE contador_pedidos SET ultimo = ? WHERE dia = ? AND ultimo = ?",
+            (ultimo_usado, dia, limite),
+        )
+        return cursor.rowcount == 1, set()
+
+    def reservar_numeros(self, dia, quantidade):
+        """
+        Reserva `quantidade` números de pedido do dia de forma atômica (também entre processos)
+        e retorna o último número reservado. O contador do dia começa no maior número já gravado.
+        Como as demais gravações, passa pelo EscritorPedidos (no mesmo commit de um lote).
+        """
+        return self._escritor.executar(self._operacao_reservar_numeros, dia, quantidade)
+
+    def devolver_numeros(self, dia, limite, ultimo_usado):
+        """
+        Devolve os números reservados e não usados (de `ultimo_usado` + 1 até `limite`), desde que
+        nenhuma outra reserva do dia tenha sido feita depois. Retorna True se a devolução ocorreu.
+        """
+        return self._escritor.executar(self._operacao_devolver_numeros, dia, limite, ultimo_usado)
+
+    def exportar_excel(self, caminho=PEDIDOS_FILE_PATH):
+        """Exporta todos os pedidos para uma planilha (consulta/backoffice)."""
+        df = pd.read_sql_query(f"SELECT {', '.join(COLUNAS_PEDIDOS)} FROM pedidos ORDER BY seq", self.conexao())
+        df.to_excel(caminho, index=False)
+        logger.info(f"📤 {len(df)} linhas de pedidos exportadas para {caminho}.")
+        return caminho
+
+
+class AlocadorIdPedidos:
+    """
+    Gera IDs de pedido no formato AAMMDD_0000.
+    Os números são reservados no banco em blocos de `bloco` e distribuídos a partir da memória.
+    Ao encerrar o processo normalmente, os números não usados do bloco são devolvidos ao contador;
+    se o processo cair (ou outro processo reservar depois), eles são descartados, nunca repetidos.
+    """
+
+    def __init__(self, banco, bloco=10):
+        self._banco = banco
+        self._bloco = max(1, bloco)
+        self._dia = None
+        self._proximo = 0
+        self._limite = 0  # Último número reservado para este processo
+        self._lock = threading.Lock()
+        atexit.register(self.devolver_reserva)
+
+    def devolver_reserva(self):
+        """Devolve ao contador os números reservados e ainda não usados por este processo."""
+        with self._lock:
+            if self._dia is None or self._proximo > self._limite:
+                return
+            try:
+                if self._banco.devolver_numeros(self._dia, self._limite, self._proximo - 1):
+                    logger.info(f"🔢 {self._limite - self._proximo + 1} números de pedido não usados devolvidos ao contador.")
+                self._limite = self._proximo - 1
+            except Exception as e:
+                logger.error(f"❌ Erro ao devolver os números de pedido reservados: {e}", exc_info=True)
+
+    def proximo_id(self, agora=None):
+        """Retorna o próximo ID de pedido do dia."""
+        dia = (agora or datetime.now()).strftime("%y%m%d")  # Formato AAMMDD
+
+        with self._lock:
+            if dia != self._dia or self._proximo > self._limite:
+                self._limite = self._banco.reservar_numeros(dia, self._bloco)
+                self._proximo = self._limite - self._bloco + 1
+                self._dia = dia
+
+            numero = self._proximo
+            self._proximo += 1
+
+        if numero > 9999:
+            raise ValueError(f"Limite de pedidos do dia {dia} excedido.")
+        return f"{dia}_{numero:04d}"
+
+
+# Instâncias compartilhadas
+banco_pedidos = BancoPedidos(PEDIDOS_DB_PATH)
+alocador_id_pedidos = AlocadorIdPedidos(banco_pedidos, PEDIDO_ID_BLOCO)
+
+if __name__ == "__main__":
+    banco_pedidos.exportar_excel()
@@ -1,46 +1,51 @@
-import os
-import pandas as pd
-import math
+import numpy as np
 from datetime import datetime
-from config import OUTPUT_DIR
 from logger import logger
 from services.global_state import global_state
 from services.message_service import enviar_mensagem
-from services.materials_service import carregar_tabela_mp
-from services.product_service import carregar_tabela_projetos
+from services.materials_service import obter_descricao_materia_prima
+from services.product_service import obter_projeto_por_id
+from services.pedidos_db import banco_pedidos, alocador_id_pedidos
 
-# Caminho do arquivo de pedidos
-PEDIDOS_FILE_PATH = os.path.join(OUTPUT_DIR, "pedidos.xlsx")
-
-# Criar diretório de saída se não existir
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+# Incremento de cobrança da área (m²): a área de cada peça é arredondada para cima neste múltiplo
+INCREMENTO_AREA_M2 = 0.25
 
 def gerar_id_pedido():
     """
     Gera um ID único no formato AAMMDD_0000 para um novo pedido do dia.
     O número 0000 cresce a cada novo pedido do dia.
     """
-    hoje = datetime.now().strftime("%y%m%d")  # Formato AAMMDD
-    numero_pedido = 1  # Começa do 1 caso não haja pedidos
+    return alocador_id_pedidos.proximo_id()
 
-    if not os.path.exists(PEDIDOS_FILE_PATH):
-        return f"{hoje}_0001"
 
-    try:
-        df_pedidos = pd.read_excel(PEDIDOS_FILE_PATH, dtype={"id_pedido": str})
+def calcular_valores_lote(alturas, larguras, quantidades, valores_mp_m2):
+    """
+    Calcula, em uma única passada vetorizada, os valores de várias peças (alturas e larguras em mm).
+    `valores_mp_m2` pode ser um único valor ou um valor por peça.
+    Retorna (area_total, area_m2, valor_total) como arrays; a área cobrada é arredondada para cima
+    em múltiplos de 0,25 m² e o valor total ainda não é arredondado.
+    """
+    alturas = np.asarray(alturas, dtype=float)
+    larguras = np.asarray(larguras, dtype=float)
+    quantidades = np.asarray(quantidades, dtype=float)
 
-        if "id_pedido" not in df_pedidos.columns or df_pedidos.empty:
-            return f"{hoje}_0001"
+    # Mesma ordem de operações do cálculo peça a peça, para obter exatamente os mesmos valores
+    area_total = (alturas / 1000) * (larguras / 1000) * quantidades
+    area_m2 = np.ceil(area_total / INCREMENTO_AREA_M2) * INCREMENTO_AREA_M2
+    valor_total = area_m2 * np.asarray(valores_mp_m2, dtype=float)
+    return area_total, area_m2, valor_total
 
-        pedidos_do_dia = df_pedidos[df_pedidos["id_pedido"].astype(str).str.startswith(hoje)]
-        if not pedidos_do_dia.empty:
-            ultimo_numero = pedidos_do_dia["id_pedido"].astype(str).str[7:11].astype(int).max()
-            numero_pedido = ultimo_numero + 1
 
-        return f"{hoje}_{numero_pedido:04d}"
-    except Exception as e:
-        logger.error(f"❌ Erro ao gerar ID do pedido: {e}", exc_info=True)
-        return f"{hoje}_9999"  # Retorna um valor especial em caso de erro
+def arredondar_valores(valores):
+    """Arredonda cada valor para 2 casas como o round() do Python (np.round pode divergir em casos de meio centavo)."""
+    return [round(valor, 2) for valor in np.asarray(valores, dtype=float).tolist()]
+
+
+def somar_valores(valores):
+    """Soma sequencial (mesmo resultado de acumular em um laço), arredondada para 2 casas."""
+    if len(valores) == 0:
+        return 0
+    return round(float(np.cumsum(valores)[-1]), 2)
 
 
 def calcular_valores_pecas(pecas_calculadas, valor_mp_m2):
@@ -48,66 +53,56 @@ def calcular_valores_pecas(pecas_calculadas, valor_mp_m2):
     Calcula os valores do pedido com base nas peças e no valor do m² da matéria-prima.
     Retorna uma lista com os cálculos individuais das peças e o valor total do pedido.
     """
-    total_geral = 0
-    pedidos_calculados = []
-
-    for i, peca in enumerate(pecas_calculadas):
-        nome_peca = peca["nome_peca"]
-        altura_peca, largura_peca = peca["dimensoes"]
-        quantidade = peca["quantidade"]
-
-        area_total = (altura_peca / 1000) * (largura_peca / 1000) * quantidade
-        area_m2 = math.ceil(area_total / 0.25) * 0.25
-        valor_total = area_m2 * valor_mp_m2
-        total_geral += valor_total
-
-        pedidos_calculados.append({
-            "descricao_peca": nome_peca,
-            "quantidade": quantidade,
+    if not pecas_calculadas:
+        return [], 0
+
+    alturas = [peca["dimensoes"][0] for peca in pecas_calculadas]
+    larguras = [peca["dimensoes"][1] for peca in pecas_calculadas]
+    quantidades = [peca["quantidade"] for peca in pecas_calculadas]
+
+    _, areas_m2, valores_totais = calcular_valores_lote(alturas, larguras, quantidades, valor_mp_m2)
+
+    pedidos_calculados = [
+        {
+            "descricao_peca": peca["nome_peca"],
+            "quantidade": peca["quantidade"],
             "altura_peca": altura_peca,
             "largura_peca": largura_peca,
             "area_m2": area_m2,
             "valor_mp_m2": valor_mp_m2,
-            "valor_total": round(valor_total, 2)
-        })
+            "valor_total": valor_total,
+        }
+        for peca, altura_peca, largura_peca, area_m2, valor_total
+        in zip(pecas_calculadas, alturas, larguras, areas_m2.tolist(), arredondar_valores(valores_totais))
+    ]
 
-    return pedidos_calculados, round(total_geral, 2)
+    return pedidos_calculados, somar_valores(valores_totais)
 
 
 def obter_nome_materia_prima(id_materia_prima):
-    """Busca a descrição da matéria-prima pelo ID."""
-    df_mp = carregar_tabela_mp()
-    materia = df_mp[df_mp["id_materia_prima"] == id_materia_prima]
-    return materia["descricao_materia_prima"].values[0] if not materia.empty else "Matéria-prima Desconhecida"
+    """Busca a descrição da matéria-prima pelo ID no catálogo em memória."""
+    return obter_descricao_materia_prima(id_materia_prima) or "Matéria-prima Desconhecida"
 
 def obter_nome_projeto(id_projeto):
-    """Busca a descrição do projeto pelo ID."""
-    df_projetos = carregar_tabela_projetos()
-    projeto = df_projetos[df_projetos["id_projeto"] == id_projeto]
-    return projeto["descricao_projeto"].values[0] if not projeto.empty else "Projeto Desconhecido"
+    """Busca a descrição do projeto pelo ID no catálogo em memória."""
+    projeto = obter_projeto_por_id(id_projeto)
+    return projeto.get("descricao_projeto", "Projeto Desconhecido") if projeto else "Projeto Desconhecido"
 
 
 def atualizar_status_pedido(nome_pedido, novo_status):
-    """Atualiza o status do pedido no Excel e registra a data/hora do pedido se for autorizado."""
+    """Atualiza o status do pedido no banco e registra a data/hora do pedido se for autorizado."""
     try:
-        df_pedidos = pd.read_excel(PEDIDOS_FILE_PATH)
-
-        if "status_pedido" not in df_pedidos.columns:
-            df_pedidos["status_pedido"] = "ORÇAMENTO"  # Garante a existência da coluna
+        data_pedido = None
+        if novo_status == "AUTORIZADO":
+            data_pedido = datetime.now().strftime("%Y-%m-%d %H:%M:%S")  # ✅ Captura data/hora da autorização
 
-        if nome_pedido not in df_pedidos["nome_pedido"].values:
-            logger.warning(f"⚠️ Pedido '{nome_pedido}' não encontrado no Excel. Nenhuma alteração feita.")
+        if not banco_pedidos.atualizar_status(nome_pedido, novo_status, data_pedido):
+            logger.warning(f"⚠️ Pedido '{nome_pedido}' não encontrado no banco. Nenhuma alteração feita.")
             return
 
-        df_pedidos.loc[df_pedidos["nome_pedido"] == nome_pedido, "status_pedido"] = novo_status
-
-        if novo_status == "AUTORIZADO":
-            data_pedido = datetime.now().strftime("%Y-%m-%d %H:%M:%S")  # ✅ Captura data/hora da autorização
-            df_pedidos.loc[df_pedidos["nome_pedido"] == nome_pedido, "data_pedido"] = data_pedido
+        if data_pedido:
             logger.info(f"📌 Pedido '{nome_pedido}' autorizado em {data_pedido}.")
 
-        df_pedidos.to_excel(PEDIDOS_FILE_PATH, index=False)
-
     except Exception as e:
         logger.error(f"❌ Erro ao atualizar status do pedido '{nome_pedido}': {e}")
 
@@ -146,21 +141,57 @@ def salvar_pedido(id_cliente, nome_cliente, regiao, id_projeto, id_materia_prima
 
             pedidos_completos.append(pedido)
 
-        df_novos_pedidos = pd.DataFrame(pedidos_completos)
-
-        if os.path.exists(PEDIDOS_FILE_PATH):
-            df_existente = pd.read_excel(PEDIDOS_FILE_PATH, dtype={"id_pedido": str})
-            df_final = pd.concat([df_existente, df_novos_pedidos], ignore_index=True)
-        else:
-            df_final = df_novos_pedidos
-
-        df_final.to_excel(PEDIDOS_FILE_PATH, index=False)
+        banco_pedidos.inserir_itens(pedidos_completos)
         logger.info(f"💾 Pedido {id_pedido} salvo com sucesso! Orçamento concluído em {data_orcamento}.")
 
     except Exception as e:
         logger.error(f"❌ Erro ao salvar pedido: {e}", exc_info=True)
         enviar_mensagem(id_cliente, "❌ Erro ao salvar seu pedido. Tente novamente mais tarde.")
 
+def salvar_pedidos_lote(id_cliente, pedidos, nome_pedido, status_pedido="ORÇAMENTO"):
+    """
+    Salva todos os projetos acumulados como um único pedido, já com o status final,
+    em uma única transação (ou tudo é gravado, ou nada). Retorna o ID do pedido, ou None em caso de erro.
+    """
+    try:
+        id_pedido = gerar_id_pedido()
+        agora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        data_pedido = agora if status_pedido == "AUTORIZADO" else ""
+
+        linhas = []
+        for pedido in pedidos:
+            id_projeto = pedido.get("id_projeto")
+            id_materia_prima = pedido.get("id_materia_prima")
+            pecas_calculadas, _ = calcular_valores_pecas(pedido.get("pecas", []), pedido.get("valor_mp_m2", 0.0))
+
+            for peca in pecas_calculadas:
+                peca.update({
+                    "id_pedido": id_pedido,
+                    "id_peca": f"{id_pedido}_{len(linhas) + 1:03d}",
+                    "id_cliente": int(id_cliente),
+                    "nome_cliente": pedido.get("nome_cliente", "Cliente Desconhecido"),
+                    "regiao": pedido.get("regiao", "Região Desconhecida"),
+                    "id_projeto": int(id_projeto),
+                    "descricao_projeto": obter_nome_projeto(id_projeto),
+                    "id_materia_prima": int(id_materia_prima),
+                    "descricao_materia_prima": obter_nome_materia_prima(id_materia_prima),
+                    "altura_vao": pedido.get("altura_vao"),
+                    "largura_vao": pedido.get("largura_vao"),
+                    "nome_pedido": str(nome_pedido),
+                    "status_pedido": status_pedido,
+                    "data_orcamento": agora,
+                    "data_pedido": data_pedido,
+                })
+                linhas.append(peca)
+
+        banco_pedidos.inserir_itens(linhas)
+        logger.info(f"💾 Pedido {id_pedido} salvo com {len(pedidos)} projeto(s) e {len(linhas)} peça(s). Status: {status_pedido}.")
+        return id_pedido
+
+    except Exception as e:
+        logger.error(f"❌ Erro ao salvar pedido '{nome_pedido}': {e}", exc_info=True)
+        return None
+
 # def processar_resposta_autorizacao(contato, texto):
 #     """
 #     Processa a resposta do usuário sobre autorizar ou manter o orçamento.
@@ -189,21 +220,15 @@ def salvar_pedido(id_cliente, nome_cliente, regiao, id_projeto, id_materia_prima
 #     global_state.limpar_dados_usuario(contato)
 
 
-def visualizar_orcamentos(contato, nome_cliente):
+def visualizar_orcamentos(contato, id_cliente):
     """
     Exibe a lista de pedidos pendentes do cliente (com status 'ORÇAMENTO').
-    Mostra apenas um resumo por pedido, removendo duplicatas.
+    Mostra apenas um resumo por pedido, consultando o índice de orçamentos em aberto do cliente.
     """
     try:
-        df_pedidos = pd.read_excel(PEDIDOS_FILE_PATH)
+        orcamentos = banco_pedidos.orcamentos_do_cliente(id_cliente)
 
-        if "status_pedido" not in df_pedidos.columns:
-            enviar_mensagem(contato, "⚠️ Não foi possível carregar seus orçamentos.")
-            return
-
-        df_pedidos = df_pedidos[(df_pedidos["nome_cliente"] == nome_cliente) & (df_pedidos["status_pedido"] == "ORÇAMENTO")]
-
-        if df_pedidos.empty:
+        if not orcamentos:
             enviar_mensagem(contato, "📋 Você não tem orçamentos pendentes.")
             
             # ✅ Corrigido: Resetar o status do usuário corretamente
@@ -213,14 +238,10 @@ def visualizar_orcamentos(contato, nome_cliente):
             
             return
 
-        df_pedidos = df_pedidos.drop_duplicates(subset=["id_pedido"])
-
         menu_pedidos = ["📜 *Lista de Orçamentos:*"]
         opcoes_menu = []  
 
-        for _, pedido in df_pedidos.iterrows():
-            id_pedido = pedido["id_pedido"]
-            nome_pedido = pedido["nome_pedido"]
+        for id_pedido, nome_pedido in orcamentos:
             menu_pedidos.append(f"{len(opcoes_menu) + 1}. {id_pedido} - {nome_pedido}")
             opcoes_menu.append((id_pedido, nome_pedido))
 
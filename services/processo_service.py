@@ -0,0 +1,22 @@
+import os
+import socket
+
+def identificador_processo():
+    """Identificador deste processo (máquina:pid), usado como dono de concessões compartilhadas. Muda após um fork."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def processo_ativo(identificador):
+    """
+    Indica se o processo de `identificador_processo()` ainda existe. Só é possível verificar
+    processos da mesma máquina; os das demais são considerados ativos.
+    """
+    maquina, _, pid = identificador.rpartition(":")
+    if maquina != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # Existe, mas pertence a outro usuário
+    return True
@@ -1,6 +1,10 @@
 import pandas as pd
+import threading
 from config import PROJECT_FILE_PATH
 from logger import logger  # Importando o módulo de logs
+from services.recarga_service import monitor_arquivos, assinatura_arquivo
+
+DEFINICOES = ["definicao_1", "definicao_2", "definicao_3", "definicao_4"]
 
 def carregar_tabela_projetos():
     """
@@ -21,23 +25,157 @@ def carregar_tabela_projetos():
     
     return pd.DataFrame()  # Retorna um DataFrame vazio em caso de erro
 
+def chave_id(valor):
+    """Normaliza um ID (int, float ou texto) para uso como chave de dicionário."""
+    try:
+        return int(float(valor))
+    except (TypeError, ValueError):
+        return str(valor).strip()
+
+
+class NoProjeto:
+    """
+    Nó da árvore de decisão de projetos. Guarda os projetos compatíveis com as escolhas
+    feitas até ele e, em `filhos`, o nó de cada opção do nível seguinte (None = sem valor).
+    """
+    __slots__ = ("nivel", "filhos", "projetos")
+
+    def __init__(self, nivel):
+        self.nivel = nivel  # Índice em DEFINICOES da definição escolhida a partir deste nó
+        self.filhos = {}
+        self.projetos = []
+
+    def opcoes(self):
+        """Opções do próximo nível, na ordem da planilha."""
+        return [valor for valor in self.filhos if valor is not None]
+
+
+class CatalogoProjetos:
+    """
+    Tabela de projetos compilada em uma árvore medida_final -> definicao_1 -> ... -> definicao_4,
+    além de um índice por ID. Cada passo do menu vira um acesso a dicionário.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self.raizes = {}  # medida_final -> NoProjeto
+        self.raiz_geral = NoProjeto(0)  # Todos os projetos, sem filtro de medida
+        self.por_id = {}
+
+        if df is None or df.empty:
+            return
+
+        registros = df.to_dict("records")
+        for projeto in registros:
+            if "id_projeto" in projeto:
+                self.por_id.setdefault(chave_id(projeto["id_projeto"]), projeto)
+
+            raizes = [self.raiz_geral]
+            medida = projeto.get("medida_final")
+            if not pd.isna(medida):
+                raizes.append(self.raizes.setdefault(medida, NoProjeto(0)))
+
+            for no in raizes:
+                no.projetos.append(projeto)
+                for nivel, coluna in enumerate(DEFINICOES):
+                    valor = projeto.get(coluna)
+                    if valor is not None and pd.isna(valor):
+                        valor = None
+                    no = no.filhos.setdefault(valor, NoProjeto(nivel + 1))
+                    no.projetos.append(projeto)
+
+        logger.info(f"🌳 Árvore de projetos compilada: {len(registros)} projetos, {len(self.raizes)} tipos de medida.")
+
+    def localizar(self, medida_final=None, escolhas=None):
+        """
+        Percorre a árvore com as escolhas informadas.
+        Retorna (nó alcançado, projetos compatíveis); o nó é None quando foi preciso filtrar a lista
+        (escolha em um nível posterior a outro que ainda tem opções não escolhidas).
+        """
+        escolhas = {coluna: valor for coluna, valor in (escolhas or {}).items() if valor}
+        no = self.raiz_geral if medida_final is None else self.raizes.get(medida_final)
+        if no is None:
+            return None, []
+
+        for nivel, coluna in enumerate(DEFINICOES):
+            valor = escolhas.get(coluna)
+            if valor:
+                no = no.filhos.get(valor)
+                if no is None:
+                    return None, []
+            elif list(no.filhos) == [None]:
+                no = no.filhos[None]  # Nível sem opções: todos os projetos seguem pelo ramo vazio
+            else:
+                restantes = {c: v for c, v in escolhas.items() if DEFINICOES.index(c) > nivel}
+                if not restantes:
+                    return no, no.projetos
+                projetos = [p for p in no.projetos if all(p.get(c) == v for c, v in restantes.items())]
+                return None, projetos
+
+        return no, no.projetos
+
+    def opcoes(self, coluna, medida_final=None, escolhas=None):
+        """Opções disponíveis para `coluna` dentre os projetos compatíveis com as escolhas."""
+        no, projetos = self.localizar(medida_final, escolhas)
+        if no is not None and no.nivel < len(DEFINICOES) and DEFINICOES[no.nivel] == coluna:
+            return no.opcoes()
+
+        opcoes = []
+        for projeto in projetos:
+            valor = projeto.get(coluna)
+            if valor is not None and not pd.isna(valor) and valor not in opcoes:
+                opcoes.append(valor)
+        return opcoes
+
+
+class ProjetoCache:
+    """Mantém o catálogo de projetos em memória, recarregando-o em segundo plano quando a planilha muda."""
+    _catalogo = None
+    _lock = threading.Lock()
+    _monitorado = False
+
+    @classmethod
+    def obter_catalogo(cls):
+        """Retorna o catálogo atual, carregando a planilha na primeira chamada."""
+        catalogo = cls._catalogo
+        if catalogo is None:
+            cls._recarregar(forcar_atualizacao=False)
+            catalogo = cls._catalogo
+        return catalogo
+
+    @classmethod
+    def _recarregar(cls, forcar_atualizacao=True):
+        """Lê a planilha e publica o novo catálogo. Em caso de erro, mantém o catálogo anterior."""
+        with cls._lock:
+            if cls._catalogo is not None and not forcar_atualizacao:
+                return
+
+            assinatura = assinatura_arquivo(PROJECT_FILE_PATH)
+            df = carregar_tabela_projetos()
+
+            if not df.empty or cls._catalogo is None:
+                cls._catalogo = CatalogoProjetos(df)  # Troca atômica
+
+            if not cls._monitorado:
+                monitor_arquivos.registrar(PROJECT_FILE_PATH, cls._recarregar, assinatura)
+                cls._monitorado = True
+
+
 def gerar_menu_inicial(medida_final):
     """
     Gera o menu inicial com base na coluna 'definicao_1' da tabela de projetos e na medida selecionada.
     """
-    df = carregar_tabela_projetos()
+    catalogo = ProjetoCache.obter_catalogo()
 
-    if df.empty or "definicao_1" not in df.columns:
+    if not catalogo.raiz_geral.projetos:
         logger.warning("⚠️ A tabela de projetos está vazia ou não contém a coluna 'definicao_1'.")
         return []
 
-    produtos_filtrados = df[df["medida_final"] == medida_final]
-
-    if produtos_filtrados.empty:
+    if catalogo.raizes.get(medida_final) is None:
         logger.info("⚠️ Nenhum produto encontrado para a medida selecionada.")
         return []
 
-    opcoes_iniciais = produtos_filtrados["definicao_1"].dropna().unique().tolist()
+    opcoes_iniciais = catalogo.opcoes("definicao_1", medida_final)
     logger.info(f"📋 {len(opcoes_iniciais)} opções carregadas para o menu inicial (Medida Final: {medida_final}).")
     
     return opcoes_iniciais
@@ -45,59 +183,49 @@ def gerar_menu_inicial(medida_final):
 
 def filtrar_projetos_por_escolhas(definicao_1=None, definicao_2=None, definicao_3=None, definicao_4=None, medida_final=None):
     """
-    Filtra os projetos com base nas escolhas do usuário e no tipo de medida.
-    Agora inclui a definição_4 na filtragem.
+    Filtra os projetos com base nas escolhas do usuário e no tipo de medida,
+    percorrendo a árvore de projetos compilada.
     """
-    df = carregar_tabela_projetos()
+    catalogo = ProjetoCache.obter_catalogo()
 
-    if df.empty:
+    if not catalogo.raiz_geral.projetos:
         logger.warning("⚠️ A tabela de projetos está vazia ou não foi carregada.")
         return []
 
-    # Filtrar dinamicamente com base nas escolhas e na medida
-    if medida_final is not None:
-        df = df[df["medida_final"] == medida_final]
-    if definicao_1:
-        df = df[df["definicao_1"] == definicao_1]
-    if definicao_2:
-        df = df[df["definicao_2"] == definicao_2]
-    if definicao_3:
-        df = df[df["definicao_3"] == definicao_3]
-    if definicao_4:
-        df = df[df["definicao_4"] == definicao_4]
-
-    # Retornar registros filtrados como dicionários
-    projetos = df.to_dict("records")
+    escolhas = {"definicao_1": definicao_1, "definicao_2": definicao_2, "definicao_3": definicao_3, "definicao_4": definicao_4}
+    _, projetos = catalogo.localizar(medida_final, escolhas)
+
     logger.info(f"📌 {len(projetos)} projetos filtrados para as definições fornecidas.")
-    return projetos
+    return list(projetos)
 
 
-def gerar_menu_por_definicao(df, coluna, filtros):
+def gerar_menu_por_definicao(coluna, filtros):
     """
-    Gera um menu com as opções únicas de uma determinada coluna (definição) do DataFrame de projetos,
+    Gera um menu com as opções únicas de uma determinada coluna (definição) da tabela de projetos,
     garantindo que apenas as opções dentro do escopo já filtrado sejam consideradas.
     """
-    if coluna not in df.columns:
-        logger.warning(f"⚠️ A coluna '{coluna}' não existe no DataFrame. Retornando lista vazia.")
+    if coluna not in DEFINICOES:
+        logger.warning(f"⚠️ A coluna '{coluna}' não é uma definição de projeto. Retornando lista vazia.")
         return []
 
-    # ✅ Aplicar os filtros anteriores antes de buscar as opções
-    for chave, valor in filtros.items():
-        if valor is not None and chave in df.columns:
-            df = df[df[chave] == valor]
-            logger.info(f"🔎 Aplicado filtro '{chave}': {valor}. Linhas restantes: {df.shape[0]}")
+    escolhas = {chave: valor for chave, valor in filtros.items() if chave in DEFINICOES}
+    opcoes = ProjetoCache.obter_catalogo().opcoes(coluna, filtros.get("medida_final"), escolhas)
 
-    if df.empty:
+    if not opcoes:
         logger.warning(f"⚠️ Nenhum dado disponível após filtragem para '{coluna}'.")
         return []
 
     # ✅ Retornar apenas opções compatíveis com os filtros aplicados
-    opcoes = df[coluna].dropna().unique().tolist()
     logger.info(f"✅ Opções disponíveis para '{coluna}': {opcoes}")
 
     return opcoes
 
 
+def obter_projeto_por_id(id_projeto):
+    """Retorna o projeto pelo ID, ou None se não existir."""
+    return ProjetoCache.obter_catalogo().por_id.get(chave_id(id_projeto))
+
+
 def gerar_menu_por_definicao_mp(df, coluna):
     """
     Gera um menu com as opções únicas de uma determinada coluna (definição) do DataFrame de matéria-prima.
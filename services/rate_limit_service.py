@@ -0,0 +1,77 @@
+import threading
+import time
+from config import GATEWAY_TAXA_GLOBAL, GATEWAY_RAJADA_GLOBAL, GATEWAY_TAXA_CONTATO, GATEWAY_RAJADA_CONTATO
+
+class TokenBucket:
+    """
+    Balde de tokens thread-safe: permite rajadas de até `capacidade` envios
+    e limita a média a `taxa` envios por segundo.
+    """
+
+    def __init__(self, taxa, capacidade):
+        self.taxa = float(taxa)
+        self.capacidade = float(max(capacidade, 1))
+        self._tokens = self.capacidade
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reabastecer(self, agora):
+        self._tokens = min(self.capacidade, self._tokens + (agora - self._ultimo) * self.taxa)
+        self._ultimo = agora
+
+    def reservar(self):
+        """Reserva um token e retorna quantos segundos o chamador deve esperar antes de usá-lo."""
+        with self._lock:
+            self._reabastecer(time.monotonic())
+            self._tokens -= 1  # Pode ficar negativo: a dívida define a espera das próximas reservas
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.taxa
+
+    def aguardar(self):
+        """Bloqueia apenas o necessário para respeitar a taxa. Sem fila, retorna imediatamente."""
+        espera = self.reservar()
+        if espera > 0:
+            time.sleep(espera)
+        return espera
+
+    def cheio(self):
+        """Indica se o balde está cheio (sem uso recente)."""
+        with self._lock:
+            self._reabastecer(time.monotonic())
+            return self._tokens >= self.capacidade
+
+
+class LimitadorGateway:
+    """Combina um limite global de envios ao gateway com um limite opcional por contato."""
+
+    MAX_BALDES_CONTATO = 10000
+
+    def __init__(self, taxa_global, rajada_global, taxa_contato=0, rajada_contato=1):
+        self._global = TokenBucket(taxa_global, rajada_global) if taxa_global > 0 else None
+        self._taxa_contato = taxa_contato
+        self._rajada_contato = rajada_contato
+        self._baldes_contato = {}
+        self._lock = threading.Lock()
+
+    def _balde_contato(self, contato):
+        with self._lock:
+            balde = self._baldes_contato.get(contato)
+            if balde is None:
+                if len(self._baldes_contato) >= self.MAX_BALDES_CONTATO:
+                    # Descarta os baldes de contatos ociosos (cheios) para limitar a memória
+                    self._baldes_contato = {c: b for c, b in self._baldes_contato.items() if not b.cheio()}
+                balde = TokenBucket(self._taxa_contato, self._rajada_contato)
+                self._baldes_contato[contato] = balde
+            return balde
+
+    def aguardar(self, contato):
+        """Aguarda a liberação do envio para o contato. Retorna o tempo total de espera."""
+        espera = 0.0
+        if self._taxa_contato > 0:
+            espera += self._balde_contato(contato).aguardar()
+        if self._global:
+            espera += self._global.aguardar()
+        return espera
+
+
+# Instância compartilhada por todas as threads
+limitador_gateway = LimitadorGateway(GATEWAY_TAXA_GLOBAL, GATEWAY_RAJADA_GLOBAL, GATEWAY_TAXA_CONTATO, GATEWAY_RAJADA_CONTATO)
@@ -0,0 +1,72 @@
+import os
+import threading
+import time
+from config import RECARGA_INTERVALO
+from logger import logger
+
+def assinatura_arquivo(caminho):
+    """Retorna (mtime, tamanho) do arquivo, ou None se ele não existir."""
+    try:
+        info = os.stat(caminho)
+        return info.st_mtime_ns, info.st_size
+    except OSError:
+        return None
+
+
+class MonitorArquivos:
+    """
+    Verifica periodicamente os arquivos registrados (data de modificação e tamanho)
+    e executa a função de recarga, em segundo plano, quando algum deles muda.
+    """
+
+    def __init__(self, intervalo=5):
+        self._intervalo = intervalo
+        self._arquivos = {}  # caminho -> [assinatura, [callbacks]]
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def registrar(self, caminho, recarregar, assinatura=None):
+        """
+        Registra `recarregar()` para ser chamada quando o arquivo mudar.
+        `assinatura` é a assinatura do arquivo já carregado pelo chamador.
+        """
+        with self._lock:
+            if caminho in self._arquivos:
+                self._arquivos[caminho][1].append(recarregar)
+            else:
+                self._arquivos[caminho] = [assinatura, [recarregar]]
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._executar, daemon=True, name="RecargaThread")
+                self._thread.start()
+
+    def verificar(self):
+        """Recarrega os arquivos que mudaram desde a última verificação."""
+        with self._lock:
+            arquivos = list(self._arquivos.items())
+
+        for caminho, registro in arquivos:
+            assinatura = assinatura_arquivo(caminho)
+            if assinatura == registro[0]:
+                continue
+
+            registro[0] = assinatura
+            if assinatura is None:
+                logger.warning(f"⚠️ Arquivo monitorado não encontrado: {caminho}")
+                continue
+
+            logger.info(f"🔄 Alteração detectada em {caminho}. Recarregando...")
+            for recarregar in list(registro[1]):
+                try:
+                    recarregar()
+                except Exception as e:
+                    logger.error(f"❌ Erro ao recarregar {caminho}: {e}", exc_info=True)
+
+    def _executar(self):
+        while True:
+            time.sleep(self._intervalo)
+            self.verificar()
+
+
+# Instância compartilhada pelos catálogos
+monitor_arquivos = MonitorArquivos(RECARGA_INTERVALO)
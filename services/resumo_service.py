@@ -0,0 +1,121 @@
+import threading
+from collections import OrderedDict
+from logger import logger
+from services.pedidos_db import banco_pedidos
+from services.pedidos_service import calcular_valores_pecas, obter_nome_projeto, obter_nome_materia_prima
+
+# Quantidade máxima de resumos mantidos em memória
+MAX_RESUMOS_CACHE = 1024
+
+def renderizar_resumo(nome_pedido, projetos):
+    """
+    Monta o texto do resumo do pedido.
+    `projetos` é uma lista de dicionários com descricao_projeto, descricao_materia_prima, valor_mp_m2,
+    quantidade_projetos (opcional) e pecas (já calculadas por calcular_valores_pecas).
+    """
+    linhas = [f"📝 *Resumo do Pedido: {nome_pedido}*\n"]
+    total_geral = 0
+    total_m2 = 0
+    total_pecas = 0
+
+    for projeto in projetos:
+        linhas.append("*►►►►►►►►►◄◄◄◄◄◄◄◄◄*\n")
+        linhas.append(f"📌 *Projeto:* {projeto['descricao_projeto']}\n")
+        linhas.append(f"🔹 *Matéria-prima:* {projeto['descricao_materia_prima']}\n")
+        linhas.append(f"💰 *Valor por m²:* R${projeto['valor_mp_m2']:.2f}\n")
+        if projeto.get("quantidade_projetos") is not None:
+            linhas.append(f"🏢 *Quantidade de Projetos:* {projeto['quantidade_projetos']}\n")
+        linhas.append("\n")
+
+        for peca in projeto["pecas"]:
+            linhas.append(f"🔸 {peca['quantidade']}x {peca['descricao_peca']} - {peca['altura_peca']}mm x {peca['largura_peca']}mm\n")
+            linhas.append(f"📏 Área: {peca['area_m2']}m² | 💰 Valor: R${peca['valor_total']:.2f}\n")
+            total_m2 += peca["area_m2"]
+            total_pecas += peca["quantidade"]
+            total_geral += peca["valor_total"]
+
+    linhas.append("*=========================*\n")
+    linhas.append(f"📏 *Área total:* {total_m2:.2f}m²\n")
+    linhas.append(f"🏢 *Quantidade total de peças:* {total_pecas}\n")
+    linhas.append(f"💰 *Valor total do pedido:* R${total_geral:.2f}\n")
+    linhas.append("*=========================*\n")
+    return "".join(linhas)
+
+
+def projetos_dos_pedidos_acumulados(pedidos):
+    """Calcula as peças dos pedidos ainda não salvos e resolve os nomes pelos catálogos em memória."""
+    projetos = []
+    for pedido in pedidos:
+        pecas_calculadas, _ = calcular_valores_pecas(pedido["pecas"], pedido["valor_mp_m2"])
+        projetos.append({
+            "descricao_projeto": obter_nome_projeto(pedido["id_projeto"]),
+            "descricao_materia_prima": obter_nome_materia_prima(pedido["id_materia_prima"]),
+            "valor_mp_m2": pedido["valor_mp_m2"],
+            "quantidade_projetos": pedido.get("quantidade_projetos", 1),
+            "pecas": pecas_calculadas,
+        })
+    return projetos
+
+
+def projetos_dos_itens(itens):
+    """Agrupa as linhas gravadas de um pedido em projetos (linhas consecutivas do mesmo projeto e vão)."""
+    projetos = []
+    chave_anterior = None
+    for item in itens:
+        chave = (item["id_projeto"], item["id_materia_prima"], item["valor_mp_m2"], item["altura_vao"], item["largura_vao"])
+        if chave != chave_anterior:
+            projetos.append({
+                "descricao_projeto": item["descricao_projeto"],
+                "descricao_materia_prima": item["descricao_materia_prima"],
+                "valor_mp_m2": item["valor_mp_m2"],
+                "pecas": [],
+            })
+            chave_anterior = chave
+        projetos[-1]["pecas"].append(item)
+    return projetos
+
+
+class ResumoPedidoCache:
+    """
+    Cache dos resumos dos pedidos gravados, por id_pedido.
+    A entrada é descartada quando as linhas ou o status do pedido mudam no banco.
+    """
+    _resumos = OrderedDict()  # id_pedido -> texto do resumo
+    _lock = threading.Lock()
+    _versao = 0  # Incrementada a cada invalidação; evita guardar um resumo lido antes de uma alteração
+
+    @classmethod
+    def obter_resumo(cls, id_pedido):
+        """Retorna o resumo do pedido gravado, ou None se o pedido não existir."""
+        id_pedido = str(id_pedido)
+        with cls._lock:
+            resumo = cls._resumos.get(id_pedido)
+            if resumo is not None:
+                cls._resumos.move_to_end(id_pedido)
+                return resumo
+            versao = cls._versao
+
+        itens = banco_pedidos.itens_do_pedido(id_pedido)
+        if not itens:
+            return None
+
+        resumo = renderizar_resumo(itens[0]["nome_pedido"], projetos_dos_itens(itens))
+        with cls._lock:
+            if versao != cls._versao:
+                return resumo
+            cls._resumos[id_pedido] = resumo
+            while len(cls._resumos) > MAX_RESUMOS_CACHE:
+                cls._resumos.popitem(last=False)
+        return resumo
+
+    @classmethod
+    def invalidar(cls, ids_pedidos):
+        """Descarta os resumos dos pedidos informados."""
+        with cls._lock:
+            cls._versao += 1
+            for id_pedido in ids_pedidos:
+                cls._resumos.pop(str(id_pedido), None)
+        logger.debug(f"🧹 Resumos invalidados: {', '.join(map(str, ids_pedidos))}")
+
+
+banco_pedidos.adicionar_ouvinte(ResumoPedidoCache.invalidar)
@@ -0,0 +1,130 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+from config import GATEWAY_CIRCUITO_FALHAS, GATEWAY_CIRCUITO_ESPERA
+from logger import logger
+
+class CircuitBreaker:
+    """
+    Disjuntor para o gateway: abre após `limite_falhas` falhas consecutivas,
+    bloqueando novas tentativas por `tempo_espera` segundos. Depois disso libera
+    uma única tentativa de teste (meio aberto) antes de fechar novamente.
+    """
+
+    FECHADO = "FECHADO"
+    ABERTO = "ABERTO"
+    MEIO_ABERTO = "MEIO_ABERTO"
+
+    # Espera (segundos) sugerida enquanto a tentativa de teste do circuito meio aberto está em andamento
+    ESPERA_TESTE = 1.0
+
+    def __init__(self, limite_falhas=5, tempo_espera=30):
+        self.limite_falhas = limite_falhas
+        self.tempo_espera = tempo_espera
+        self._estado = self.FECHADO
+        self._falhas_consecutivas = 0
+        self._aberto_ate = 0.0
+        self._teste_em_andamento = False
+        self._lock = threading.Lock()
+
+    def permitir(self):
+        """Indica se uma tentativa de envio pode ser feita agora."""
+        with self._lock:
+            if self._estado == self.FECHADO:
+                return True
+            if self._estado == self.ABERTO and time.monotonic() >= self._aberto_ate:
+                self._estado = self.MEIO_ABERTO
+                self._teste_em_andamento = False
+                logger.info("🟡 Circuito do gateway meio aberto: liberando tentativa de teste.")
+            if self._estado == self.MEIO_ABERTO and not self._teste_em_andamento:
+                self._teste_em_andamento = True
+                return True
+            return False
+
+    def registrar_sucesso(self):
+        with self._lock:
+            if self._estado != self.FECHADO:
+                logger.info("🟢 Circuito do gateway fechado: envios normalizados.")
+            self._estado = self.FECHADO
+            self._falhas_consecutivas = 0
+            self._teste_em_andamento = False
+
+    def registrar_falha(self):
+        with self._lock:
+            self._falhas_consecutivas += 1
+            self._teste_em_andamento = False
+            if self._estado == self.MEIO_ABERTO or self._falhas_consecutivas >= self.limite_falhas:
+                if self._estado != self.ABERTO:
+                    logger.error(f"🔴 Circuito do gateway aberto após {self._falhas_consecutivas} falhas consecutivas.")
+                self._estado = self.ABERTO
+                self._aberto_ate = time.monotonic() + self.tempo_espera
+
+    def tempo_restante(self):
+        """
+        Segundos até o circuito liberar uma nova tentativa: 0 se estiver fechado (ou com o teste livre)
+        e ESPERA_TESTE enquanto a tentativa de teste do circuito meio aberto ainda não terminou.
+        """
+        with self._lock:
+            if self._estado == self.MEIO_ABERTO:
+                return self.ESPERA_TESTE if self._teste_em_andamento else 0.0
+            if self._estado != self.ABERTO:
+                return 0.0
+            return max(0.0, self._aberto_ate - time.monotonic())
+
+    def estado(self):
+        """Retorna um resumo do estado atual do circuito."""
+        with self._lock:
+            return {
+                "estado": self._estado,
+                "falhas_consecutivas": self._falhas_consecutivas,
+                "segundos_para_teste": round(max(0.0, self._aberto_ate - time.monotonic()), 1) if self._estado == self.ABERTO else 0,
+            }
+
+
+class AgendadorReenvio:
+    """Executa tarefas agendadas (reenvios) em uma thread própria, sem bloquear quem as agendou."""
+
+    def __init__(self):
+        self._fila = []  # heap de (horario, sequencia, funcao, args)
+        self._sequencia = itertools.count()
+        self._condicao = threading.Condition()
+        self._thread = None
+
+    def agendar(self, atraso, funcao, *args):
+        """Agenda `funcao(*args)` para daqui a `atraso` segundos."""
+        with self._condicao:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._executar, daemon=True, name="RetryThread")
+                self._thread.start()
+            heapq.heappush(self._fila, (time.monotonic() + atraso, next(self._sequencia), funcao, args))
+            self._condicao.notify()
+
+    def pendentes(self):
+        """Retorna o número de tarefas aguardando execução."""
+        with self._condicao:
+            return len(self._fila)
+
+    def _executar(self):
+        while True:
+            with self._condicao:
+                while not self._fila or self._fila[0][0] > time.monotonic():
+                    self._condicao.wait(self._fila[0][0] - time.monotonic() if self._fila else None)
+                _, _, funcao, args = heapq.heappop(self._fila)
+
+            try:
+                funcao(*args)
+            except Exception as e:
+                logger.error(f"❌ Erro ao executar tarefa agendada: {e}", exc_info=True)
+
+
+def calcular_backoff(tentativa, intervalo_base, maximo=60):
+    """Backoff exponencial com jitter: intervalo_base * 2^(tentativa-1), variando entre 50% e 150%."""
+    atraso = min(maximo, intervalo_base * (2 ** (tentativa - 1)))
+    return atraso * random.uniform(0.5, 1.5)
+
+
+# Instâncias compartilhadas
+circuito_gateway = CircuitBreaker(GATEWAY_CIRCUITO_FALHAS, GATEWAY_CIRCUITO_ESPERA)
+agendador_reenvio = AgendadorReenvio()
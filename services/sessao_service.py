@@ -0,0 +1,390 @@
+import atexit
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from operator import itemgetter
+from logger import logger
+from services.processo_service import identificador_processo, processo_ativo
+
+class MemoriaSessoes:
+    """
+    Sessões no próprio processo (padrão). Só funciona com um único processo do bot.
+    Os contatos liberados são marcados como alterados e gravados periodicamente em um snapshot
+    local (fora do caminho das mensagens), restaurado na próxima inicialização.
+    """
+
+    compartilhado = False
+
+    def __init__(self, caminho_snapshot=None, intervalo_snapshot=2.0, lock_do_contato=None):
+        self.sessoes = {}  # contato -> SessaoUsuario
+        self._caminho_snapshot = caminho_snapshot
+        self._intervalo_snapshot = intervalo_snapshot
+        self._lock_do_contato = lock_do_contato
+        self._alteradas = set()  # Contatos liberados desde o último snapshot
+        self._lock_alteradas = threading.Lock()
+        self._lock_snapshot = threading.Lock()
+        self._thread_snapshot = None
+        # Sessões restauradas ainda não desserializadas: contato -> (contato, status, ultima_interacao, dados)
+        self._pendentes = {}
+        self._lock_pendentes = threading.Lock()
+        self._tempo_parado = 0.0  # Somado à última interação das sessões restauradas
+
+    def _materializar(self, contato):
+        """Desserializa a sessão restaurada do contato no primeiro acesso."""
+        if not self._pendentes:
+            return
+        with self._lock_pendentes:
+            linha = self._pendentes.pop(contato, None)
+            if linha is None:
+                return
+            _, status, ultima_interacao, dados = linha
+            try:
+                sessao = pickle.loads(dados)
+            except Exception as e:
+                logger.warning(f"⚠️ Sessão de {contato} ignorada no snapshot: {e}")
+                return
+            sessao.status = status
+            sessao.ultima_interacao = ultima_interacao + self._tempo_parado if ultima_interacao is not None else None
+            self.sessoes.setdefault(contato, sessao)
+
+    def abrir(self, contato):
+        """Chamado ao travar o contato; as sessões já estão em memória (só desserializa uma sessão restaurada)."""
+        self._materializar(contato)
+
+    def fechar(self, contato):
+        """Chamado ao liberar o contato: a sessão pode ter mudado e entra no próximo snapshot."""
+        if self._caminho_snapshot:
+            with self._lock_alteradas:
+                self._alteradas.add(contato)
+
+    def ler(self, contato):
+        self._materializar(contato)
+        return self.sessoes.get(contato)
+
+    def listar(self, campo):
+        if campo not in ("status", "ultima_interacao"):
+            for contato in list(self._pendentes):
+                self._materializar(contato)
+
+        valores = [(contato, getattr(sessao, campo)) for contato, sessao in list(self.sessoes.items())]
+        if self._pendentes:
+            if campo == "status":
+                valores.extend((linha[0], linha[1]) for linha in list(self._pendentes.values()))
+            else:
+                valores.extend(
+                    (linha[0], linha[2] + self._tempo_parado if linha[2] is not None else None)
+                    for linha in list(self._pendentes.values())
+                )
+        return valores
+
+    def _conexao_snapshot(self):
+        os.makedirs(os.path.dirname(self._caminho_snapshot), exist_ok=True)
+        conexao = sqlite3.connect(self._caminho_snapshot, timeout=30, isolation_level=None)
+        conexao.execute("PRAGMA journal_mode=WAL")
+        conexao.executescript("""
+            CREATE TABLE IF NOT EXISTS sessoes (
+                contato TEXT PRIMARY KEY,
+                status TEXT,
+                ultima_interacao REAL,
+                dados BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS metadados (chave TEXT PRIMARY KEY, valor REAL NOT NULL);
+        """)
+        return conexao
+
+    def restaurar(self):
+        """
+        Recarrega as sessões do último snapshot. As últimas interações são deslocadas pelo tempo
+        em que o bot ficou parado, para que os prazos de inatividade continuem de onde pararam.
+        Status e última interação ficam disponíveis de imediato; o restante de cada sessão só é
+        desserializado quando o contato é acessado.
+        """
+        if not self._caminho_snapshot or not os.path.exists(self._caminho_snapshot):
+            return 0
+
+        inicio = time.perf_counter()
+        conexao = self._conexao_snapshot()
+        try:
+            salvo_em = conexao.execute("SELECT valor FROM metadados WHERE chave = 'salvo_em'").fetchone()
+            linhas = conexao.execute("SELECT contato, status, ultima_interacao, dados FROM sessoes").fetchall()
+        finally:
+            conexao.close()
+
+        with self._lock_pendentes:
+            self._tempo_parado = max(time.time() - salvo_em[0], 0) if salvo_em else 0.0
+            self._pendentes = dict(zip(map(itemgetter(0), linhas), linhas))
+        with self._lock_alteradas:
+            self._alteradas.update(self._pendentes)  # Regrava com os prazos deslocados
+
+        logger.info(
+            f"♻️ {len(linhas)} sessões restauradas do snapshot em {(time.perf_counter() - inicio) * 1000:.1f} ms "
+            f"(bot parado por {self._tempo_parado:.0f}s)."
+        )
+        return len(linhas)
+
+    def gravar_snapshot(self):
+        """Grava no snapshot as sessões alteradas desde a última gravação (e remove as encerradas)."""
+        with self._lock_snapshot:
+            with self._lock_alteradas:
+                alteradas, self._alteradas = self._alteradas, set()
+
+            gravar, deslocar, remover = [], [], []
+            for contato in alteradas:
+                with self._lock_do_contato(contato):  # Serializa a sessão sem que outra thread a altere
+                    linha = self._pendentes.get(contato)
+                    sessao = self.sessoes.get(contato)
+                    if linha is not None:
+                        # Restaurada e ainda não acessada: só os prazos mudaram
+                        deslocar.append((linha[1], linha[2] + self._tempo_parado if linha[2] is not None else None, contato))
+                    elif sessao is None or sessao.vazia():
+                        remover.append((contato,))
+                    else:
+                        dados = pickle.dumps(sessao, protocol=pickle.HIGHEST_PROTOCOL)
+                        gravar.append((contato, sessao.status, sessao.ultima_interacao, dados))
+
+            try:
+                conexao = self._conexao_snapshot()
+                try:
+                    conexao.execute("BEGIN IMMEDIATE")
+                    conexao.executemany("INSERT OR REPLACE INTO sessoes (contato, status, ultima_interacao, dados) VALUES (?, ?, ?, ?)", gravar)
+                    conexao.executemany("UPDATE sessoes SET status = ?, ultima_interacao = ? WHERE contato = ?", deslocar)
+                    conexao.executemany("DELETE FROM sessoes WHERE contato = ?", remover)
+                    conexao.execute("INSERT OR REPLACE INTO metadados (chave, valor) VALUES ('salvo_em', ?)", (time.time(),))
+                    conexao.execute("COMMIT")
+                finally:
+                    conexao.close()
+            except Exception:
+                with self._lock_alteradas:
+                    self._alteradas.update(alteradas)  # Tenta novamente no próximo ciclo
+                raise
+
+    def assumir_servico(self, nome, duracao):
+        """Com um único processo, ele sempre executa os serviços em segundo plano."""
+        return True
+
+    def iniciar_snapshots(self):
+        """Inicia a thread que grava o snapshot a cada `intervalo_snapshot` segundos."""
+        if not self._caminho_snapshot or self._thread_snapshot is not None:
+            return
+        self._thread_snapshot = threading.Thread(target=self._executar_snapshots, daemon=True, name="SessoesSnapshotThread")
+        self._thread_snapshot.start()
+        atexit.register(self.gravar_snapshot)
+
+    def _executar_snapshots(self):
+        while True:
+            time.sleep(self._intervalo_snapshot)
+            try:
+                self.gravar_snapshot()
+            except Exception as e:
+                logger.error(f"❌ Erro ao gravar o snapshot das sessões: {e}", exc_info=True)
+
+
+class SQLiteSessoes:
+    """
+    Sessões compartilhadas entre processos em um banco SQLite (modo WAL).
+    Ao travar um contato, o processo obtém uma concessão (lease) exclusiva sobre ele e carrega
+    a sessão para memória; ao liberar, grava a sessão (se mudou) com verificação de versão
+    (compare-and-swap) e devolve a concessão. Concessões expiram após `duracao_lease` segundos,
+    e a de um processo que não existe mais (na mesma máquina) é retomada de imediato, para que
+    a queda de um processo não bloqueie o contato.
+    Leituras sem a trava são reaproveitadas por até `cache_leitura` segundos.
+    """
+
+    compartilhado = True
+
+    def __init__(self, caminho, duracao_lease=30.0, cache_leitura=1.0):
+        self._caminho = caminho
+        self._duracao_lease = duracao_lease
+        self._cache_leitura = cache_leitura
+        self._local = threading.local()
+        self._lock_inicializacao = threading.Lock()
+        self._inicializado = False
+        self.sessoes = {}  # Contatos travados por este processo -> SessaoUsuario
+        self._carregadas = {}  # contato -> (versao, dados) lidos ao travar
+        self._cache_sessoes = {}  # contato -> (válido até, sessão) das leituras sem trava
+        self._cache_listas = {}  # campo -> (válido até, pares)
+
+    @property
+    def _dono(self):
+        """Identificador deste processo (muda após um fork)."""
+        return identificador_processo()
+
+    def _conexao(self):
+        conexao = getattr(self._local, "conexao", None)
+        if conexao is None or self._local.pid != os.getpid():
+            self._inicializar()
+            conexao = sqlite3.connect(self._caminho, timeout=30, isolation_level=None)
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexao = conexao
+            self._local.pid = os.getpid()
+        return conexao
+
+    def _inicializar(self):
+        with self._lock_inicializacao:
+            if self._inicializado:
+                return
+            os.makedirs(os.path.dirname(self._caminho), exist_ok=True)
+            conexao = sqlite3.connect(self._caminho, timeout=30, isolation_level=None)
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.executescript("""
+                CREATE TABLE IF NOT EXISTS sessoes (
+                    contato TEXT PRIMARY KEY,
+                    versao INTEGER NOT NULL,
+                    status TEXT,
+                    ultima_interacao REAL,
+                    dados BLOB NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS travas_sessao (
+                    contato TEXT PRIMARY KEY,
+                    dono TEXT NOT NULL,
+                    expira_em REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS servicos (
+                    nome TEXT PRIMARY KEY,
+                    dono TEXT NOT NULL,
+                    expira_em REAL NOT NULL
+                );
+            """)
+            conexao.close()
+            self._inicializado = True
+            logger.info(f"🗄️ Sessões compartilhadas em {self._caminho}.")
+
+    def _transacao(self, conexao, funcao):
+        conexao.execute("BEGIN IMMEDIATE")
+        try:
+            resultado = funcao()
+            conexao.execute("COMMIT")
+            return resultado
+        except Exception:
+            conexao.execute("ROLLBACK")
+            raise
+
+    def _adquirir_lease(self, conexao, contato):
+        dono = self._dono
+        limite = time.monotonic() + 2 * self._duracao_lease
+
+        def tentar():
+            agora = time.time()
+            linha = conexao.execute("SELECT dono, expira_em FROM travas_sessao WHERE contato = ?", (contato,)).fetchone()
+            if linha and linha[0] != dono and linha[1] > agora:
+                if processo_ativo(linha[0]):
+                    return False
+                logger.warning(f"⚠️ Concessão de {contato} retomada do processo encerrado {linha[0]}.")
+            conexao.execute(
+                "INSERT OR REPLACE INTO travas_sessao (contato, dono, expira_em) VALUES (?, ?, ?)",
+                (contato, dono, agora + self._duracao_lease),
+            )
+            return True
+
+        espera = 0.005
+        while not self._transacao(conexao, tentar):
+            if time.monotonic() > limite:
+                raise TimeoutError(f"Não foi possível travar a sessão de {contato} em {2 * self._duracao_lease:.0f}s.")
+            time.sleep(espera)
+            espera = min(espera * 2, 0.1)
+
+    def abrir(self, contato):
+        """Obtém a concessão do contato e carrega sua sessão para memória."""
+        conexao = self._conexao()
+        self._adquirir_lease(conexao, contato)
+
+        linha = conexao.execute("SELECT versao, dados FROM sessoes WHERE contato = ?", (contato,)).fetchone()
+        if linha:
+            self.sessoes[contato] = pickle.loads(linha[1])
+            self._carregadas[contato] = (linha[0], linha[1])
+        else:
+            self.sessoes.pop(contato, None)
+            self._carregadas[contato] = (0, None)
+
+    def fechar(self, contato):
+        """Grava a sessão do contato (se mudou), devolve a concessão e a remove da memória."""
+        conexao = self._conexao()
+        sessao = self.sessoes.pop(contato, None)
+        versao, dados_anteriores = self._carregadas.pop(contato, (0, None))
+        dados = pickle.dumps(sessao, protocol=pickle.HIGHEST_PROTOCOL) if sessao is not None and not sessao.vazia() else None
+
+        def gravar():
+            if dados != dados_anteriores:
+                linha = conexao.execute("SELECT versao FROM sessoes WHERE contato = ?", (contato,)).fetchone()
+                if (linha[0] if linha else 0) != versao:
+                    # A concessão expirou e outro processo alterou a sessão: a versão dele prevalece
+                    logger.warning(f"⚠️ Sessão de {contato} alterada por outro processo. Alterações locais descartadas.")
+                elif dados is None:
+                    conexao.execute("DELETE FROM sessoes WHERE contato = ?", (contato,))
+                else:
+                    conexao.execute(
+                        "INSERT OR REPLACE INTO sessoes (contato, versao, status, ultima_interacao, dados) VALUES (?, ?, ?, ?, ?)",
+                        (contato, versao + 1, sessao.status, sessao.ultima_interacao, dados),
+                    )
+            conexao.execute("DELETE FROM travas_sessao WHERE contato = ? AND dono = ?", (contato, self._dono))
+
+        self._transacao(conexao, gravar)
+        self._cache_sessoes.pop(contato, None)
+        self._cache_listas.clear()
+
+    def assumir_servico(self, nome, duracao):
+        """
+        Obtém (ou renova) por `duracao` segundos a posse de um serviço que só um processo deve executar
+        (ex.: o monitor de inatividade). Retorna False se outro processo ativo já o executa; a posse
+        de um processo encerrado, ou não renovada a tempo, é retomada.
+        """
+        conexao = self._conexao()
+        dono = self._dono
+
+        def tentar():
+            agora = time.time()
+            linha = conexao.execute("SELECT dono, expira_em FROM servicos WHERE nome = ?", (nome,)).fetchone()
+            if linha and linha[0] != dono and linha[1] > agora and processo_ativo(linha[0]):
+                return False
+            conexao.execute("INSERT OR REPLACE INTO servicos (nome, dono, expira_em) VALUES (?, ?, ?)", (nome, dono, agora + duracao))
+            return True
+
+        return self._transacao(conexao, tentar)
+
+    def restaurar(self):
+        """As sessões já ficam gravadas no banco; nada a restaurar."""
+        return 0
+
+    def iniciar_snapshots(self):
+        """As sessões já ficam gravadas no banco; não há snapshot."""
+
+    def ler(self, contato):
+        """Lê a sessão sem travá-la (somente leitura, pode estar até `cache_leitura` segundos defasada)."""
+        agora = time.monotonic()
+        em_cache = self._cache_sessoes.get(contato)
+        if em_cache and em_cache[0] > agora:
+            return em_cache[1]
+
+        linha = self._conexao().execute("SELECT dados FROM sessoes WHERE contato = ?", (contato,)).fetchone()
+        sessao = pickle.loads(linha[0]) if linha else None
+        if len(self._cache_sessoes) > 10000:
+            self._cache_sessoes.clear()
+        self._cache_sessoes[contato] = (agora + self._cache_leitura, sessao)
+        return sessao
+
+    def listar(self, campo):
+        """Retorna (contato, valor do campo) de todas as sessões gravadas (com o mesmo cache de `ler`)."""
+        agora = time.monotonic()
+        em_cache = self._cache_listas.get(campo)
+        if em_cache and em_cache[0] > agora:
+            return em_cache[1]
+
+        conexao = self._conexao()
+        if campo in ("status", "ultima_interacao"):
+            pares = conexao.execute(f"SELECT contato, {campo} FROM sessoes").fetchall()
+        else:
+            pares = [(contato, getattr(pickle.loads(dados), campo)) for contato, dados in conexao.execute("SELECT contato, dados FROM sessoes")]
+        self._cache_listas[campo] = (agora + self._cache_leitura, pares)
+        return pares
+
+
+def criar_backend_sessoes(tipo, caminho_sqlite, duracao_lease, cache_leitura=1.0, caminho_snapshot=None, intervalo_snapshot=2.0, lock_do_contato=None):
+    """Cria o armazenamento de sessões configurado ('memoria' ou 'sqlite')."""
+    if tipo == "sqlite":
+        return SQLiteSessoes(caminho_sqlite, duracao_lease, cache_leitura)
+    if tipo != "memoria":
+        logger.warning(f"⚠️ SESSAO_BACKEND desconhecido '{tipo}'. Usando sessões em memória.")
+    return MemoriaSessoes(caminho_snapshot, intervalo_snapshot, lock_do_contato)
@@ -1,38 +1,149 @@
+import heapq
+import threading
 import time
-from config import TIMEOUT_WARNING, TIMEOUT_FINAL
-from services.message_service import enviar_mensagem, salvar_mensagem_em_arquivo
+from config import TIMEOUT_WARNING, TIMEOUT_FINAL, INATIVIDADE_ESPERA_ERRO, SESSAO_LEASE_SEGUNDOS
+from logger import logger
+from services.message_service import enviar_mensagem, salvar_mensagem_em_arquivo, agrupar_mensagens
 from services.global_state import global_state
 
+class AgendaInatividade:
+    """
+    Prazos de inatividade ordenados em um heap. Reagendar um contato só adiciona uma nova entrada
+    (O(log n)); as entradas antigas são descartadas quando chegam ao topo (invalidação preguiçosa).
+    """
+
+    def __init__(self):
+        self._heap = []  # (prazo, contato)
+        self._prazos = {}  # contato -> prazo vigente
+        self._condicao = threading.Condition()
+
+    def agendar(self, contato, prazo):
+        """Define o próximo prazo do contato, acordando o monitor se ele passar a ser o mais próximo."""
+        with self._condicao:
+            self._prazos[contato] = prazo
+            heapq.heappush(self._heap, (prazo, contato))
+            if len(self._heap) > 2 * len(self._prazos) + 64:
+                # Muitas entradas antigas: reconstrói o heap só com os prazos vigentes
+                self._heap = [(prazo, contato) for contato, prazo in self._prazos.items()]
+                heapq.heapify(self._heap)
+            if self._heap[0] == (prazo, contato):
+                self._condicao.notify()
+
+    def agendar_se_ausente(self, contato, prazo):
+        """Agenda o contato só se ele ainda não tiver prazo (um prazo desatualizado é corrigido ao vencer)."""
+        with self._condicao:
+            if contato not in self._prazos:
+                self.agendar(contato, prazo)
+
+    def remover(self, contato):
+        """Cancela o prazo do contato (sua entrada no heap é descartada ao chegar ao topo)."""
+        with self._condicao:
+            self._prazos.pop(contato, None)
+
+    def aguardar_vencido(self):
+        """Bloqueia até o prazo mais próximo vencer e retorna o contato correspondente."""
+        with self._condicao:
+            while True:
+                while self._heap and self._prazos.get(self._heap[0][1]) != self._heap[0][0]:
+                    heapq.heappop(self._heap)  # Entrada substituída por um prazo mais novo
+
+                if not self._heap:
+                    self._condicao.wait()
+                    continue
+
+                prazo, contato = self._heap[0]
+                espera = prazo - time.time()
+                if espera > 0:
+                    self._condicao.wait(espera)
+                    continue
+
+                heapq.heappop(self._heap)
+                del self._prazos[contato]
+                return contato
+
+# Instância única da agenda de inatividade
+agenda_inatividade = AgendaInatividade()
+global_state.ao_limpar(agenda_inatividade.remover)
+
+# Nome do serviço no armazenamento de sessões: só o processo que o detém executa o monitor
+SERVICO_MONITOR = "monitor_inatividade"
+
+# Sinaliza que este processo executa o monitor (os demais workers não precisam manter a agenda)
+monitor_em_execucao = threading.Event()
+
+
+def sincronizar_agenda():
+    """Agenda os contatos com sessão que ainda não estão na agenda (restaurados ou atendidos por outros workers)."""
+    for contato, ultima_interacao in global_state.ultima_interacao_usuario.items():
+        agenda_inatividade.agendar_se_ausente(contato, ultima_interacao + TIMEOUT_WARNING)
+
+def manter_posse_do_monitor():
+    """Renova a posse do monitor e traz para a agenda os contatos atendidos pelos outros workers."""
+    while True:
+        time.sleep(SESSAO_LEASE_SEGUNDOS / 3)
+        try:
+            if not global_state.assumir_servico(SERVICO_MONITOR, SESSAO_LEASE_SEGUNDOS):
+                logger.warning("⚠️ Posse do monitor de inatividade assumida por outro processo.")
+            sincronizar_agenda()
+        except Exception as e:
+            logger.error(f"❌ Erro ao renovar a posse do monitor de inatividade: {e}", exc_info=True)
+
 def monitor_inactivity():
-    """Monitora usuários inativos e envia avisos ou encerra conversas."""
+    """
+    Monitora usuários inativos e envia avisos ou encerra conversas, dormindo até o próximo prazo.
+    Com sessões compartilhadas entre workers, um único processo executa o monitor: o que detém o
+    serviço SERVICO_MONITOR no banco de sessões. Os demais aguardam e o assumem se ele cair.
+    """
+    while not global_state.assumir_servico(SERVICO_MONITOR, SESSAO_LEASE_SEGUNDOS):
+        time.sleep(SESSAO_LEASE_SEGUNDOS / 3)
+    logger.info("👀 Monitor de inatividade em execução neste processo.")
+    monitor_em_execucao.set()
+    sincronizar_agenda()  # Sessões restauradas (ou de outros workers)
+    if global_state.compartilhado:
+        threading.Thread(target=manter_posse_do_monitor, daemon=True, name="MonitorPosseThread").start()
+
     while True:
+        contato = agenda_inatividade.aguardar_vencido()
         try:
-            horario_atual = time.time()
+            verificar_inatividade(contato)
+        except Exception as e:
+            # O prazo do contato já saiu da agenda: sem reagendar, ele nunca seria verificado de novo
+            logger.error(f"❌ Erro no monitoramento de inatividade de {contato}: {e}", exc_info=True)
+            agenda_inatividade.agendar(contato, time.time() + INATIVIDADE_ESPERA_ERRO)
 
-            for contato, ultima_interacao in list(global_state.ultima_interacao_usuario.items()):
-                status = global_state.status_usuario.get(contato)
+def verificar_inatividade(contato):
+    """Envia o aviso ou encerra a conversa do contato, conforme o tempo inativo, e agenda o próximo prazo."""
+    with agrupar_mensagens(contato), global_state.travar(contato):
+        # Relê o estado com o contato travado: uma mensagem pode ter chegado nesse meio tempo
+        status = global_state.status_usuario.get(contato)
+        ultima_interacao = global_state.ultima_interacao_usuario.get(contato)
 
-                if not status or status.startswith("inativo_"):
-                    continue  # Ignorar usuários já marcados como inativos
+        if not status or ultima_interacao is None or status.startswith("inativo_"):
+            return  # Ignorar usuários já marcados como inativos (uma nova mensagem reagenda o contato)
 
-                tempo_inativo = horario_atual - ultima_interacao
+        tempo_inativo = time.time() - ultima_interacao
 
-                if tempo_inativo > TIMEOUT_WARNING and not status.startswith("aviso_enviado"):
-                    enviar_aviso_inatividade(contato, status)
-                    global_state.status_usuario[contato] = f"aviso_enviado_{status}"
+        if tempo_inativo >= TIMEOUT_WARNING and not status.startswith("aviso_enviado"):
+            enviar_aviso_inatividade(contato, status)
+            status = f"aviso_enviado_{status}"
+            global_state.status_usuario[contato] = status
 
-                if tempo_inativo > (TIMEOUT_WARNING + TIMEOUT_FINAL):
-                    encerrar_conversa_por_inatividade(contato)
+        if tempo_inativo >= (TIMEOUT_WARNING + TIMEOUT_FINAL):
+            encerrar_conversa_por_inatividade(contato)
+            return
 
-            time.sleep(5)  # Reduz carga no sistema
-        except Exception as e:
-            print(f"❌ Erro no monitoramento de inatividade: {e}")
+        proximo_prazo = TIMEOUT_WARNING + TIMEOUT_FINAL if status.startswith("aviso_enviado") else TIMEOUT_WARNING
+        agenda_inatividade.agendar(contato, ultima_interacao + proximo_prazo)
 
 def atualizar_ultima_atividade(contato):
     """
-    Atualiza o tempo da última atividade do usuário.
+    Atualiza o tempo da última atividade do usuário e reagenda seu prazo de inatividade
+    (nos workers que não executam o monitor, o dono do monitor o agenda ao sincronizar).
     """
-    global_state.ultima_interacao_usuario[contato] = time.time()
+    agora = time.time()
+    global_state.ultima_interacao_usuario[contato] = agora
+    if monitor_em_execucao.is_set():
+        agenda_inatividade.agendar(contato, agora + TIMEOUT_WARNING)
 
 
 def enviar_aviso_inatividade(contato, status):
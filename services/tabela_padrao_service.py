@@ -0,0 +1,145 @@
+import os
+import threading
+import pandas as pd
+from config import OUTPUT_DIR, PROJECT_FILE_PATH, MATERIAL_FILE_PATH, FORMULAS_FILE_PATH
+from logger import logger
+from services.formula_service import FormulaCache
+from services.materials_service import MateriaPrimaCache
+from services.product_service import ProjetoCache, chave_id
+from services.orcamento_service import calcular_orcamento_lote
+from services.recarga_service import monitor_arquivos
+
+TABELA_PADRAO_FILE_PATH = os.path.join(OUTPUT_DIR, "tabela_precos_padrao.xlsx")
+
+# Matéria-prima usada em todas as peças padrão
+ESPESSURA_PADRAO = "08 mm"
+BENEFICIAMENTO_PADRAO = "TEMPERADO"
+
+def medidas_padrao(projeto, definicao_3=None):
+    """
+    Retorna (altura, largura) automáticas de um projeto padrão (box/janela padrão), ou (None, None).
+    A altura depende do tipo do projeto e a largura é o primeiro número do rótulo de `definicao_3`.
+    """
+    descricao_projeto = str(projeto.get("descricao_projeto", "")).lower()
+
+    if "box padrão" in descricao_projeto:
+        altura = 1845 if "fixo" in descricao_projeto else 1880
+    elif "janela padrão" in descricao_projeto:
+        altura = 938 if "fixo" in descricao_projeto else 975
+    else:
+        return None, None  # Outros tipos de projetos NÃO têm medidas automáticas
+
+    largura_opcao = definicao_3 if definicao_3 is not None else projeto.get("definicao_3")
+    if largura_opcao and isinstance(largura_opcao, str):
+        numeros_encontrados = [int(s) for s in largura_opcao.split() if s.isdigit()]
+        if numeros_encontrados:
+            return altura, numeros_encontrados[0]  # Pegamos o primeiro número encontrado
+
+    return altura, None
+
+
+def projeto_padrao(projeto):
+    """Indica se o projeto é uma peça padrão (matéria-prima fixa em 08 mm TEMPERADO)."""
+    return "padrão" in str(projeto.get("definicao_1", "")).strip().lower()
+
+
+class TabelaPadrao:
+    """
+    Tabela de preços de todas as combinações projeto padrão × largura × cor, para 1 unidade
+    (lista de preços exportada). O chat usa dela as peças e a matéria-prima de cada combinação;
+    o valor para outras quantidades é recalculado (a área cobrada é arredondada por linha).
+    É recalculada em segundo plano (na thread de recarga) logo depois que algum dos catálogos
+    (projetos, matérias-primas ou fórmulas) é recarregado, e trocada de forma atômica.
+    """
+    _tabela = None  # (id_projeto, largura, cor) -> entrada
+    _origem = None  # Catálogos usados no último cálculo
+    _lock = threading.Lock()
+    _monitorado = False
+
+    @classmethod
+    def obter_tabela(cls):
+        """Retorna a tabela atual, calculando-a na primeira chamada."""
+        tabela = cls._tabela
+        if tabela is None:
+            cls._recarregar()
+            tabela = cls._tabela
+        return tabela
+
+    @classmethod
+    def _recarregar(cls):
+        """Recalcula a tabela se algum catálogo mudou desde o último cálculo e a publica."""
+        with cls._lock:
+            origem = (ProjetoCache.obter_catalogo(), MateriaPrimaCache.obter_catalogo(), FormulaCache.obter_formulas())
+            if cls._tabela is None or not all(a is b for a, b in zip(origem, cls._origem)):
+                cls._tabela = cls._calcular(*origem)  # Troca atômica
+                cls._origem = origem
+
+            if not cls._monitorado:
+                # Registrada depois das recargas dos próprios catálogos (feitas acima), roda logo após cada uma
+                for caminho in (PROJECT_FILE_PATH, MATERIAL_FILE_PATH, FORMULAS_FILE_PATH):
+                    monitor_arquivos.registrar(caminho, cls._recarregar)
+                cls._monitorado = True
+
+    @staticmethod
+    def _calcular(catalogo_projetos, catalogo_mp, formulas):
+        linhas = []
+        chaves = []
+        for projeto in catalogo_projetos.por_id.values():
+            if not projeto_padrao(projeto):
+                continue
+            altura, largura = medidas_padrao(projeto)
+            if altura is None or largura is None:
+                continue
+
+            for cor in catalogo_mp.cores:
+                id_materia_prima, _ = catalogo_mp.buscar(cor, ESPESSURA_PADRAO, BENEFICIAMENTO_PADRAO)
+                if id_materia_prima is None:
+                    continue
+                linhas.append({"id_projeto": projeto.get("id_projeto"), "altura": altura, "largura": largura, "id_materia_prima": id_materia_prima})
+                chaves.append((altura, largura, cor))
+
+        tabela = {}
+        if linhas:
+            resultados, _ = calcular_orcamento_lote(linhas)
+            for (altura, largura, cor), resultado in zip(chaves, resultados):
+                if resultado["status"] != "success":
+                    continue
+                tabela[(chave_id(resultado["id_projeto"]), largura, cor)] = {
+                    **resultado,
+                    "altura": altura,
+                    "largura": largura,
+                    "cor_materia_prima": cor,
+                }
+
+        logger.info(f"💲 Tabela de preços padrão calculada: {len(tabela)} combinações.")
+        return tabela
+
+
+def consultar_preco_padrao(id_projeto, largura, cor_materia_prima):
+    """Retorna a entrada da tabela padrão (peças, matéria-prima e valor para 1 unidade), ou None."""
+    return TabelaPadrao.obter_tabela().get((chave_id(id_projeto), largura, cor_materia_prima))
+
+
+def exportar_tabela_padrao(caminho=TABELA_PADRAO_FILE_PATH):
+    """Exporta a tabela de preços padrão para uma planilha (lista de preços)."""
+    registros = [
+        {
+            "id_projeto": entrada["id_projeto"],
+            "descricao_projeto": entrada["descricao_projeto"],
+            "altura": entrada["altura"],
+            "largura": entrada["largura"],
+            "cor_materia_prima": entrada["cor_materia_prima"],
+            "id_materia_prima": entrada["id_materia_prima"],
+            "valor_mp_m2": entrada["valor_mp_m2"],
+            "pecas": "; ".join(f"{peca['quantidade']}x {peca['nome_peca']} {peca['altura_peca']}x{peca['largura_peca']}mm" for peca in entrada["pecas"]),
+            "valor_total": entrada["valor_total"],
+        }
+        for entrada in TabelaPadrao.obter_tabela().values()
+    ]
+    pd.DataFrame(registros).to_excel(caminho, index=False)
+    logger.info(f"📤 Tabela de preços padrão exportada para {caminho} ({len(registros)} linhas).")
+    return caminho
+
+
+if __name__ == "__main__":
+    exportar_tabela_padrao()
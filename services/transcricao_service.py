@@ -0,0 +1,109 @@
+import atexit
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from config import CONVERSATIONS_DIR, TRANSCRICAO_MAX_ARQUIVOS, TRANSCRICAO_MAX_LINHAS, TRANSCRICAO_INTERVALO_FLUSH
+from logger import logger
+
+class EscritorTranscricoes:
+    """
+    Grava as transcrições das conversas em segundo plano.
+    As linhas ficam em memória e são gravadas por uma thread quando o buffer atinge
+    `max_linhas` ou a cada `intervalo_flush` segundos. Os arquivos abertos são mantidos
+    em um cache LRU limitado a `max_arquivos` handles.
+    """
+
+    def __init__(self, diretorio, max_arquivos=64, max_linhas=200, intervalo_flush=1.0):
+        self._diretorio = diretorio
+        self._max_arquivos = max_arquivos
+        self._max_linhas = max_linhas
+        self._intervalo_flush = intervalo_flush
+        self._buffer = []  # lista de (nome_arquivo, linha)
+        self._lock = threading.Lock()
+        self._lock_escrita = threading.Lock()  # Protege os arquivos abertos
+        self._evento = threading.Event()
+        self._arquivos = OrderedDict()  # nome_arquivo -> handle (ordem de uso)
+        self._thread = None
+        self._diretorio_criado = False
+
+    def registrar(self, contato, nome_cliente, mensagem):
+        """Adiciona uma linha à transcrição do contato (sem I/O na thread chamadora)."""
+        agora = datetime.now()
+        nome_arquivo = f"{agora:%Y-%m-%d}_user_{contato}.txt"
+        linha = f"[{agora:%Y-%m-%d %H:%M:%S}] [Cliente: {nome_cliente}] {mensagem}\n"
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._executar, daemon=True, name="TranscricaoThread")
+                self._thread.start()
+            self._buffer.append((nome_arquivo, linha))
+            cheio = len(self._buffer) >= self._max_linhas
+
+        if cheio:
+            self._evento.set()
+
+    def flush(self):
+        """Grava em disco todas as linhas pendentes."""
+        with self._lock_escrita:
+            with self._lock:
+                linhas, self._buffer = self._buffer, []
+
+            if not linhas:
+                return
+
+            # Agrupa por arquivo para uma única escrita por arquivo, preservando a ordem das linhas
+            por_arquivo = {}
+            for nome_arquivo, linha in linhas:
+                por_arquivo.setdefault(nome_arquivo, []).append(linha)
+
+            for nome_arquivo, linhas_arquivo in por_arquivo.items():
+                try:
+                    arquivo = self._abrir(nome_arquivo)
+                    arquivo.write("".join(linhas_arquivo))
+                    arquivo.flush()
+                except Exception as e:
+                    logger.error(f"❌ Erro ao gravar transcrição {nome_arquivo}: {e}", exc_info=True)
+
+        logger.debug(f"💾 {len(linhas)} linhas de transcrição gravadas.")
+
+    def fechar(self):
+        """Grava as linhas pendentes e fecha todos os arquivos."""
+        self.flush()
+        with self._lock_escrita:
+            while self._arquivos:
+                _, arquivo = self._arquivos.popitem(last=False)
+                arquivo.close()
+
+    def _abrir(self, nome_arquivo):
+        """Retorna o handle do arquivo, abrindo-o e descartando o menos usado se necessário."""
+        arquivo = self._arquivos.get(nome_arquivo)
+        if arquivo is not None:
+            self._arquivos.move_to_end(nome_arquivo)
+            return arquivo
+
+        if not self._diretorio_criado:
+            os.makedirs(self._diretorio, exist_ok=True)
+            self._diretorio_criado = True
+
+        while len(self._arquivos) >= self._max_arquivos:
+            _, antigo = self._arquivos.popitem(last=False)
+            antigo.close()
+
+        arquivo = open(os.path.join(self._diretorio, nome_arquivo), "a", encoding="utf-8")
+        self._arquivos[nome_arquivo] = arquivo
+        return arquivo
+
+    def _executar(self):
+        while True:
+            self._evento.wait(self._intervalo_flush)
+            self._evento.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"❌ Erro no flush das transcrições: {e}", exc_info=True)
+
+
+# Instância compartilhada; grava o restante do buffer ao encerrar o processo
+escritor_transcricoes = EscritorTranscricoes(CONVERSATIONS_DIR, TRANSCRICAO_MAX_ARQUIVOS, TRANSCRICAO_MAX_LINHAS, TRANSCRICAO_INTERVALO_FLUSH)
+atexit.register(escritor_transcricoes.fechar)
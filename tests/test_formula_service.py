@@ -0,0 +1,65 @@
+import random
+import numpy as np
+import pytest
+from services.formula_service import FORMULAS_PROJETOS, Formula, compilar_expressao, compilar_formulas
+
+
+def formula_com(altura, largura):
+    return Formula(99, {"nome": "TESTE", "pecas": [{"nome_peca": "Peça", "quantidade": 2, "altura": altura, "largura": largura}]})
+
+
+def comparar_escalar_e_lote(formula, vaos):
+    alturas = np.array([altura for altura, _ in vaos])
+    larguras = np.array([largura for _, largura in vaos])
+    lote = formula.calcular_lote(alturas, larguras)
+
+    for indice, (altura, largura) in enumerate(vaos):
+        pecas = formula.calcular(altura, largura)
+        for peca, (nome, quantidade, alturas_peca, larguras_peca) in zip(pecas, lote):
+            assert peca["nome_peca"] == nome
+            assert peca["quantidade"] == quantidade
+            assert peca["dimensoes"] == (alturas_peca[indice], larguras_peca[indice])
+
+
+@pytest.fixture
+def vaos():
+    aleatorio = random.Random(42)
+    return [(aleatorio.randint(0, 3000), aleatorio.randint(1, 3000)) for _ in range(200)]
+
+
+@pytest.mark.parametrize("id_formula", sorted(FORMULAS_PROJETOS))
+def test_formulas_padrao_escalar_e_lote_iguais(id_formula, vaos):
+    comparar_escalar_e_lote(compilar_formulas(FORMULAS_PROJETOS)[id_formula], vaos)
+
+
+@pytest.mark.parametrize("altura, largura", [
+    ("max(altura - 20, 500, largura // 3)", "min(largura, 1200, altura)"),
+    ("min(max(altura, 100, 200), 2500, 3000)", "max(0, largura - 40, 10) + 5"),
+    ("max(altura / 2, 300)", "min(largura % 700, 650)"),
+])
+def test_max_min_com_varios_argumentos_escalar_e_lote_iguais(altura, largura, vaos):
+    comparar_escalar_e_lote(formula_com(altura, largura), vaos)
+
+
+def test_lote_com_tres_argumentos_nao_sobrescreve_operandos():
+    alturas = np.array([100, 2000])
+    larguras = np.array([50, 800])
+    (_, _, alturas_peca, larguras_peca), = formula_com("max(altura, 1000, largura)", "largura").calcular_lote(alturas, larguras)
+    assert alturas_peca.tolist() == [1000, 2000]
+    assert larguras.tolist() == [50, 800]
+
+
+@pytest.mark.parametrize("expressao", [
+    "max(altura)",
+    "min()",
+    "__import__('os')",
+    "altura.real",
+    "open('x')",
+    "max(altura, key=largura)",
+    "altura if largura else 0",
+    "'texto'",
+    "profundidade + 1",
+])
+def test_expressoes_rejeitadas(expressao):
+    with pytest.raises((ValueError, SyntaxError)):
+        compilar_expressao(expressao)
@@ -0,0 +1,97 @@
+import threading
+import pytest
+import services.global_state as global_state_module
+from services.global_state import GlobalState
+
+
+@pytest.fixture
+def estado(monkeypatch):
+    monkeypatch.setattr(global_state_module, "SESSAO_BACKEND", "memoria")
+    monkeypatch.setattr(global_state_module, "SESSAO_SNAPSHOT_INTERVALO", 0)
+    estado = object.__new__(GlobalState)
+    estado._reset_state()
+    return estado
+
+
+def test_leituras_nao_criam_sessao(estado):
+    assert estado.status_usuario.get("c1") is None
+    assert "c1" not in estado.ultimo_menu_usuario
+    assert "c1" not in estado.informacoes_cliente
+    with pytest.raises(KeyError):
+        estado.status_usuario["c1"]
+    assert estado._sessoes == {}
+
+
+def test_informacoes_cliente_cria_o_dicionario_do_contato(estado):
+    estado.informacoes_cliente["c1"]["nome"] = "Ana"
+    assert estado.informacoes_cliente["c1"] == {"nome": "Ana"}
+    assert "c1" in estado.informacoes_cliente
+    assert "c1" not in estado.status_usuario
+
+
+def test_remover_o_ultimo_campo_remove_a_sessao(estado):
+    estado.status_usuario["c1"] = "menu_inicial"
+    estado.ultima_interacao_usuario["c1"] = 10.0
+
+    del estado.status_usuario["c1"]
+    assert "c1" in estado._sessoes
+    assert estado.ultima_interacao_usuario.pop("c1") == 10.0
+    assert "c1" not in estado._sessoes
+    assert estado.ultima_interacao_usuario.pop("c1", None) is None
+    with pytest.raises(KeyError):
+        del estado.status_usuario["c1"]
+
+
+def test_visoes_listam_somente_contatos_com_o_campo(estado):
+    estado.status_usuario["c1"] = "menu_inicial"
+    estado.ultima_interacao_usuario["c2"] = 5.0
+
+    assert list(estado.status_usuario) == ["c1"]
+    assert len(estado.ultima_interacao_usuario) == 1
+    assert estado.ultima_interacao_usuario.items() == [("c2", 5.0)]
+
+
+def test_limpar_dados_usuario(estado):
+    estado.status_usuario["c1"] = "menu_inicial"
+    estado.informacoes_cliente["c1"]["nome"] = "Ana"
+
+    estado.limpar_dados_usuario("c1")
+    assert "c1" not in estado.status_usuario
+    assert "c1" not in estado.informacoes_cliente
+
+
+def test_trava_e_reentrante_e_serializa_o_contato(estado):
+    estado.informacoes_cliente["c1"]["total"] = 0
+
+    def incrementar():
+        for _ in range(500):
+            with estado.travar("c1"):
+                with estado.travar("c1"):  # Reentrante
+                    informacoes = estado.informacoes_cliente["c1"]
+                    total = informacoes["total"]
+                    informacoes["total"] = total + 1
+
+    threads = [threading.Thread(target=incrementar) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert estado.informacoes_cliente["c1"]["total"] == 4000
+    assert not estado.travado_pela_thread("c1")
+    assert estado._profundidade == {}
+
+
+def test_contatos_diferentes_nao_se_bloqueiam(estado):
+    contato_livre = next(f"c{i}" for i in range(1000) if estado._lock_do_contato(f"c{i}") is not estado._lock_do_contato("c0"))
+    liberado = threading.Event()
+
+    def travar_outro():
+        with estado.travar(contato_livre):
+            liberado.set()
+
+    with estado.travar("c0"):
+        thread = threading.Thread(target=travar_outro)
+        thread.start()
+        assert liberado.wait(timeout=5)
+    thread.join()
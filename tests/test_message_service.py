@@ -0,0 +1,107 @@
+import subprocess
+import sys
+import time
+import pytest
+import services.message_service as message_service
+from services.global_state import global_state
+from services.outbox_service import Outbox
+from services.processo_service import identificador_processo
+
+OUTRA_MAQUINA = "outra-maquina:1"
+
+
+@pytest.fixture
+def outbox(tmp_path, monkeypatch):
+    caixa = Outbox(str(tmp_path / "outbox.db"), intervalo_sync=3600)
+    monkeypatch.setattr(message_service, "outbox", caixa)
+    monkeypatch.setattr(message_service, "_filas_reenvio", {})
+    return caixa
+
+
+@pytest.fixture
+def reenvios(monkeypatch):
+    agendados = []
+    monkeypatch.setattr(message_service.agendador_reenvio, "agendar", lambda atraso, funcao, contato, *args: agendados.append(contato))
+    return agendados
+
+
+def registrar_antiga(outbox, contato, idade, dono=None, reivindicada_por=0):
+    """Mensagem pendente registrada há `idade` segundos, reivindicada por `dono` por mais `reivindicada_por` segundos."""
+    id_mensagem = outbox.registrar(contato, "mensagem", 0)
+    outbox._obter_conexao().execute(
+        "UPDATE outbox SET criado_em = ?, reivindicado_por = ?, reivindicado_ate = ? WHERE id = ?",
+        (time.time() - idade, dono, time.time() + reivindicada_por if dono else None, id_mensagem),
+    )
+    return id_mensagem
+
+
+def linha_na_outbox(outbox, id_mensagem):
+    return outbox._obter_conexao().execute(
+        "SELECT status, reivindicado_por FROM outbox WHERE id = ?", (id_mensagem,)
+    ).fetchone()
+
+
+def pid_encerrado():
+    processo = subprocess.Popen([sys.executable, "-c", "pass"])
+    processo.wait()
+    return processo.pid
+
+
+def test_drenagem_expira_somente_mensagens_antigas(outbox, reenvios):
+    pendente = registrar_antiga(outbox, "c1", 600)
+    antiga = registrar_antiga(outbox, "c2", message_service.OUTBOX_IDADE_MAX + 1)
+
+    assert message_service.reenviar_pendentes_outbox() == 1
+    assert reenvios == ["c1"]
+    assert linha_na_outbox(outbox, pendente) == (Outbox.PENDENTE, identificador_processo())
+    assert linha_na_outbox(outbox, antiga)[0] == Outbox.EXPIRADO
+
+
+def test_confirmacao_enviada_apos_limpar_a_sessao_e_reenviada(outbox, reenvios):
+    global_state.status_usuario["confirmado"] = "confirmar_finalizacao"
+    global_state.limpar_dados_usuario("confirmado")
+    confirmacao = registrar_antiga(outbox, "confirmado", 600)  # Gateway fora do ar ao confirmar; processo reiniciado
+
+    assert message_service.reenviar_pendentes_outbox() == 1
+    assert reenvios == ["confirmado"]
+    assert linha_na_outbox(outbox, confirmacao)[0] == Outbox.PENDENTE
+
+
+def test_drenagem_nao_reenvia_mensagens_reivindicadas(outbox, reenvios):
+    outbox.registrar("recente", "mensagem", 60)  # Primeiro envio deste processo ainda em andamento
+    registrar_antiga(outbox, "de_outro", 600, dono=OUTRA_MAQUINA, reivindicada_por=60)
+
+    assert message_service.reenviar_pendentes_outbox() == 0
+    assert reenvios == []
+
+
+def test_drenagem_retoma_reivindicacoes_expiradas_ou_de_processos_encerrados(outbox, reenvios):
+    registrar_antiga(outbox, "expirada", 600, dono=OUTRA_MAQUINA, reivindicada_por=-1)
+    registrar_antiga(outbox, "orfa", 600, dono=f"{identificador_processo().rpartition(':')[0]}:{pid_encerrado()}", reivindicada_por=60)
+
+    assert message_service.reenviar_pendentes_outbox() == 2
+    assert reenvios == ["expirada", "orfa"]
+
+
+def test_mensagem_liberada_volta_para_a_drenagem(outbox, reenvios):
+    id_mensagem = outbox.registrar("c1", "mensagem", 60)
+    assert message_service.reenviar_pendentes_outbox() == 0
+
+    message_service.finalizar_reenvio(id_mensagem)  # Tentativas esgotadas
+    assert message_service.reenviar_pendentes_outbox() == 1
+    assert message_service.reenviar_pendentes_outbox() == 0  # Reivindicada de novo pela drenagem anterior
+
+
+def test_somente_um_processo_reivindica_a_mensagem(outbox):
+    id_mensagem = registrar_antiga(outbox, "c1", 600, dono=OUTRA_MAQUINA, reivindicada_por=-1)
+    _, _, _, _, dono, ate = outbox.pendentes()[0]
+    outro_processo = Outbox(outbox._caminho, intervalo_sync=3600)
+
+    assert outro_processo.reivindicar(id_mensagem, dono, ate, 60)
+    assert not outbox.reivindicar(id_mensagem, dono, ate, 60)
+
+
+def test_liberar_nao_desfaz_reivindicacao_de_outro_processo(outbox):
+    id_mensagem = registrar_antiga(outbox, "c1", 600, dono=OUTRA_MAQUINA, reivindicada_por=60)
+    outbox.liberar(id_mensagem)
+    assert linha_na_outbox(outbox, id_mensagem) == (Outbox.PENDENTE, OUTRA_MAQUINA)
@@ -0,0 +1,74 @@
+import json
+import pytest
+import services.orcamento_service as orcamento_service
+from services.orcamento_service import calcular_orcamento_lote, numero_positivo
+
+PROJETOS = {
+    "1": {"id_projeto": 1, "descricao_projeto": "Box padrão 1200", "definicao_1": "Padrão", "id_formula": 2},
+    "2": {"id_projeto": 2, "descricao_projeto": "Fixo sob medida", "definicao_1": "Fixo", "id_formula": 2},
+}
+
+
+class CatalogoFalso:
+    def buscar(self, cor, espessura, beneficiamento):
+        if (cor, espessura, beneficiamento) == ("INCOLOR", "08 mm", "TEMPERADO"):
+            return "10", 200.0
+        if (cor, espessura, beneficiamento) == ("INCOLOR", "08 mm", "LAPIDADO"):
+            return "11", 150.0
+        return None, None
+
+
+@pytest.fixture(autouse=True)
+def catalogos(monkeypatch):
+    monkeypatch.setattr(orcamento_service, "obter_projeto_por_id", lambda id_projeto: PROJETOS.get(str(id_projeto)))
+    monkeypatch.setattr(orcamento_service.MateriaPrimaCache, "obter_catalogo", classmethod(lambda cls: CatalogoFalso()))
+    monkeypatch.setattr(orcamento_service, "obter_preco_materia_prima", lambda id_mp: {"10": 200.0, "12": float("nan")}.get(id_mp))
+
+
+def linha(**campos):
+    return {"id_projeto": 1, "altura": 1000, "largura": 1000, "quantidade": 1, "id_materia_prima": "10", **campos}
+
+
+@pytest.mark.parametrize("valor, esperado", [
+    (10, 10), (2.5, 2.5), ("1.200", 1.2), ("12,5", 12.5), ("7", 7),
+    (float("nan"), None), (float("inf"), None), ("nan", None), ("-inf", None), ("1e400", None),
+    (True, None), ("abc", None), (None, None),
+])
+def test_numero_positivo(valor, esperado):
+    assert numero_positivo(valor) == esperado
+
+
+@pytest.mark.parametrize("campos, mensagem", [
+    ({"largura": float("nan")}, "Largura inválida."),
+    ({"largura": "inf"}, "Largura inválida."),
+    ({"largura": 10 ** 30}, "Largura acima do máximo"),
+    ({"altura": 10 ** 30}, "Altura acima do máximo"),
+    ({"quantidade": 10 ** 30}, "Quantidade acima do máximo"),
+    ({"quantidade": float("nan")}, "Quantidade inválida."),
+    ({"id_materia_prima": "12"}, "Matéria-prima sem preço"),
+])
+def test_linhas_invalidas_viram_erro_da_linha(campos, mensagem):
+    resultados, total = calcular_orcamento_lote([linha(**campos), linha()])
+
+    assert resultados[0]["status"] == "error"
+    assert resultados[0]["message"].startswith(mensagem)
+    assert resultados[1]["status"] == "success"
+    assert total == resultados[1]["valor_total"]
+    json.dumps(resultados, allow_nan=False)  # Resposta sempre em JSON válido
+
+
+def test_projeto_fixo_exige_beneficiamento():
+    selecao = {"id_projeto": 2, "id_materia_prima": None, "cor_materia_prima": "INCOLOR", "espessura_materia_prima": "08 mm"}
+    sem_beneficiamento = linha(**selecao)
+    com_beneficiamento = linha(**selecao, beneficiamento="LAPIDADO")
+
+    resultados, _ = calcular_orcamento_lote([sem_beneficiamento, com_beneficiamento])
+    assert resultados[0] == {"linha": 0, "status": "error", "message": "Beneficiamento obrigatório para projetos fixos."}
+    assert resultados[1]["status"] == "success"
+    assert resultados[1]["id_materia_prima"] == "11"
+
+
+def test_demais_projetos_usam_temperado_como_no_chat():
+    resultados, _ = calcular_orcamento_lote([linha(id_materia_prima=None, cor_materia_prima="INCOLOR", espessura_materia_prima="08 mm")])
+    assert resultados[0]["status"] == "success"
+    assert resultados[0]["id_materia_prima"] == "10"
@@ -0,0 +1,68 @@
+import threading
+from datetime import datetime
+import pytest
+from services.pedidos_db import BancoPedidos, AlocadorIdPedidos
+
+AGORA = datetime(2026, 10, 18, 12, 0)
+
+
+@pytest.fixture
+def banco(tmp_path):
+    return BancoPedidos(str(tmp_path / "pedidos.db"))
+
+
+def test_ids_sequenciais_por_dia(banco):
+    alocador = AlocadorIdPedidos(banco, bloco=3)
+    ids = [alocador.proximo_id(AGORA) for _ in range(5)]
+    assert ids == [f"261018_{n:04d}" for n in range(1, 6)]
+    assert alocador.proximo_id(datetime(2026, 10, 19)) == "261019_0001"
+
+
+def test_reserva_devolvida_ao_encerrar_nao_deixa_lacuna(banco):
+    alocador = AlocadorIdPedidos(banco, bloco=10)
+    assert [alocador.proximo_id(AGORA) for _ in range(3)][-1] == "261018_0003"
+    alocador.devolver_reserva()
+
+    assert AlocadorIdPedidos(banco, bloco=10).proximo_id(AGORA) == "261018_0004"
+
+
+def test_reserva_nao_e_devolvida_se_outro_processo_reservou_depois(banco):
+    primeiro = AlocadorIdPedidos(banco, bloco=10)
+    segundo = AlocadorIdPedidos(banco, bloco=10)
+    assert primeiro.proximo_id(AGORA) == "261018_0001"
+    assert segundo.proximo_id(AGORA) == "261018_0011"
+
+    primeiro.devolver_reserva()  # O contador já está em 20: devolver repetiria os números do segundo
+    assert AlocadorIdPedidos(banco, bloco=10).proximo_id(AGORA) == "261018_0021"
+
+
+def test_ids_unicos_entre_alocadores_e_threads(banco):
+    alocadores = [AlocadorIdPedidos(banco, bloco=7) for _ in range(2)]
+    ids = []
+    lock = threading.Lock()
+
+    def gerar(alocador):
+        gerados = [alocador.proximo_id(AGORA) for _ in range(50)]
+        with lock:
+            ids.extend(gerados)
+
+    threads = [threading.Thread(target=gerar, args=(alocadores[i % 2],)) for i in range(8)]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+    assert len(ids) == len(set(ids)) == 400
+
+
+def test_reserva_e_devolucao_passam_pelo_escritor(banco, monkeypatch):
+    executar = banco._escritor.executar
+    operacoes = []
+
+    def registrar(operacao, *args):
+        operacoes.append(operacao.__name__)
+        return executar(operacao, *args)
+
+    monkeypatch.setattr(banco._escritor, "executar", registrar)
+    alocador = AlocadorIdPedidos(banco, bloco=10)
+    alocador.proximo_id(AGORA)
+    alocador.devolver_reserva()
+
+    assert operacoes == ["_operacao_reservar_numeros", "_operacao_devolver_numeros"]
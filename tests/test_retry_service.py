@@ -0,0 +1,159 @@
+import time
+import pytest
+import services.message_service as message_service
+from services.outbox_service import Outbox
+from services.retry_service import CircuitBreaker, calcular_backoff
+
+
+@pytest.fixture
+def circuito():
+    return CircuitBreaker(limite_falhas=2, tempo_espera=0.05)
+
+
+def test_circuito_abre_apos_limite_de_falhas(circuito):
+    assert circuito.permitir()
+    circuito.registrar_falha()
+    assert circuito.estado()["estado"] == CircuitBreaker.FECHADO
+    circuito.registrar_falha()
+    assert circuito.estado()["estado"] == CircuitBreaker.ABERTO
+    assert not circuito.permitir()
+    assert 0 < circuito.tempo_restante() <= 0.05
+
+
+def test_circuito_meio_aberto_libera_um_unico_teste(circuito):
+    circuito.registrar_falha()
+    circuito.registrar_falha()
+    time.sleep(0.06)
+
+    assert circuito.permitir()  # Tentativa de teste
+    assert circuito.estado()["estado"] == CircuitBreaker.MEIO_ABERTO
+    assert not circuito.permitir()
+    # Enquanto o teste não termina, quem espera não deve ser reagendado sem atraso
+    assert circuito.tempo_restante() == CircuitBreaker.ESPERA_TESTE
+
+
+def test_circuito_fecha_com_sucesso_do_teste(circuito):
+    circuito.registrar_falha()
+    circuito.registrar_falha()
+    time.sleep(0.06)
+    assert circuito.permitir()
+
+    circuito.registrar_sucesso()
+    assert circuito.estado() == {"estado": CircuitBreaker.FECHADO, "falhas_consecutivas": 0, "segundos_para_teste": 0}
+    assert circuito.permitir()
+    assert circuito.tempo_restante() == 0.0
+
+
+def test_circuito_reabre_com_falha_do_teste(circuito):
+    circuito.registrar_falha()
+    circuito.registrar_falha()
+    time.sleep(0.06)
+    assert circuito.permitir()
+
+    circuito.registrar_falha()
+    assert circuito.estado()["estado"] == CircuitBreaker.ABERTO
+    assert not circuito.permitir()
+
+
+def test_backoff_exponencial_com_jitter_e_limite():
+    for tentativa, base in [(1, 2), (2, 4), (3, 8), (10, 60)]:
+        for _ in range(50):
+            assert 0.5 * base <= calcular_backoff(tentativa, 2) <= 1.5 * base
+
+
+@pytest.fixture
+def agendamentos(monkeypatch):
+    agendados = []
+    monkeypatch.setattr(message_service.agendador_reenvio, "agendar", lambda atraso, *args: agendados.append(atraso))
+    return agendados
+
+
+def test_reenvio_respeita_circuito_aberto(monkeypatch, agendamentos):
+    circuito = CircuitBreaker(limite_falhas=1, tempo_espera=30)
+    circuito.registrar_falha()
+    monkeypatch.setattr(message_service, "circuito_gateway", circuito)
+
+    message_service.agendar_reenvio("5511999999999", "oi", 1, 3, 2, time.time())
+    assert 29 < agendamentos[-1] <= 30
+
+
+def test_reenvio_com_teste_em_andamento_nao_fica_sem_atraso(monkeypatch, agendamentos):
+    circuito = CircuitBreaker(limite_falhas=1, tempo_espera=0)
+    circuito.registrar_falha()
+    assert circuito.permitir()  # Teste do circuito meio aberto em andamento
+    monkeypatch.setattr(message_service, "circuito_gateway", circuito)
+
+    message_service.agendar_reenvio("5511999999999", "oi", 1, 3, 2, time.time())
+    assert agendamentos[-1] >= CircuitBreaker.ESPERA_TESTE
+
+
+def test_reenvio_com_circuito_fechado_usa_backoff(monkeypatch, agendamentos):
+    monkeypatch.setattr(message_service, "circuito_gateway", CircuitBreaker())
+
+    message_service.agendar_reenvio("5511999999999", "oi", 1, 3, 2, time.time())
+    message_service.agendar_reenvio("5511999999999", "oi", 3, 3, 2, time.time())
+    assert agendamentos[0] == 0
+    assert 2 <= agendamentos[1] <= 6
+
+
+@pytest.fixture
+def gateway(tmp_path, monkeypatch):
+    """Gateway simulado: `falhas` lista as mensagens cuja próxima tentativa falha; `enviadas` registra as entregues."""
+    simulado = type("Gateway", (), {})()
+    simulado.falhas = []
+    simulado.tentativas = []
+    simulado.agendados = []
+
+    def tentar_envio(contato, mensagem, id_outbox=None):
+        simulado.tentativas.append(mensagem)
+        if mensagem in simulado.falhas:
+            simulado.falhas.remove(mensagem)
+            return False
+        caixa.marcar(id_outbox, Outbox.ENTREGUE)
+        return True
+
+    caixa = Outbox(str(tmp_path / "outbox.db"), intervalo_sync=3600)
+    monkeypatch.setattr(message_service, "outbox", caixa)
+    monkeypatch.setattr(message_service, "_filas_reenvio", {})
+    monkeypatch.setattr(message_service, "circuito_gateway", CircuitBreaker())
+    monkeypatch.setattr(message_service, "tentar_envio", tentar_envio)
+    monkeypatch.setattr(message_service.agendador_reenvio, "agendar", lambda atraso, funcao, *args: simulado.agendados.append((funcao, args)))
+
+    def executar_agendado():
+        funcao, args = simulado.agendados.pop(0)
+        funcao(*args)
+
+    simulado.executar_agendado = executar_agendado
+    simulado.outbox = caixa
+    return simulado
+
+
+def test_reenvios_do_contato_respeitam_a_ordem(gateway):
+    gateway.falhas = ["m1", "m1"]
+    assert not message_service.enviar_ao_gateway("c1", "m1")
+    assert not message_service.enviar_ao_gateway("c1", "m2")  # Espera atrás de m1, sem tentar agora
+    assert message_service.enviar_ao_gateway("c2", "outro")  # Outros contatos não esperam
+
+    gateway.executar_agendado()  # m1 falha de novo; m2 continua esperando
+    gateway.executar_agendado()  # m1 entregue; agenda m2
+    gateway.executar_agendado()
+
+    assert gateway.tentativas == ["m1", "outro", "m1", "m1", "m2"]
+    assert gateway.agendados == []
+    assert message_service._filas_reenvio == {}
+    assert message_service.enviar_ao_gateway("c1", "m3")
+
+
+def test_desistir_do_primeiro_devolve_a_fila_inteira_para_a_outbox(gateway):
+    gateway.falhas = ["m1"] * 3
+    message_service.enviar_ao_gateway("c1", "m1")
+    message_service.enviar_ao_gateway("c1", "m2")
+
+    gateway.executar_agendado()
+    gateway.executar_agendado()  # Terceira tentativa de m1: desiste
+
+    assert gateway.tentativas == ["m1"] * 3
+    assert message_service._filas_reenvio == {}
+    pendentes = gateway.outbox.pendentes()
+    assert [linha[2] for linha in pendentes] == ["m1", "m2"]
+    assert all(linha[4] is None for linha in pendentes)  # Liberadas para a drenagem, na mesma ordem
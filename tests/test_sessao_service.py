@@ -0,0 +1,248 @@
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import pytest
+import services.global_state as global_state_module
+from services.global_state import GlobalState, SessaoUsuario
+from services.sessao_service import MemoriaSessoes, SQLiteSessoes
+
+MAQUINA = socket.gethostname()
+
+
+class ProcessoSimulado(SQLiteSessoes):
+    """Armazenamento compartilhado com um identificador de processo fixo (simula outro worker)."""
+
+    def __init__(self, caminho, dono, **opcoes):
+        super().__init__(caminho, **opcoes)
+        self._nome_dono = dono
+
+    @property
+    def _dono(self):
+        return self._nome_dono
+
+
+def pid_encerrado():
+    processo = subprocess.Popen([sys.executable, "-c", "pass"])
+    processo.wait()
+    return processo.pid
+
+
+@pytest.fixture
+def caminho(tmp_path):
+    return str(tmp_path / "sessoes.db")
+
+
+def alterar_status(armazenamento, contato, status):
+    armazenamento.abrir(contato)
+    sessao = armazenamento.sessoes.setdefault(contato, SessaoUsuario())
+    sessao.status = status
+    armazenamento.fechar(contato)
+
+
+def test_sessao_gravada_e_lida_por_outro_processo(caminho):
+    primeiro = ProcessoSimulado(caminho, f"{MAQUINA}:{os.getpid()}", cache_leitura=0)
+    segundo = ProcessoSimulado(caminho, "outra-maquina:1", cache_leitura=0)
+
+    alterar_status(primeiro, "c1", "menu_inicial")
+    assert segundo.ler("c1").status == "menu_inicial"
+    assert segundo.listar("status") == [("c1", "menu_inicial")]
+    assert primeiro.sessoes == {}  # Fora da trava, nada fica na memória do processo
+
+
+def test_segundo_processo_espera_a_concessao(caminho):
+    primeiro = ProcessoSimulado(caminho, f"{MAQUINA}:{os.getpid()}")
+    segundo = ProcessoSimulado(caminho, "outra-maquina:1")
+    primeiro.abrir("c1")
+    primeiro.sessoes["c1"] = SessaoUsuario()
+    primeiro.sessoes["c1"].status = "do_primeiro"
+
+    lido = []
+    def travar_no_segundo():
+        segundo.abrir("c1")
+        lido.append(segundo.sessoes["c1"].status)
+        segundo.fechar("c1")
+
+    thread = threading.Thread(target=travar_no_segundo)
+    thread.start()
+    time.sleep(0.2)
+    assert lido == []  # Bloqueado pela concessão do primeiro
+
+    primeiro.fechar("c1")
+    thread.join(timeout=5)
+    assert lido == ["do_primeiro"]
+
+
+def test_concessao_expirada_e_retomada_e_versao_antiga_e_descartada(caminho):
+    primeiro = ProcessoSimulado(caminho, "maquina-a:1", duracao_lease=0.2, cache_leitura=0)
+    segundo = ProcessoSimulado(caminho, "maquina-b:1", duracao_lease=0.2, cache_leitura=0)
+    alterar_status(primeiro, "c1", "inicial")
+
+    primeiro.abrir("c1")
+    primeiro.sessoes["c1"].status = "lento"
+    time.sleep(0.3)  # A concessão do primeiro expira
+
+    alterar_status(segundo, "c1", "do_segundo")
+    primeiro.fechar("c1")  # Compare-and-swap falha: a versão do segundo prevalece
+
+    assert segundo.ler("c1").status == "do_segundo"
+
+
+def test_concessao_de_processo_encerrado_e_retomada_sem_esperar(caminho):
+    morto = ProcessoSimulado(caminho, f"{MAQUINA}:{pid_encerrado()}", duracao_lease=60)
+    vivo = ProcessoSimulado(caminho, f"{MAQUINA}:{os.getpid()}", duracao_lease=60)
+    morto.abrir("c1")  # Processo cai com a concessão
+
+    inicio = time.monotonic()
+    vivo.abrir("c1")
+    vivo.fechar("c1")
+    assert time.monotonic() - inicio < 1
+
+
+def test_espera_pela_concessao_tem_limite(caminho):
+    dono = ProcessoSimulado(caminho, "outra-maquina:1", duracao_lease=60)
+    dono.abrir("c1")
+    impaciente = ProcessoSimulado(caminho, f"{MAQUINA}:{os.getpid()}", duracao_lease=0.1)
+
+    with pytest.raises(TimeoutError):
+        impaciente.abrir("c1")
+
+
+def test_leituras_sem_trava_usam_cache(caminho):
+    escritor = ProcessoSimulado(caminho, "maquina-a:1")
+    leitor = ProcessoSimulado(caminho, "maquina-b:1", cache_leitura=60)
+    alterar_status(escritor, "c1", "primeiro")
+
+    assert leitor.ler("c1").status == "primeiro"
+    alterar_status(escritor, "c1", "segundo")
+    assert leitor.ler("c1").status == "primeiro"  # Ainda no cache
+    alterar_status(leitor, "c1", "do_leitor")  # Gravações do próprio processo invalidam o cache
+    assert leitor.ler("c1").status == "do_leitor"
+
+
+@pytest.fixture
+def estado_compartilhado(caminho, monkeypatch):
+    monkeypatch.setattr(global_state_module, "SESSAO_BACKEND", "sqlite")
+    monkeypatch.setattr(global_state_module, "SESSOES_DB_PATH", caminho)
+    monkeypatch.setattr(global_state_module, "SESSAO_CACHE_LEITURA", 0)
+    estado = object.__new__(GlobalState)
+    estado._reset_state()
+    return estado
+
+
+def test_fora_da_trava_informacoes_sao_somente_leitura(estado_compartilhado):
+    estado = estado_compartilhado
+    with estado.travar("c1"):
+        estado.informacoes_cliente["c1"]["pedidos"] = [1]
+        estado.ultimo_menu_usuario["c1"] = ["a", "b"]
+        estado.status_usuario["c1"] = "menu_inicial"
+
+    assert estado.informacoes_cliente["c1"]["pedidos"] == [1]
+    with pytest.raises(TypeError):
+        estado.informacoes_cliente["c1"]["pedidos"] = [2]  # Seria perdida em silêncio
+    with pytest.raises(TypeError):
+        estado.informacoes_cliente["c2"]["novo"] = 1
+    assert estado.ultimo_menu_usuario.get("c1") == ("a", "b")
+
+    with estado.travar("c1"):
+        estado.informacoes_cliente["c1"]["pedidos"].append(2)
+    assert estado.informacoes_cliente.get("c1")["pedidos"] == [1, 2]
+    assert list(estado.status_usuario) == ["c1"]
+
+
+def memoria(caminho_snapshot):
+    trava = threading.RLock()
+    return MemoriaSessoes(caminho_snapshot, lock_do_contato=lambda contato: trava)
+
+
+def nova_sessao(armazenamento, contato, status, ultima_interacao, informacoes=None):
+    armazenamento.abrir(contato)
+    sessao = armazenamento.sessoes.setdefault(contato, SessaoUsuario())
+    sessao.status = status
+    sessao.ultima_interacao = ultima_interacao
+    sessao.informacoes = informacoes
+    armazenamento.fechar(contato)
+
+
+def test_snapshot_restaura_as_sessoes_sob_demanda(tmp_path):
+    caminho_snapshot = str(tmp_path / "snapshot.db")
+    antes = memoria(caminho_snapshot)
+    nova_sessao(antes, "c1", "menu_inicial", 100.0, {"nome": "Ana"})
+    nova_sessao(antes, "c2", "aguardando", 200.0)
+    antes.gravar_snapshot()
+
+    depois = memoria(caminho_snapshot)
+    assert depois.restaurar() == 2
+    assert depois.sessoes == {}  # Nada desserializado ainda
+    assert dict(depois.listar("status")) == {"c1": "menu_inicial", "c2": "aguardando"}
+    assert depois.sessoes == {}
+
+    sessao = depois.ler("c1")
+    assert sessao.informacoes == {"nome": "Ana"}
+    assert set(depois.sessoes) == {"c1"}
+
+
+def test_snapshot_e_incremental_e_remove_sessoes_encerradas(tmp_path):
+    caminho_snapshot = str(tmp_path / "snapshot.db")
+    antes = memoria(caminho_snapshot)
+    nova_sessao(antes, "c1", "menu_inicial", 100.0)
+    nova_sessao(antes, "c2", "aguardando", 200.0)
+    antes.gravar_snapshot()
+
+    antes.sessoes["c1"].status = "nao_liberado"  # Alterado sem passar pela trava: fica fora do snapshot
+    antes.abrir("c2")
+    del antes.sessoes["c2"]
+    antes.fechar("c2")
+    antes.gravar_snapshot()
+
+    depois = memoria(caminho_snapshot)
+    assert depois.restaurar() == 1
+    assert depois.listar("status") == [("c1", "menu_inicial")]
+
+
+def test_prazos_restaurados_sao_deslocados_pelo_tempo_parado(tmp_path):
+    caminho_snapshot = str(tmp_path / "snapshot.db")
+    antes = memoria(caminho_snapshot)
+    nova_sessao(antes, "c1", "menu_inicial", 1000.0)
+    antes.gravar_snapshot()
+    conexao = sqlite3.connect(caminho_snapshot)
+    conexao.execute("UPDATE metadados SET valor = ? WHERE chave = 'salvo_em'", (time.time() - 300,))
+    conexao.commit()
+    conexao.close()
+
+    depois = memoria(caminho_snapshot)
+    depois.restaurar()
+    deslocado = dict(depois.listar("ultima_interacao"))["c1"]
+    assert 1299 <= deslocado <= 1302
+    assert 1299 <= depois.ler("c1").ultima_interacao <= 1302
+
+    # Regravado sem ser acessado, o prazo deslocado persiste (e não é deslocado duas vezes)
+    outra = memoria(caminho_snapshot)
+    outra.restaurar()
+    outra.gravar_snapshot()
+    ultima = memoria(caminho_snapshot)
+    ultima.restaurar()
+    assert 1299 <= ultima.ler("c1").ultima_interacao <= 1302
+
+
+def test_servico_executado_por_um_unico_processo(caminho):
+    primeiro = ProcessoSimulado(caminho, "maquina-a:1")
+    segundo = ProcessoSimulado(caminho, "maquina-b:1")
+
+    assert primeiro.assumir_servico("monitor", 0.2)
+    assert not segundo.assumir_servico("monitor", 0.2)
+    assert primeiro.assumir_servico("monitor", 0.2)  # Renovação
+    time.sleep(0.3)
+    assert segundo.assumir_servico("monitor", 0.2)  # Não renovado a tempo
+    assert not primeiro.assumir_servico("monitor", 0.2)
+
+
+def test_servico_de_processo_encerrado_e_retomado(caminho):
+    morto = ProcessoSimulado(caminho, f"{MAQUINA}:{pid_encerrado()}")
+    vivo = ProcessoSimulado(caminho, f"{MAQUINA}:{os.getpid()}")
+
+    assert morto.assumir_servico("monitor", 60)
+    assert vivo.assumir_servico("monitor", 60)
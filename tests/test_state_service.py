@@ -0,0 +1,117 @@
+import threading
+import time
+import pytest
+import services.state_service as state_service
+from services.global_state import global_state
+from services.state_service import AgendaInatividade
+
+
+def test_contatos_saem_em_ordem_de_prazo():
+    agenda = AgendaInatividade()
+    agora = time.time()
+    agenda.agendar("c1", agora - 1)
+    agenda.agendar("c2", agora - 3)
+    agenda.agendar("c3", agora - 2)
+
+    assert [agenda.aguardar_vencido() for _ in range(3)] == ["c2", "c3", "c1"]
+    assert agenda._prazos == {}
+
+
+def test_reagendar_descarta_o_prazo_antigo():
+    agenda = AgendaInatividade()
+    agora = time.time()
+    agenda.agendar("c1", agora - 5)
+    agenda.agendar("c2", agora - 3)
+    agenda.agendar("c1", agora - 1)  # A entrada de -5 fica no heap, mas não vale mais
+
+    assert agenda.aguardar_vencido() == "c2"
+    assert agenda.aguardar_vencido() == "c1"
+    assert agenda._prazos == {}
+    with agenda._condicao:
+        assert all(agenda._prazos.get(contato) != prazo for prazo, contato in agenda._heap)
+
+
+def test_contato_removido_nao_vence():
+    agenda = AgendaInatividade()
+    agora = time.time()
+    agenda.agendar("c1", agora - 2)
+    agenda.agendar("c2", agora - 1)
+    agenda.remover("c1")
+
+    assert agenda.aguardar_vencido() == "c2"
+    assert agenda._prazos == {}
+
+
+def test_agendar_se_ausente_preserva_o_prazo_vigente():
+    agenda = AgendaInatividade()
+    agora = time.time()
+    agenda.agendar("c1", agora + 60)
+    agenda.agendar_se_ausente("c1", agora - 1)
+    agenda.agendar_se_ausente("c2", agora - 1)
+
+    assert agenda._prazos == {"c1": agora + 60, "c2": agora - 1}
+    assert agenda.aguardar_vencido() == "c2"
+
+
+def test_heap_e_compactado_com_muitos_reagendamentos():
+    agenda = AgendaInatividade()
+    for i in range(1000):
+        agenda.agendar("c1", time.time() + 60 + i)
+
+    assert len(agenda._heap) <= 2 * len(agenda._prazos) + 65
+    assert agenda._prazos["c1"] == max(prazo for prazo, _ in agenda._heap)
+
+
+def test_prazo_mais_proximo_acorda_o_monitor():
+    agenda = AgendaInatividade()
+    agenda.agendar("distante", time.time() + 60)
+    vencidos = []
+    thread = threading.Thread(target=lambda: vencidos.append(agenda.aguardar_vencido()), daemon=True)
+    thread.start()
+    time.sleep(0.1)
+
+    agenda.agendar("proximo", time.time())
+    thread.join(timeout=2)
+    assert vencidos == ["proximo"]
+    assert "distante" in agenda._prazos
+
+
+class PararMonitor(Exception):
+    pass
+
+
+def test_monitor_reagenda_o_contato_apos_erro(monkeypatch):
+    agenda = AgendaInatividade()
+    vencidos = iter(["c1"])
+
+    def aguardar_vencido():
+        try:
+            return next(vencidos)
+        except StopIteration:
+            raise PararMonitor
+
+    def verificar_com_erro(contato):
+        raise RuntimeError("gateway fora do ar")
+
+    monkeypatch.setattr(agenda, "aguardar_vencido", aguardar_vencido)
+    monkeypatch.setattr(state_service, "agenda_inatividade", agenda)
+    monkeypatch.setattr(state_service, "verificar_inatividade", verificar_com_erro)
+
+    erros = []
+    monkeypatch.setattr(state_service.logger, "error", lambda mensagem, **opcoes: erros.append((mensagem, opcoes)))
+
+    antes = time.time()
+    with pytest.raises(PararMonitor):
+        state_service.monitor_inactivity()
+
+    assert agenda._prazos["c1"] >= antes + state_service.INATIVIDADE_ESPERA_ERRO
+    assert len(erros) == 1 and "c1" in erros[0][0] and erros[0][1] == {"exc_info": True}
+
+
+def test_limpar_dados_usuario_cancela_o_prazo():
+    agenda = state_service.agenda_inatividade
+    global_state.status_usuario["teste_limpeza"] = "menu_inicial"
+    agenda.agendar("teste_limpeza", time.time() + 60)
+
+    global_state.limpar_dados_usuario("teste_limpeza")
+    assert "teste_limpeza" not in agenda._prazos
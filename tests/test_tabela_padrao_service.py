@@ -0,0 +1,38 @@
+import pytest
+import services.tabela_padrao_service as tabela_padrao_service
+from services.tabela_padrao_service import TabelaPadrao
+
+
+@pytest.fixture
+def catalogos(monkeypatch):
+    atuais = {"projetos": object(), "mp": object(), "formulas": object()}
+    calculos = []
+    monkeypatch.setattr(tabela_padrao_service.ProjetoCache, "obter_catalogo", classmethod(lambda cls: atuais["projetos"]))
+    monkeypatch.setattr(tabela_padrao_service.MateriaPrimaCache, "obter_catalogo", classmethod(lambda cls: atuais["mp"]))
+    monkeypatch.setattr(tabela_padrao_service.FormulaCache, "obter_formulas", classmethod(lambda cls: atuais["formulas"]))
+    monkeypatch.setattr(TabelaPadrao, "_calcular", staticmethod(lambda *origem: calculos.append(origem) or {"versao": len(calculos)}))
+    monkeypatch.setattr(TabelaPadrao, "_tabela", None)
+    monkeypatch.setattr(TabelaPadrao, "_origem", None)
+    monkeypatch.setattr(TabelaPadrao, "_monitorado", True)
+    return atuais, calculos
+
+
+def test_tabela_calculada_uma_vez_e_reaproveitada(catalogos):
+    _, calculos = catalogos
+    assert TabelaPadrao.obter_tabela() == {"versao": 1}
+    assert TabelaPadrao.obter_tabela() == {"versao": 1}
+    assert len(calculos) == 1
+
+
+def test_recarga_de_catalogo_recalcula_fora_da_requisicao(catalogos):
+    atuais, calculos = catalogos
+    TabelaPadrao.obter_tabela()
+
+    atuais["mp"] = object()  # Catálogo de matérias-primas recarregado
+    assert TabelaPadrao.obter_tabela() == {"versao": 1}  # A requisição não recalcula
+    assert len(calculos) == 1
+
+    TabelaPadrao._recarregar()  # Thread de recarga
+    assert TabelaPadrao.obter_tabela() == {"versao": 2}
+    TabelaPadrao._recarregar()  # Nada mudou: não recalcula de novo
+    assert len(calculos) == 2